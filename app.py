@@ -32,11 +32,32 @@
 ## @package app
 #  Domain layer.
 
-import factory, exception, util, config, tempfile, os, sys, template, mailer
+import factory, context, exception, util, config, cache, tempfile, os, sys, template, mailer, fanout, hmac, hashlib, threading
 from validators import *
 from base64 import b64encode
 from datetime import datetime
 
+## Verified credentials: maps lower-case usernames to a keyed digest of username & password.
+credentials_cache = cache.Cache(config.AUTH_CACHE_SIZE, config.AUTH_CACHE_TTL)
+## Secret key of the digests stored in the credentials cache (generated for each process).
+credentials_secret = os.urandom(32)
+
+## Computes the digest stored in the credentials cache.
+#  @param username a user account
+#  @param password password (plaintext)
+#  @return a keyed digest
+def credentials_digest(username, password):
+	return hmac.new(credentials_secret, "%s:%s" % (username.lower(), password), hashlib.sha256).digest()
+
+## User profiles shared by all requests. Keys are tuples: ("user", lower-case username) maps
+#  to user details (see database.UserDb.get_user()), ("following", lower-case username) to the
+#  followed usernames and ("id", user id) to the lower-case username. Friendship dependent
+#  fields are filtered when reading the profile.
+profile_cache = cache.Cache(config.PROFILE_CACHE_SIZE, config.PROFILE_CACHE_TTL)
+
+## The most used tags shared by all requests (see Application.get_tag_cloud()).
+tag_cloud_cache = cache.Cache(1, config.TAG_CLOUD_TTL)
+
 ## Shared user account management methods.
 class UserTools:
 	def __init__(self, db):
@@ -71,16 +92,75 @@ class UserTools:
 	#          protected and the user is not following the requester the
 	#          fields "email", "avatar" and "following" aren't available
 	def __get_user_details__(self, scope, requester, username):
-		self.__test_user_exists__(scope, username)
+		user = self.__get_cached_user__(scope, username)
 
-		lusername = username.lower()
-		user = self.__db.get_user(scope, username)
+		if user is None:
+			raise exception.UserNotFoundException()
+
+		following = self.__get_cached_following__(scope, user["username"])
+
+		return self.__project_user_details__(requester, user, following)
+
+	## Gets user details from the profile cache. Missing entries are loaded from the database.
+	#  @param scope a transaction scope
+	#  @param username a user account
+	#  @return user details (see database.UserDb.get_user()) or None if the account doesn't exist
+	def __get_cached_user__(self, scope, username):
+		user = profile_cache.get(("user", username.lower()))
+
+		if user is None and self.__db.user_exists(scope, username):
+			user = self.__db.get_user(scope, username)
+			self.__cache_user__(user)
 
-		full_profile = False
+		return user
 
-		if not user["protected"] or (requester.lower() == lusername) or self.__db.is_following(scope, username, requester):
+	## Gets the usernames the user is following from the profile cache. Missing entries are
+	#  loaded from the database.
+	#  @param scope a transaction scope
+	#  @param username a user account
+	#  @return an array containing usernames
+	def __get_cached_following__(self, scope, username):
+		key = ("following", username.lower())
+		following = profile_cache.get(key)
+
+		if following is None:
+			following = self.__db.get_followed_usernames(scope, username)
+			profile_cache.put(key, following)
+
+		return following
+
+	## Stores user details in the profile cache.
+	#  @param user user details (see database.UserDb.get_user())
+	#  @param following optional usernames the user is following
+	def __cache_user__(self, user, following=None):
+		lusername = user["username"].lower()
+
+		profile_cache.put(("user", lusername), user)
+		profile_cache.put(("id", user["id"]), lusername)
+
+		if following is not None:
+			profile_cache.put(("following", lusername), following)
+
+	## Copies the user details visible to the requester. The full profile is visible if the
+	#  account isn't protected or the user is following the requester.
+	#  @param requester name of the account requesting the user profile
+	#  @param user user details (see database.UserDb.get_user())
+	#  @param following usernames the user is following
+	#  @return a dictionary holding user details (see __get_user_details__())
+	def __project_user_details__(self, requester, user, following):
+		lrequester = requester.lower()
+		full_profile = not user["protected"] or lrequester == user["username"].lower() or lrequester in map(lambda name: name.lower(), following)
+
+		return self.__filter_user_details__(user, full_profile, following)
+
+	## Copies the user details visible to the requester.
+	#  @param user user details (see database.UserDb.get_user())
+	#  @param full_profile True if the requester is allowed to see the full user profile
+	#  @param following usernames the user is following (only required for full profiles)
+	#  @return a dictionary holding user details (see __get_user_details__())
+	def __filter_user_details__(self, user, full_profile, following):
+		if full_profile:
 			keys = ["id", "username", "firstname", "lastname", "email", "gender", "created_on", "avatar", "protected", "blocked"]
-			full_profile = True
 		else:
 			keys = ["id", "username", "firstname", "lastname", "gender", "created_on", "protected", "blocked"]
 
@@ -90,7 +170,7 @@ class UserTools:
 			details[k] = user[k]
 
 		if full_profile:
-			details["following"] = self.__db.get_followed_usernames(scope, user["username"])
+			details["following"] = list(following)
 
 		return details
 
@@ -152,9 +232,51 @@ class UserCache(UserTools):
 	def __init__(self, db, requester):
 		UserTools.__init__(self, db)
 
+		self.__db = db
 		self.__cache = {}
+		self.__ids = {}
 		self.__requester = requester
 
+	## Loads the details of multiple users. Profiles not found in the profile cache are
+	#  fetched with a fixed number of queries.
+	#  @param scope a transaction scope
+	#  @param user_ids ids of the user profiles to load
+	def load(self, scope, user_ids):
+		missing = set()
+
+		for id in set(filter(lambda id: id not in self.__ids, map(int, user_ids))):
+			lusername = profile_cache.get(("id", id))
+			user, following = None, None
+
+			if lusername is not None:
+				user = profile_cache.get(("user", lusername))
+				following = profile_cache.get(("following", lusername))
+
+			if user is None or following is None:
+				missing.add(id)
+			else:
+				self.__add_user__(id, user, following)
+
+		if len(missing) == 0:
+			return
+
+		users = self.__db.get_users_by_id(scope, missing)
+		following = self.__db.get_followed_usernames_by_id(scope, [id for id, user in users.iteritems() if not user["deleted"]])
+
+		for id, user in users.iteritems():
+			if user["deleted"]:
+				self.__ids[id] = self.__cache.setdefault(user["username"].lower(), { "username": user["username"] })
+			else:
+				del user["deleted"]
+
+				self.__cache_user__(user, following[id])
+				self.__add_user__(id, user, following[id])
+
+	def __add_user__(self, id, user, following):
+		details = self.__project_user_details__(self.__requester, user, following)
+
+		self.__ids[id] = self.__cache.setdefault(user["username"].lower(), details)
+
 	## Gets user details.
 	#  @param scope a transaction scope
 	#  @param username name of the user profile to get
@@ -182,15 +304,36 @@ class UserCache(UserTools):
 	#  @param user_id id of the user profile to get
 	#  @return a dictionary holding user details
 	def lookup_by_id(self, scope, user_id):
-		return self.lookup(scope, self.__map_user_id__(scope, user_id))
+		try:
+			return self.__ids[int(user_id)]
+
+		except KeyError:
+			return self.lookup(scope, self.__map_user_id__(scope, user_id))
+
+## Application instance shared by all requests (created on first use).
+application = None
+## Lock protecting the application initialization.
+application_lock = threading.Lock()
+
+## Gets the shared Application instance. The application layer doesn't store request
+#  related state and can be used by multiple threads.
+#  @return an Application instance
+def get_application():
+	global application
+
+	with application_lock:
+		if application is None:
+			application = Application()
+
+	return application
 
 ## The meat-a application layer.
 class Application(UserTools, ObjectTools):
 	def __init__(self):
-		self.__user_db = factory.create_user_db()
-		self.__object_db = factory.create_object_db()
-		self.__stream_db = factory.create_stream_db()
-		self.__mail_db = factory.create_mail_db()
+		self.__user_db = factory.get_user_db()
+		self.__object_db = factory.get_object_db()
+		self.__stream_db = factory.get_stream_db()
+		self.__mail_db = factory.get_mail_db()
 
 		UserTools.__init__(self, self.__user_db)
 		ObjectTools.__init__(self, self.__object_db)
@@ -235,7 +378,7 @@ class Application(UserTools, ObjectTools):
 
 				self.__mail_db.push_mail(scope, subject, body, email)
 
-				mailer.ping(config.MAILER_HOST, config.MAILER_PORT)
+				self.__ping_mailer__()
 
 				scope.complete()
 
@@ -270,7 +413,7 @@ class Application(UserTools, ObjectTools):
 
 				self.__mail_db.push_user_mail(scope, subject, body, user_id)
 
-				mailer.ping(config.MAILER_HOST, config.MAILER_PORT)
+				self.__ping_mailer__()
 
 				scope.complete()
 
@@ -299,10 +442,13 @@ class Application(UserTools, ObjectTools):
 
 				self.__mail_db.push_user_mail(scope, subject, body, details["id"])
 
-				mailer.ping(config.MAILER_HOST, config.MAILER_PORT)
+				self.__ping_mailer__()
 
 				scope.complete()
 
+		self.__evict_after_commit__(credentials_cache, username.lower())
+		self.__evict_after_commit__(profile_cache, ("user", username.lower()))
+
 	## Deletes a user account. Generates a mail on success.
 	#  @param username name of the account to delete
 	def delete_user(self, username):
@@ -321,10 +467,15 @@ class Application(UserTools, ObjectTools):
 
 				self.__mail_db.push_mail(scope, subject, body, details["email"])
 
-				mailer.ping(config.MAILER_HOST, config.MAILER_PORT)
+				self.__ping_mailer__()
 
 				scope.complete()
 
+		self.__evict_after_commit__(credentials_cache, username.lower())
+
+		# the account is also removed from the following lists of other users:
+		context.after_commit(profile_cache.clear)
+
 	## Changes the password of a user account. Generates a mail on success.
 	#  @param username name of a user account
 	#  @param old_password old password (plaintext) of the specified account
@@ -359,23 +510,36 @@ class Application(UserTools, ObjectTools):
 
 					self.__mail_db.push_user_mail(scope, subject, body, user["id"])
 
-					mailer.ping(config.MAILER_HOST, config.MAILER_PORT)
+					self.__ping_mailer__()
 
 					scope.complete()
 
 				else:
 					raise exception.WrongPasswordException()
 
+		self.__evict_after_commit__(credentials_cache, username.lower())
+
 	## Tests if a password is correct.
 	#  @param username a user account
 	#  @param password password (plaintext) to validate
 	#  @return True if the given password is correct
 	def validate_password(self, username, password):
+		digest = credentials_digest(username, password)
+		cached = credentials_cache.get(username.lower())
+
+		if cached is not None and hmac.compare_digest(cached, digest):
+			return True
+
 		with self.__create_db_connection__() as conn:
 			with conn.enter_scope() as scope:
 				self.__test_active_user__(scope, username)
 
-				return self.__validate_password__(scope, username, password)
+				valid = self.__validate_password__(scope, username, password)
+
+		if valid:
+			credentials_cache.put(username.lower(), digest)
+
+		return valid
 
 	## Generates a password request and email.
 	#  @param username a user account
@@ -414,7 +578,7 @@ class Application(UserTools, ObjectTools):
 
 				self.__mail_db.push_user_mail(scope, subject, body, user["id"])
 
-				mailer.ping(config.MAILER_HOST, config.MAILER_PORT)
+				self.__ping_mailer__()
 
 				scope.complete()
 
@@ -464,11 +628,13 @@ class Application(UserTools, ObjectTools):
 
 				self.__mail_db.push_user_mail(scope, subject, body, user["id"])
 
-				mailer.ping(config.MAILER_HOST, config.MAILER_PORT)
+				self.__ping_mailer__()
 
 				scope.complete()
 
-				return username, new_password1
+		self.__evict_after_commit__(credentials_cache, username.lower())
+
+		return username, new_password1
 
 	## Updates the details of a user account.
 	#  @param username a user account
@@ -515,6 +681,8 @@ class Application(UserTools, ObjectTools):
 
 				scope.complete()
 
+		self.__evict_after_commit__(profile_cache, ("user", username.lower()))
+
 	## Updates the avatar of a user account.
 	#  @param username a user account
 	#  @param filename filename of the image
@@ -536,7 +704,9 @@ class Application(UserTools, ObjectTools):
 				self.__user_db.update_avatar(scope, username, avatar)
 				scope.complete()
 
-				return avatar
+		self.__evict_after_commit__(profile_cache, ("user", username.lower()))
+
+		return avatar
 
 	## Gets all details of a user account excepting blocked status and password.
 	#  @param username a user account
@@ -578,26 +748,40 @@ class Application(UserTools, ObjectTools):
 	## Finds users by a search query.
 	#  @param account user account who searches the data store
 	#  @param query a search query
-	#  @return a dictionary holding user details: { "id": int, "username": str,
+	#  @param page_size maximum number of found users, limited to config.SEARCH_MAX_PAGE_SIZE
+	#  @param after cursor of the previous page, if specified only users following the last user of the page are returned
+	#  @return a database.Page, each element is a dictionary holding user details: { "id": int, "username": str,
 	#          "firstname": str, "lastname": str, "email": str, "gender": str,
 	#          "created_on": datetime, "avatar": str, "protected": bool,
 	#          "blocked": bool, "following": [str] }; if the account is
 	#          protected and the user is not following the requester the
 	#          fields "email", "avatar" and "following" aren't available
-	def find_user(self, account, query):
+	def find_user(self, account, query, page_size=100, after=None):
+		if not validate_search_query(query):
+			raise exception.InvalidParameterException("query")
+
+		if page_size < 1:
+			raise exception.InvalidParameterException("page_size")
+
+		page_size = min(page_size, config.SEARCH_MAX_PAGE_SIZE)
+
 		with self.__create_db_connection__() as conn:
 			with conn.enter_scope() as scope:
 				self.__test_active_user__(scope, account)
 
 				# search users:
 				laccount = account.lower()
-				result = []
+				page = self.__user_db.search(scope, query, page_size, after)
+
+				# load user details:
+				users = filter(lambda user: user["username"].lower() <> laccount, page)
+
+				cache = UserCache(self.__user_db, account)
+				cache.load(scope, map(lambda user: user["id"], users))
 
-				for username in self.__user_db.search(scope, query):
-					if username.lower() <> laccount:
-						result.append(self.__get_user_details__(scope, account, username))
+				page[:] = map(lambda user: cache.lookup_by_id(scope, user["id"]), users)
 
-				return result
+				return page
 
 	## Lets one user follow another user. The followed user receives a notification.
 	#  @param user1 user who wants to follow another user
@@ -628,6 +812,10 @@ class Application(UserTools, ObjectTools):
 
 				scope.complete()
 
+		self.__evict_after_commit__(profile_cache, ("following", user1.lower()))
+
+		self.__ping_fanout_worker__()
+
 	## Tests if two users are friends.
 	#  @param user1 a username
 	#  @param user2 a username
@@ -689,6 +877,8 @@ class Application(UserTools, ObjectTools):
 
 				scope.complete()
 
+		context.after_commit(tag_cloud_cache.clear)
+
 	## Gets object details.
 	#  @param guid an object guid
 	#  @return a dictionary holding object details: { "guid": str, "source": str, "locked": bool,
@@ -704,36 +894,39 @@ class Application(UserTools, ObjectTools):
 	## Gets objects from the data store.
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return a dictionary holding object details: { "guid": str, "source": str, "locked": bool,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page holding object details: { "guid": str, "source": str, "locked": bool,
 	#          "reported": bool, "tags": [ str, str, ... ], "score": { "up": int, "down": int, "fav": int },
 	#          "created_on": datetime, "comments_n": int, "reported": bool }
-	def get_objects(self, page=0, page_size=10):
+	def get_objects(self, page=0, page_size=10, after=None):
 		with self.__create_db_connection__() as conn:
 			with conn.enter_scope() as scope:
-				return self.__object_db.get_objects(scope, page, page_size)
+				return self.__object_db.get_objects(scope, page, page_size, after)
 
 	## Gets the most popular objects.
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return a dictionary holding object details: { "guid": str, "source": str, "locked": bool,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page holding object details: { "guid": str, "source": str, "locked": bool,
 	#          "reported": bool, "tags": [ str, str, ... ], "score": { "up": int, "down": int, "fav": int },
 	#          "created_on": datetime, "comments_n": int, "reported": bool }
-	def get_popular_objects(self, page=0, page_size=10):
+	def get_popular_objects(self, page=0, page_size=10, after=None):
 		with self.__create_db_connection__() as conn:
 			with conn.enter_scope() as scope:
-				return self.__object_db.get_popular_objects(scope, page, page_size)
+				return self.__object_db.get_popular_objects(scope, page, page_size, after)
 
 	## Gets objects assigned to a tag.
 	#  @param tag tag to search
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return a dictionary holding object details: { "guid": str, "source": str, "locked": bool,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page holding object details: { "guid": str, "source": str, "locked": bool,
 	#          "reported": bool, "tags": [ str, str, ... ], "score": { "up": int, "down": int, "fav": int },
 	#          "created_on": datetime, "comments_n": int, "reported": bool }
-	def get_tagged_objects(self, tag, page=0, page_size=10):
+	def get_tagged_objects(self, tag, page=0, page_size=10, after=None):
 		with self.__create_db_connection__() as conn:
 			with conn.enter_scope() as scope:
-				return self.__object_db.get_tagged_objects(scope, tag, page, page_size)
+				return self.__object_db.get_tagged_objects(scope, tag, page, page_size, after)
 
 	## Gets random objects.
 	#  @param page_size number of objects the method should(!) return
@@ -771,12 +964,21 @@ class Application(UserTools, ObjectTools):
 
 				scope.complete()
 
-	## Gets a tag cloud.
-	#  @return an array holding tag details: [ { "tag": str, "count": int }, ... ]
+		context.after_commit(tag_cloud_cache.clear)
+
+	## Gets the most used tags. The tag cloud is cached for config.TAG_CLOUD_TTL seconds.
+	#  @return an array holding tag details ordered by usage: [ { "tag": str, "count": int }, ... ]
 	def get_tag_cloud(self):
-		with self.__create_db_connection__() as conn:
-			with conn.enter_scope() as scope:
-				return self.__object_db.get_tags(scope)
+		tags = tag_cloud_cache.get("tags")
+
+		if tags is None:
+			with self.__create_db_connection__() as conn:
+				with conn.enter_scope() as scope:
+					tags = self.__object_db.get_tags(scope, config.TAG_CLOUD_SIZE)
+
+			tag_cloud_cache.put("tags", tags)
+
+		return map(dict, tags)
 
 	## Upvotes/Downvotes an object.
 	#  @param username user who wants to vote
@@ -797,6 +999,8 @@ class Application(UserTools, ObjectTools):
 
 				scope.complete()
 
+		self.__ping_fanout_worker__()
+
 	## Gets the voting of a user for an object.
 	#  @param username a username
 	#  @param guid guid of an object
@@ -865,22 +1069,25 @@ class Application(UserTools, ObjectTools):
 
 				scope.complete()
 
+		self.__ping_fanout_worker__()
+
 	## Gets comments assigned to an object.
 	#  @param username user who wants to receive the comments
 	#  @param guid guid of an object
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return an array, each element is a dictionary holding a comment, the received user details of the author
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page, each element is a dictionary holding a comment, the received user details of the author
 	#          depend on the friendship status: [ { "text": str, "timestamp": datetime, "deleted": bool,
 	#          "user": { } } ]
-	def get_comments(self, guid, username, page=0, page_size=100):
+	def get_comments(self, guid, username, page=0, page_size=100, after=None):
 		with self.__create_db_connection__() as conn:
 			with conn.enter_scope() as scope:
 				self.__test_active_user__(scope, username)
 				self.__test_object_exists__(scope, guid)
 
 				user = self.__user_db.get_user(scope, username)
-				comments = self.__object_db.get_comments(scope, guid, page, page_size)
+				comments = self.__object_db.get_comments(scope, guid, page, page_size, after)
 				cache = UserCache(self.__user_db, username)
 
 				for comment in comments:
@@ -945,26 +1152,29 @@ class Application(UserTools, ObjectTools):
 
 				scope.complete()
 
+		self.__ping_fanout_worker__()
+
 	## Gets objects recommended to a user.
 	#  @param username a user account
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return an array, each element is a dictionary holding object details ({ "guid": str, "source": str,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page, each element is a dictionary holding object details ({ "guid": str, "source": str,
 	#          "locked": bool, "tags": [ str, str, ... ], "score": { "up": int, "down": int, "fav": int, "total": int },
 	#          "timestamp": float, "comments_n": int })
-	def get_recommendations(self, username, page=0, page_size=10):
+	def get_recommendations(self, username, page=0, page_size=10, after=None):
 		with self.__create_db_connection__() as conn:
 			with conn.enter_scope() as scope:
 				self.__test_active_user__(scope, username)
 
 				cache = UserCache(self.__user_db, username)
-				recommendations = self.__user_db.get_recommendations(scope, username, page, page_size)
+				recommendations = self.__user_db.get_recommendations(scope, username, page, page_size, after)
 
 				for r in recommendations:
 					r["from"] = cache.lookup(scope, r["username"])
 					del r["username"]
 
-					r["object"] = self.get_object(r["guid"])
+					r["object"] = dict((k, v) for k, v in r.items() if k not in ["from", "recommended_on"])
 					del r["guid"]
 
 				return recommendations
@@ -992,16 +1202,12 @@ class Application(UserTools, ObjectTools):
 			with conn.enter_scope() as scope:
 				self.__test_active_user__(scope, username)
 
-				messages = []
 				cache = UserCache(self.__user_db, username)
 
 				if after is not None:
 					after = datetime.fromtimestamp(int(after))
 
-				for msg in self.__stream_db.get_messages(scope, username, limit, after):
-					messages.append(self.__build_message__(scope, username, cache, msg))
-
-				return messages
+				return self.__build_messages__(scope, cache, self.__stream_db.get_messages(scope, username, limit, after))
 
 	## Gets public messages.
 	#  @param username a user account
@@ -1015,57 +1221,97 @@ class Application(UserTools, ObjectTools):
 			with conn.enter_scope() as scope:
 				self.__test_active_user__(scope, username)
 
-				messages = []
 				cache = UserCache(self.__user_db, username)
 
-				for msg in self.__stream_db.get_public_messages(scope, limit, older_than):
-					messages.append(self.__build_message__(scope, username, cache, msg))
+				return self.__build_messages__(scope, cache, self.__stream_db.get_public_messages(scope, limit, older_than))
+
+	# hydrates stream messages: referenced objects, comments, votings & users are fetched with
+	# a fixed number of queries independent from the number of messages
+	def __build_messages__(self, scope, cache, rows):
+		user_ids = set()
+		guids = set()
+		comment_ids = set()
+		voters = set()
+		voted = set()
+
+		# collect references:
+		for m in rows:
+			source = int(m["source"])
+			user_ids.add(source)
+
+			if m["type"] == "recommendation":
+				guids.add(m["target"])
+
+			elif m["type"] == "wrote-comment":
+				comment_ids.add(int(m["target"]))
+
+			elif m["type"] == "voted-object":
+				guids.add(m["target"])
+				voted.add(m["target"])
+				voters.add(source)
+
+		comments = self.__object_db.get_comments_by_id(scope, comment_ids)
 
-				return messages
+		for comment in comments.itervalues():
+			guids.add(comment["object-guid"])
+			user_ids.add(comment["user_id"])
 
-	def __build_message__(self, scope, username, cache, m):
+		objects = self.__object_db.get_objects_by_guid(scope, guids)
+		votings = self.__object_db.get_votings(scope, voted, voters)
+
+		cache.load(scope, user_ids)
+
+		# build messages:
+		messages = []
+
+		for m in rows:
+			messages.append(self.__build_message__(scope, cache, m, objects, comments, votings))
+
+		return messages
+
+	def __build_message__(self, scope, cache, m, objects, comments, votings):
 		msg = {}
 
 		for k in ["id", "created_on", "type"]:
 			msg[k] = m[k]
 
-		source = cache.lookup_by_id(scope, m["source"])
-		msg["source"] = source
+		msg["source"] = cache.lookup_by_id(scope, m["source"])
 
 		if m["type"] == "recommendation":
-			guid = m["target"]
-			self.__test_object_exists__(scope, guid)
-
-			msg["target"] = self.__object_db.get_object(scope, guid)
+			msg["target"] = self.__lookup_object__(objects, m["target"])
 
 		elif m["type"] == "wrote-comment":
-			id = m["target"]
+			try:
+				comment = dict(comments[int(m["target"])])
 
-			if not self.__object_db.comment_exists(scope, id):
+			except KeyError:
 				raise exception.NotFoundException("Comment not found.")
 
-			comment = self.__object_db.get_comment(scope, id)
-			self.__prepare_comment__(scope, comment, cache)
+			del comment["user_id"]
 
-			guid = comment["object-guid"]
+			self.__prepare_comment__(scope, comment, cache)
 
-			comment["object"] = self.__object_db.get_object(scope, guid)
+			comment["object"] = self.__lookup_object__(objects, comment["object-guid"])
 
 			del comment["object-guid"]
 
 			msg["target"] = comment
 
 		elif m["type"] == "voted-object":
-			guid = m["target"]
-			self.__test_object_exists__(scope, guid)
-
-			obj = self.__object_db.get_object(scope, guid)
-			voting = self.__object_db.get_voting(scope, m["target"], source["username"])
+			obj = self.__lookup_object__(objects, m["target"])
+			voting = votings.get((m["target"], int(m["source"])))
 
 			msg["target"] = { "object": obj, "voting": voting }
 
 		return msg
 
+	def __lookup_object__(self, objects, guid):
+		try:
+			return objects[guid]
+
+		except KeyError:
+			raise exception.ObjectNotFoundException()
+
 	def __prepare_comment_no_cache__(self, scope, comment, username):
 		# set author's user details:
 		comment["user"] = self.__get_user_details__(scope, username, comment["username"])
@@ -1085,6 +1331,22 @@ class Application(UserTools, ObjectTools):
 		if comment["deleted"]:
 			comment["text"] = ""
 
-	# creates a database connection:
+	# removes a cache entry after the transaction has been committed, concurrent requests would
+	# otherwise cache the old value again before the change is visible:
+	def __evict_after_commit__(self, c, key):
+		context.after_commit(lambda: c.remove(key))
+
+	# triggers the fan-out worker after the transaction has been committed:
+	def __ping_fanout_worker__(self):
+		if config.STREAM_WORKER:
+			context.after_commit(lambda: fanout.ping(config.FANOUT_HOST, config.FANOUT_PORT))
+
+	# triggers the mailer after the transaction has been committed (queued mails also wake up
+	# the mailer by a database notification):
+	def __ping_mailer__(self):
+		if config.MAILER_UDP_ENABLED:
+			context.after_commit(lambda: mailer.ping(config.MAILER_HOST, config.MAILER_PORT))
+
+	# creates a database connection (shared with the active request context):
 	def __create_db_connection__(self):
-		return factory.create_db_connection()
+		return context.create_db_connection()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+	project............: meat-a
+	description........: web application for sharing meta information
+	date...............: 04/2013
+	copyright..........: Sebastian Fedrau
+
+	Permission is hereby granted, free of charge, to any person obtaining
+	a copy of this software and associated documentation files (the
+	"Software"), to deal in the Software without restriction, including
+	without limitation the rights to use, copy, modify, merge, publish,
+	distribute, sublicense, and/or sell copies of the Software, and to
+	permit persons to whom the Software is furnished to do so, subject to
+	the following conditions:
+
+	The above copyright notice and this permission notice shall be
+	included in all copies or substantial portions of the Software.
+
+	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+	EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+	MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+	IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+	OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+	ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+	OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+##
+#  @file cache.py
+#  In-memory caching.
+
+## @package cache
+#  In-memory caching.
+
+import collections, threading, time
+
+## A thread-safe cache with a limited number of entries. Entries expire after a time-to-live,
+#  the least recently used entry is removed when the cache is full.
+class Cache:
+	## The constructor.
+	#  @param max_size maximum number of entries (0 to disable the cache)
+	#  @param ttl time-to-live of each entry (in seconds)
+	def __init__(self, max_size=1000, ttl=60):
+		self.__items = collections.OrderedDict()
+		self.__lock = threading.Lock()
+		self.__max_size = max_size
+		self.__ttl = ttl
+		self.__hits = 0
+		self.__misses = 0
+		self.__evictions = 0
+
+	## Gets a cached value.
+	#  @param key key of the entry
+	#  @return the cached value or None if the entry doesn't exist or has expired
+	def get(self, key):
+		with self.__lock:
+			try:
+				value, expiry = self.__items.pop(key)
+
+				if expiry > time.time():
+					self.__items[key] = (value, expiry)
+					self.__hits += 1
+
+					return value
+
+			except KeyError:
+				pass
+
+			self.__misses += 1
+
+		return None
+
+	## Stores a value.
+	#  @param key key of the entry
+	#  @param value value to store
+	def put(self, key, value):
+		with self.__lock:
+			if self.__max_size <= 0:
+				return
+
+			self.__items.pop(key, None)
+			self.__items[key] = (value, time.time() + self.__ttl)
+
+			while len(self.__items) > self.__max_size:
+				self.__items.popitem(last=False)
+				self.__evictions += 1
+
+	## Removes an entry.
+	#  @param key key of the entry to remove
+	def remove(self, key):
+		with self.__lock:
+			self.__items.pop(key, None)
+
+	## Removes all entries.
+	def clear(self):
+		with self.__lock:
+			self.__items.clear()
+
+	## Gets cache statistics.
+	#  @return a dictionary: { "hits": int, "misses": int, "hit_rate": float, "evictions": int,
+	#          "size": int, "max_size": int }
+	def get_stats(self):
+		with self.__lock:
+			total = self.__hits + self.__misses
+			hit_rate = 0.0
+
+			if total > 0:
+				hit_rate = float(self.__hits) / total
+
+			return { "hits": self.__hits, "misses": self.__misses, "hit_rate": hit_rate, "evictions": self.__evictions,
+			         "size": len(self.__items), "max_size": self.__max_size }
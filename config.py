@@ -42,6 +42,10 @@ WEBSITE_URL               = "http://localhost:8000"
 
 ## Directory where to find template files.
 TEMPLATE_DIR              = "tpl"
+## Compile all templates when the WSGI application is loaded.
+TEMPLATE_PRECOMPILE       = True
+## Compile templates again when their file has been modified (development).
+TEMPLATE_AUTO_RELOAD      = False
 
 ## Hostname of the PSQL server.
 PG_HOST = "127.0.0.1"
@@ -54,6 +58,17 @@ PG_USER = "meat-a"
 ## PSQL password.
 PG_PWD  = "123456"
 
+## Number of PSQL connections opened when the connection pool is created.
+PG_POOL_MIN_SIZE       = 2
+## Maximum number of PSQL connections held by the connection pool.
+PG_POOL_MAX_SIZE       = 20
+## PSQL connections are closed and replaced after this number of seconds (0 to disable).
+PG_POOL_MAX_LIFETIME   = 3600
+## Seconds to wait for a free PSQL connection before giving up.
+PG_POOL_TIMEOUT        = 10
+## Idle PSQL connections are tested before checkout when unused for this number of seconds.
+PG_POOL_CHECK_INTERVAL = 30
+
 ## Languages supported by the application.
 LANGUAGES                 = ["en"]
 ## Default language.
@@ -65,8 +80,12 @@ LOGGING_NAME              = "meat-a"
 LOGGING_VERBOSITY         = logging.INFO
 ## Logging handler.
 LOGGING_HANDLER           = logging.StreamHandler
-## Log format.
-LOGGING_FORMAT            = "%(levelname)s %(message)s"
+## Log format. "%(request_id)s" is replaced by the id of the current request ("-" if the
+#  message isn't related to a request).
+LOGGING_FORMAT            = "%(levelname)s %(request_id)s %(message)s"
+## Maximum number of log records waiting to be written by the background thread (0 to write
+#  records in the logging thread). Records are dropped when the queue is full.
+LOGGING_QUEUE_SIZE        = 10000
 
 ## Specifies how long a timestamp sent within a request is valid (in seconds).
 REQUEST_EXPIRY_TIME       = 60
@@ -84,6 +103,30 @@ DEFAULT_PASSWORD_LENGTH   = 8
 ## Length of generated passwords.
 PASSWORD_SALT_LENGTH      = 32
 
+## Maximum number of verified HTTP basic authentication credentials cached by each
+#  process (0 to disable the cache).
+AUTH_CACHE_SIZE           = 1000
+## Seconds verified credentials are cached. The process handling a password change removes
+#  the cached entry after the transaction has been committed, other processes accept the old
+#  password until the entry expires.
+AUTH_CACHE_TTL            = 60
+
+## Maximum number of user profiles, followed user lists and user ids cached by each process
+#  (0 to disable the cache).
+PROFILE_CACHE_SIZE        = 10000
+## Seconds user profiles are cached. The process handling a profile change removes the cached
+#  entry after the transaction has been committed, other processes return the old profile until
+#  the entry expires.
+PROFILE_CACHE_TTL         = 30
+
+## Maximum number of users returned by a single search request.
+SEARCH_MAX_PAGE_SIZE      = 100
+
+## Maximum number of tags returned by the tag cloud.
+TAG_CLOUD_SIZE            = 100
+## Seconds the tag cloud is cached by each process (0 to disable the cache).
+TAG_CLOUD_TTL             = 60
+
 ## Location for storing temporary files.
 TMP_DIR                   = "tmp"
 
@@ -117,6 +160,32 @@ PASSWORD_RESETS_PER_HOUR  = 5
 IP_REQUESTS_PER_HOUR      = 2000
 ## Number of allowed HTTP requests per hour from the same user account.
 USER_REQUESTS_PER_HOUR    = 1000
+## Rate limiter backend: "memory" counts requests in each process, "memcached" shares the
+#  counters between multiple processes (requires python-memcached).
+RATE_LIMIT_BACKEND        = "memory"
+## memcached servers used by the "memcached" rate limiter backend.
+RATE_LIMIT_SERVERS        = ["127.0.0.1:11211"]
+
+## Stream mode: "write" copies comment and vote notifications into the message stream of each
+#  follower when the event occurs (fan-out-on-write), "read" stores a single activity per event
+#  and merges the activities of followed users when the stream is read (fan-out-on-read).
+#  The database triggers have to be rebuilt (sql/triggers.sql) after changing the mode.
+STREAM_FANOUT             = "write"
+## If True the message triggers only append a compact event to an outbox table and the fan-out
+#  worker (fanout.py) creates the messages in the background. The database triggers have to be
+#  rebuilt (sql/triggers.sql) after changing this setting.
+STREAM_WORKER             = False
+
+## IP address where the fan-out worker should listen.
+FANOUT_HOST               = "127.0.0.1"
+## Port of the fan-out worker.
+FANOUT_PORT               = 9798
+## Array storing IP addresses of clients which are allowed to send PING requests to the fan-out worker.
+FANOUT_ALLOWED_CLIENTS    = ["127.0.0.1"]
+## Defines when the fan-out worker checks for new events automatically (in seconds).
+FANOUT_CHECK_INTERVAL     = 10
+## Maximum number of events expanded in a single transaction.
+FANOUT_BATCH_SIZE         = 1000
 
 ## IP address where the mailer should listen.
 MAILER_HOST               = "127.0.0.1"
@@ -124,10 +193,30 @@ MAILER_HOST               = "127.0.0.1"
 MAILER_PORT               = 9797
 ## Array storing IP addresses of clients which are allowed to send PING requests to the mailer.
 MAILER_ALLOWED_CLIENTS    = ["127.0.0.1"]
-## The UDP timeout.
-MAILER_UDP_TIMEOUT        = 5
+## Enables the UDP listener of the mailer. Queued mails wake up the mailer by a database
+#  notification, so pinging the mailer over UDP is only required if the mail queue is
+#  filled by external programs bypassing the database trigger.
+MAILER_UDP_ENABLED        = False
 ## Defines when the mailer checks for new mails automatically (in seconds).
 MAIL_CHECK_INTERVAL       = 60
+## Number of threads sending mails. Each thread has its own SMTP connection.
+MAILER_WORKERS            = 4
+## Maximum number of mails a worker claims at once.
+MAILER_BATCH_SIZE         = 50
+## Seconds claimed mails are reserved for a worker. Mails which haven't been flagged when the
+#  lease expires (e.g. because the mailer crashed) are sent again.
+MAILER_LEASE              = 600
+## Maximum number of attempts to send a mail before it's flagged as failed.
+MAILER_MAX_ATTEMPTS       = 8
+## Seconds to wait before a failed mail is sent again. The delay doubles after each attempt.
+MAILER_RETRY_DELAY        = 60
+## Maximum delay between two attempts to send a mail (in seconds).
+MAILER_MAX_RETRY_DELAY    = 21600
+## Seconds a worker waits before it retries when the SMTP server isn't available. The delay
+#  doubles until the server is available again, mails don't lose an attempt meanwhile.
+MAILER_BACKOFF            = 10
+## Maximum delay before a worker retries to connect to the SMTP server (in seconds).
+MAILER_MAX_BACKOFF        = 600
 
 ## A SMTP server.
 SMTP_HOST                 = ""
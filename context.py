@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+	project............: meat-a
+	description........: web application for sharing meta information
+	date...............: 04/2013
+	copyright..........: Sebastian Fedrau
+
+	Permission is hereby granted, free of charge, to any person obtaining
+	a copy of this software and associated documentation files (the
+	"Software"), to deal in the Software without restriction, including
+	without limitation the rights to use, copy, modify, merge, publish,
+	distribute, sublicense, and/or sell copies of the Software, and to
+	permit persons to whom the Software is furnished to do so, subject to
+	the following conditions:
+
+	The above copyright notice and this permission notice shall be
+	included in all copies or substantial portions of the Software.
+
+	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+	EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+	MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+	IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+	OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+	ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+	OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+##
+#  @file context.py
+#  Request scoped state.
+
+## @package context
+#  Request scoped state.
+
+import threading, factory, database
+
+## Thread-local storage holding the active RequestContext.
+local = threading.local()
+
+## State shared by all steps processing a single HTTP request (authentication, rate
+#  limiting and the request handler). The steps share one database connection and
+#  transaction, the connection is taken from the pool when it's needed the first time.
+class RequestContext:
+	## The constructor.
+	#  @param request_id id of the request
+	#  @param read_only True to run the request handler in a read-only transaction
+	def __init__(self, request_id, read_only=False):
+		## Id of the request.
+		self.request_id = request_id
+		## True if the request handler doesn't modify data.
+		self.read_only = read_only
+
+		self.__conn = None
+		self.__scope = None
+		self.__restricted = False
+		self.__after_commit = []
+
+	def __enter__(self):
+		if get_current() is not None:
+			raise Exception("Cannot nest request contexts.")
+
+		local.context = self
+
+		return self
+
+	def __exit__(self, type, value, traceback):
+		local.context = None
+
+		if self.__conn is not None:
+			try:
+				if type is None:
+					self.__scope.complete()
+
+				self.__scope.__exit__(type, value, traceback)
+
+			finally:
+				self.__conn.close()
+				self.__conn = None
+
+		if type is None:
+			for f in self.__after_commit:
+				f()
+
+	## Registers a function called after the transaction of the request has been committed.
+	#  @param f function to call
+	def after_commit(self, f):
+		self.__after_commit.append(f)
+
+	## Gets a connection sharing the database connection and transaction of the request.
+	#  @return a database.SharedConnection instance
+	def get_db_connection(self):
+		if self.__conn is None:
+			self.__conn = factory.create_db_connection()
+			self.__scope = self.__conn.enter_scope()
+			self.__scope.__enter__()
+
+			if self.__restricted:
+				self.__conn.set_read_only()
+
+		return database.SharedConnection(self.__conn)
+
+	## Called before the request handler runs. Switches the shared transaction to read-only
+	#  mode if the request doesn't modify data.
+	def enter_handler(self):
+		if self.read_only and not self.__restricted:
+			self.__restricted = True
+
+			if self.__conn is not None:
+				self.__conn.set_read_only()
+
+## Gets the RequestContext of the current thread.
+#  @return a RequestContext instance or None
+def get_current():
+	return getattr(local, "context", None)
+
+## Calls a function after the transaction of the active RequestContext has been committed.
+#  If no RequestContext is active the function is called immediately.
+#  @param f function to call
+def after_commit(f):
+	ctx = get_current()
+
+	if ctx is None:
+		f()
+	else:
+		ctx.after_commit(f)
+
+## Creates a database.Connection instance. If a RequestContext is active the returned
+#  connection shares the connection and transaction of the request.
+#  @return a database.Connection instance
+def create_db_connection():
+	ctx = get_current()
+
+	if ctx is None:
+		return factory.create_db_connection()
+
+	return ctx.get_db_connection()
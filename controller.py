@@ -32,7 +32,7 @@
 ## @package controller
 #  Controller classes.
 
-import config, app, view, exception, util, template, factory, re, sys, inspect, os, logger, mimetypes
+import config, app, view, exception, util, template, factory, context, re, sys, inspect, os, logger, mimetypes
 from base64 import b64decode, b64encode
 
 ## Converts an exception to a view.JSONView.
@@ -71,11 +71,48 @@ def exception_to_html_view(e):
 
 	return v
 
+## Handler metadata of controller classes (built on first use, see get_handlers()).
+handlers = {}
+
+## Gets the request handlers of a controller class. Argument names, default values and
+#  required parameters are read once and cached for subsequent requests.
+#  @param cls a Controller class
+#  @return a dictionary: { "handlers": { "get": { "name": str, "args": [ str, ... ],
+#          "defaults": [ object, ... ], "required": [ str, ... ] }, ... }, "allowed": str }
+def get_handlers(cls):
+	try:
+		return handlers[cls]
+
+	except KeyError:
+		pass
+
+	info = {"handlers": {}}
+	allowed = ["OPTIONS"]
+
+	for name in ["__get__", "__post__", "__delete__", "__put__"]:
+		f = getattr(cls, name).__func__
+
+		# skip "self" and "env" arguments & align default values with argument names:
+		spec = inspect.getargspec(f)
+		args = spec[0][2:]
+		defaults = list(spec[3] or [])
+		defaults = [None] * (len(args) - len(defaults)) + defaults
+
+		info["handlers"][name[2:-2]] = {"name": name, "args": args, "defaults": defaults, "required": getattr(f, "__required__", [])}
+
+		if not f is getattr(Controller, name).__func__:
+			allowed.append(name[2:-2].upper())
+
+	info["allowed"] = ", ".join(allowed)
+	handlers[cls] = info
+
+	return info
+
 ## Controller base class.
 class Controller:
 	def __init__(self, exception_handler=exception_to_json_view):
-		## An app.Application instance.
-		self.app = app.Application()
+		## The shared app.Application instance.
+		self.app = app.get_application()
 		## Function to convert exceptions to a view.View instance.
 		self.__exception_handler = exception_handler
 		## A logger.
@@ -94,41 +131,34 @@ class Controller:
 			if method == "OPTIONS":
 				return self.__options__()
 
-			m = {"post": self.__post__, "get": self.__get__, "put": self.__put__, "delete": self.__delete__}
-
 			self.__start_process__(env, **kwargs)
 			self.__check_rate_limit__(env)
 
-			f = m[method.lower()]
+			# switch shared transaction to read-only mode (if requested):
+			ctx = context.get_current()
 
-			# get function argument names:
-			spec = inspect.getargspec(f)
-			argnames = spec[0][2:]
+			if ctx is not None:
+				ctx.enter_handler()
 
-			# get argument values from kwargs:
-			values = util.select_values(kwargs, argnames)
+			handler = get_handlers(self.__class__)["handlers"][method.lower()]
 
-			# set default values:
-			defaults = spec[3]
+			# get argument values from kwargs & set default values:
+			args = [env]
 
-			if not defaults is None:
-				diff = len(values) - len(defaults)
+			for name, default in zip(handler["args"], handler["defaults"]):
+				value = kwargs.get(name)
 
-				for i in range(len(values)):
-					if values[i] is None and i >= diff:
-						values[i] = defaults[diff - i]
+				if value is None:
+					value = default
 
-			# test required parameters:
-			if hasattr(f, "__required__"):
-				for k, v in dict(zip(argnames, values)).items():
-					if k in f.__required__ and v is None:
-						raise exception.MissingParameterException(k)
+				# test required parameters:
+				if value is None and name in handler["required"]:
+					raise exception.MissingParameterException(name)
 
-			# merge argument list:
-			args = [env] + values
+				args.append(value)
 
 			# call method:
-			v = apply(f, args)
+			v = apply(getattr(self, handler["name"]), args)
 
 			# default headers:
 			if not v.headers.has_key("Cache-Control"):
@@ -149,42 +179,32 @@ class Controller:
 	def __check_rate_limit__(self, env):
 		self.log.debug("Checking rate limit.")
 
-		if not config.LIMIT_REQUESTS_BY_IP:
-			return
-
-		address = env["REMOTE_ADDR"]
-
-		with factory.create_db_connection() as conn:
-			with conn.enter_scope() as scope:
-				db = factory.create_request_db()
-
-				count = db.count_requests_by_ip(scope, address, 3600)
-
-				self.log.debug("'%s' has made %d of %d allowed requests.", address, count, config.IP_REQUESTS_PER_HOUR)
-
-				if count > config.IP_REQUESTS_PER_HOUR:
-					raise exception.HTTPException(402, "IP request limit reached.")
+		if config.LIMIT_REQUESTS_BY_IP:
+			self.__consume__("ip:%s" % env["REMOTE_ADDR"], config.IP_REQUESTS_PER_HOUR, "IP request limit reached.")
 
-				db.add_request(scope, address)
+	def __consume__(self, key, limit, message):
+		if not factory.get_rate_limiter().consume(key, limit, 3600):
+			self.log.info("Rate limit reached: '%s' (%d requests per hour).", key, limit)
 
-				scope.complete()
+			raise exception.HTTPException(402, message)
 
 	def __method_not_supported__(self):
 		return self.__exception_handler(exception.MethodNotSupportedException())
 
-	def __options__(self):
-		methods = ["OPTIONS"]
+	def __page_view__(self, page):
+		v = view.JSONView(200, True)
+		v.bind(page)
 
-		for m in ["__get__", "__post__", "__delete__", "__put__"]:
-			f = getattr(self, m).__func__
-			b = getattr(Controller, m).__func__
+		if page.cursor is not None:
+			v.headers["X-Next-Cursor"] = page.cursor
+			v.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor"
 
-			if not f is b:
-				methods.append(m[2:-2].upper())
+		return v
 
+	def __options__(self):
 		v = view.View("text/plain", 200)
 
-		v.headers["Access-Control-Allow-Methods"] = ", ".join(methods)
+		v.headers["Access-Control-Allow-Methods"] = get_handlers(self.__class__)["allowed"]
 		v.headers["Access-Control-Allow-Origin"] = "*"
 		v.headers["Access-Control-Allow-Headers"] = "accept, authorization"
 
@@ -255,45 +275,21 @@ class AuthorizedController(Controller):
 			raise exception.NotAuthorizedException()
 
 	def __check_rate_limit__(self, env):
-		self.log.debug("Checking rate limit.")
-
-		if not config.LIMIT_REQUESTS_BY_IP and not config.LIMIT_REQUESTS_BY_USER:
-			return
-
-		address = env["REMOTE_ADDR"]
-
-		with factory.create_db_connection() as conn:
-			with conn.enter_scope() as scope:
-				request_db = factory.create_request_db()
-				user_db = factory.create_user_db()
-
-				if config.LIMIT_REQUESTS_BY_IP:
-					count = request_db.count_requests_by_ip(scope, address, 3600)
-
-					self.log.debug("'%s' has made %d of %d allowed requests.", address, count, config.IP_REQUESTS_PER_HOUR)
+		Controller.__check_rate_limit__(self, env)
 
-					if count > config.IP_REQUESTS_PER_HOUR:
-						raise exception.HTTPException(402, "IP request limit reached.")
-
-				user_id = user_db.map_username(scope, self.username)
-
-				if config.LIMIT_REQUESTS_BY_USER:
-					count = request_db.count_requests_by_user_id(scope, user_id, 3600)
-
-					self.log.debug("'%s' (%d) has made %d of %d allowed requests.", self.username, user_id, count, config.USER_REQUESTS_PER_HOUR)
-
-					if count > config.USER_REQUESTS_PER_HOUR:
-						raise exception.HTTPException(402, "User request limit reached.")
-
-				request_db.add_request(scope, address, user_id)
-
-				scope.complete()
+		if config.LIMIT_REQUESTS_BY_USER:
+			self.__consume__("user:%s" % self.username.lower(), config.USER_REQUESTS_PER_HOUR, "User request limit reached.")
 
 ## Requests new user accounts.
 class AccountRequest(Controller):
 	def __init__(self):
 		Controller.__init__(self)
 
+	def __check_rate_limit__(self, env):
+		Controller.__check_rate_limit__(self, env)
+
+		self.__consume__("account-request:%s" % env["REMOTE_ADDR"], config.ACCOUNT_REQUESTS_PER_HOUR, "Account request limit reached.")
+
 	## Requests a user account.
 	#  @param env environment data
 	#  @param username name of the requested user account
@@ -325,8 +321,8 @@ class AccountActivation(Controller):
 	#  @param code activation code (optional)
 	#  @return a website
 	def __get__(self, env, id, code):
-		with factory.create_db_connection() as connection:
-			db = factory.create_user_db()
+		with context.create_db_connection() as connection:
+			db = factory.get_user_db()
 
 			with connection.enter_scope() as scope:
 				if not db.user_request_id_exists(scope, id):
@@ -393,6 +389,11 @@ class PasswordRequest(Controller):
 	def __init__(self):
 		Controller.__init__(self)
 
+	def __check_rate_limit__(self, env):
+		Controller.__check_rate_limit__(self, env)
+
+		self.__consume__("password-request:%s" % env["REMOTE_ADDR"], config.PASSWORD_RESETS_PER_HOUR, "Password request limit reached.")
+
 	## Requests a new password.
 	#  @param env environment data
 	#  @param username name of the user who wants to set a new password
@@ -424,8 +425,8 @@ class PasswordChange(Controller):
 	#  @param code a related code (optional)
 	#  @return a website
 	def __get__(self, env, id, code):
-		with factory.create_db_connection() as connection:
-			db = factory.create_user_db()
+		with context.create_db_connection() as connection:
+			db = factory.get_user_db()
 
 			with connection.enter_scope() as scope:
 				if not db.password_request_id_exists(scope, id):
@@ -567,7 +568,7 @@ class Avatar(AuthorizedController):
 				path = "%s.b64" % filename
 				mime = "text/plain"
 
-			v = view.FileView(200, mime)
+			v = view.FileView(200, mime, env)
 			v.headers["Cache-Control"] = "max-age=900"
 			v.bind({"filename": path})
 
@@ -586,14 +587,19 @@ class Search(AuthorizedController):
 	## Searches the user database.
 	#  @param env environment data
 	#  @param query search query
-	#  @return a list with found usernames
-	def __get__(self, env, query):
-		m = self.app.find_user(self.username, query)
+	#  @param page_size page size
+	#  @param after cursor of the previous page (see "X-Next-Cursor" header)
+	#  @return found users ordered by username
+	def __get__(self, env, query, page_size=100, after=None):
+		try:
+			page_size = int(page_size)
 
-		v = view.JSONView(200)
-		v.bind(m)
+		except ValueError:
+			raise exception.InvalidParameterException("page_size")
 
-		return v
+		m = self.app.find_user(self.username, query, page_size, after)
+
+		return self.__page_view__(m)
 
 ## Updates or gets friendship details.
 class Friendship(AuthorizedController):
@@ -660,7 +666,7 @@ class Messages(AuthorizedController):
 	def __get__(self, env, limit=50, after=None):
 		m = self.app.get_messages(self.username, int(limit), after)
 
-		v = view.JSONView(200)
+		v = view.JSONView(200, True)
 		v.bind(m)
 
 		return v
@@ -678,7 +684,7 @@ class PublicMessages(AuthorizedController):
 	def __get__(self, env, limit=50, after=None):
 		m = self.app.get_public_messages(self.username, int(limit), after)
 
-		v = view.JSONView(200)
+		v = view.JSONView(200, True)
 		v.bind(m)
 
 		return v
@@ -692,14 +698,12 @@ class Objects(AuthorizedController):
 	#  @param env environment data
 	#  @param page page index
 	#  @param page_size page size
+	#  @param after cursor of the previous page (see "X-Next-Cursor" header)
 	#  @return objects ordered by timestamp (descending)
-	def __get__(self, env, page=0, page_size=10):
-		m = self.app.get_objects(int(page), int(page_size))
-
-		v = view.JSONView(200)
-		v.bind(m)
+	def __get__(self, env, page=0, page_size=10, after=None):
+		m = self.app.get_objects(int(page), int(page_size), after)
 
-		return v
+		return self.__page_view__(m)
 
 ## Gets random objects.
 class RandomObjects(AuthorizedController):
@@ -727,14 +731,12 @@ class PopularObjects(AuthorizedController):
 	#  @param env environment data
 	#  @param page page index
 	#  @param page_size page size
+	#  @param after cursor of the previous page (see "X-Next-Cursor" header)
 	#  @return objects ordered by popularity
-	def __get__(self, env, page=0, page_size=10):
-		m = self.app.get_popular_objects(int(page), int(page_size))
+	def __get__(self, env, page=0, page_size=10, after=None):
+		m = self.app.get_popular_objects(int(page), int(page_size), after)
 
-		v = view.JSONView(200)
-		v.bind(m)
-
-		return v
+		return self.__page_view__(m)
 
 ## Gets objects filtered by tag.
 class TaggedObjects(AuthorizedController):
@@ -746,14 +748,12 @@ class TaggedObjects(AuthorizedController):
 	#  @param tag a tag
 	#  @param page page index
 	#  @param page_size page size
+	#  @param after cursor of the previous page (see "X-Next-Cursor" header)
 	#  @return objects assigned to a tag
-	def __get__(self, env, tag, page=0, page_size=10):
-		m = self.app.get_tagged_objects(tag, int(page), int(page_size))
-
-		v = view.JSONView(200)
-		v.bind(m)
+	def __get__(self, env, tag, page=0, page_size=10, after=None):
+		m = self.app.get_tagged_objects(tag, int(page), int(page_size), after)
 
-		return v
+		return self.__page_view__(m)
 
 ## Gets tag cloud.
 class TagCloud(AuthorizedController):
@@ -876,9 +876,10 @@ class Comments(AuthorizedController):
 	#  @param guid guid of an object
 	#  @param page page index
 	#  @param page_size page size
+	#  @param after cursor of the previous page (see "X-Next-Cursor" header)
 	#  @return object comments
-	def __get__(self, env, guid, page=0, page_size=50):
-		return self.__get_comments__(guid, page, page_size)
+	def __get__(self, env, guid, page=0, page_size=50, after=None):
+		return self.__get_comments__(guid, page, page_size, after)
 
 	__get__.__required__ = ["guid"]
 
@@ -894,13 +895,10 @@ class Comments(AuthorizedController):
 
 	__post__.__required__ = ["guid", "text"]
 
-	def __get_comments__(self, guid, page=0, page_size=50):
-		m = self.app.get_comments(guid, self.username, page, page_size)
-
-		v = view.JSONView(200)
-		v.bind(m)
+	def __get_comments__(self, guid, page=0, page_size=50, after=None):
+		m = self.app.get_comments(guid, self.username, int(page), int(page_size), after)
 
-		return v
+		return self.__page_view__(m)
 
 ## Gets a single comment.
 class Comment(AuthorizedController):
@@ -943,7 +941,7 @@ class FavoriteBase(AuthorizedController):
 	def __get_favorites__(self):
 		m = self.app.get_favorites(self.username)
 
-		v = view.JSONView(200)
+		v = view.JSONView(200, True)
 		v.bind(m)
 
 		return v
@@ -991,14 +989,12 @@ class Recommendations(AuthorizedController):
 	#  @param env environment data
 	#  @param page page index
 	#  @param page_size page size
+	#  @param after cursor of the previous page (see "X-Next-Cursor" header)
 	#  @return recommended objects
-	def __get__(self, env, page=0, page_size=10):
-		m = self.app.get_recommendations(self.username, int(page), int(page_size))
+	def __get__(self, env, page=0, page_size=10, after=None):
+		m = self.app.get_recommendations(self.username, int(page), int(page_size), after)
 
-		v = view.JSONView(200)
-		v.bind(m)
-
-		return v
+		return self.__page_view__(m)
 
 ## Recommends an object.
 class Recommendation(AuthorizedController):
@@ -52,7 +52,6 @@ class TransactionScope():
 
 	def __exit__(self, type, value, traceback):
 		# call backend specific deinitialization & listener:
-		self.__enter_scope__()
 		self.__leave_scope__(self.__completed)
 
 		for l in self.__listener:
@@ -88,7 +87,7 @@ class Connection():
 	__metaclass__ = abc.ABCMeta
 
 	def __init__(self):
-		self.__scope = None
+		self.__scopes = []
 
 	def __enter__(self):
 		return self
@@ -96,20 +95,33 @@ class Connection():
 	def __exit__(self, type, value, traceback):
 		self.close()
 
-	## Starts a new transaction.
+	## Starts a new transaction. If a transaction is already in progress the new scope is
+	#  nested into the active one.
 	#  @return a new TransactionScope instance
 	def enter_scope(self):
-		if self.__scope is not None:
-			raise Exception("Cannot nest transaction scopes.")
+		if len(self.__scopes) == 0:
+			scope = self.__create_transaction_scope__()
+		else:
+			scope = self.__create_nested_scope__(len(self.__scopes))
+
+		scope.add_listener(self)
+		self.__scopes.append(scope)
 
-		self.__scope = self.__create_transaction_scope__()
-		self.__scope.add_listener(self)
+		return scope
 
-		return self.__scope
+	## Switches the current transaction to read-only mode.
+	def set_read_only(self):
+		raise Exception("Read-only transactions not supported.")
 
 	@abc.abstractmethod
 	def __create_transaction_scope__(self): return None
 
+	## Creates a scope nested into the active transaction.
+	#  @param depth nesting level of the new scope
+	#  @return a new TransactionScope instance
+	def __create_nested_scope__(self, depth):
+		raise Exception("Cannot nest transaction scopes.")
+
 	## Closes the database connection.
 	@abc.abstractmethod
 	def close(self): return
@@ -119,7 +131,59 @@ class Connection():
 
 	## Called when the TransactionScope created with Connection::enter_scope() is leaved.
 	def scope_leaved(self, scope):
-		self.__scope = None
+		self.__scopes.remove(scope)
+
+## A Connection wrapper used to share a connection between multiple code blocks (e.g. all
+#  steps processing a single HTTP request). Scopes entered through the wrapper are nested
+#  into the active transaction of the wrapped connection. Closing the wrapper doesn't close
+#  the wrapped connection.
+class SharedConnection(Connection):
+	## The constructor.
+	#  @param conn the Connection to share
+	def __init__(self, conn):
+		Connection.__init__(self)
+		self.__conn = conn
+
+	def enter_scope(self):
+		return self.__conn.enter_scope()
+
+	def set_read_only(self):
+		self.__conn.set_read_only()
+
+	def __create_transaction_scope__(self): return None
+
+	def close(self): pass
+
+## Receives notifications sent on a channel of the database. The listener can be passed to
+#  select.select() to wait for notifications.
+class Listener():
+	__metaclass__ = abc.ABCMeta
+
+	## Gets the file descriptor to wait on for notifications.
+	#  @return a file descriptor
+	@abc.abstractmethod
+	def fileno(self): return None
+
+	## Reads the received notifications without blocking.
+	#  @return an array containing the payloads of the received notifications
+	@abc.abstractmethod
+	def poll(self): return None
+
+	## Closes the listener.
+	@abc.abstractmethod
+	def close(self): return
+
+## A list of records returned by a paginated query. The cursor of a page can be passed
+#  to the query to receive the records following the last record of the page.
+class Page(list):
+	## The constructor.
+	#  @param items records of the page
+	#  @param cursor an opaque string pointing to the last record of the page or None if
+	#                there are no further records
+	def __init__(self, items=[], cursor=None):
+		list.__init__(self, items)
+		## cursor pointing to the last record of the page
+		self.cursor = cursor
 
 ## This class provides functions required for unit testing.
 class TestDb(object):
@@ -242,6 +306,14 @@ class UserDb(object):
 	@abc.abstractmethod
 	def get_user(self, scope, username): return None
 
+	## Gets details of multiple user accounts (including deleted accounts).
+	#  @param scope a transaction scope
+	#  @param ids sequence of user ids
+	#  @return a dictionary mapping user ids to user details (see get_user()), each element has
+	#          an additional "deleted" field; unknown ids are not contained
+	@abc.abstractmethod
+	def get_users_by_id(self, scope, ids): return None
+
 	## Removes all password requests of the given user account.
 	#  @param scope a transaction scope
 	#  @param user_id a user id
@@ -314,12 +386,21 @@ class UserDb(object):
 	@abc.abstractmethod
 	def get_followed_usernames(self, scope, username): return None
 
-	## Searches the database.
+	## Gets the usernames of the accounts multiple users are following.
 	#  @param scope a transaction scope
-	#  @param query a search quey
-	#  @return an array containing usernames
+	#  @param ids sequence of user ids
+	#  @return a dictionary mapping user ids to arrays containing usernames
 	@abc.abstractmethod
-	def search(self, scope, query): return None
+	def get_followed_usernames_by_id(self, scope, ids): return None
+
+	## Searches user accounts by username, email, firstname and lastname.
+	#  @param scope a transaction scope
+	#  @param query a search query
+	#  @param page_size maximum number of returned accounts
+	#  @param after cursor of the previous page
+	#  @return a database.Page, each element is a dictionary: { "id": int, "username": str }
+	@abc.abstractmethod
+	def search(self, scope, query, page_size=100, after=None): return None
 
 	## Tests if a user follows another user.
 	#  @param scope a transaction scope
@@ -384,12 +465,13 @@ class UserDb(object):
 	#  @param username a user account
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return an array, each element is a dictionary holding object details: { "guid": str,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page, each element is a dictionary holding object details: { "guid": str,
 	#          "source": str, "locked": bool, "reported": bool, "tags": [ str, str, ... ],
 	#          "score": { "up": int, "down": int, "fav": int }, "created_on": datetime,
 	#          "comments_n": int, "reported": bool, "username": str, "recommended_on": dattime }
 	@abc.abstractmethod
-	def get_recommendations(self, scope, username, page=0, page_size=10): return None
+	def get_recommendations(self, scope, username, page=0, page_size=10, after=None): return None
 
 ## This class provides access to the object store.
 class ObjectDb(object):
@@ -440,39 +522,50 @@ class ObjectDb(object):
 	@abc.abstractmethod
 	def get_object(self, scope, guid): return None
 
+	## Gets multiple objects.
+	#  @param scope a transaction scope
+	#  @param guids sequence of object guids
+	#  @return a dictionary mapping guids to objects (see get_object()); deleted or unknown
+	#          objects are not contained
+	@abc.abstractmethod
+	def get_objects_by_guid(self, scope, guids): return None
+
 	## Gets objects from the data store.
 	#  @param scope a transaction scope
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return an array, each element is a dictionary holding object details: { "guid": str,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page, each element is a dictionary holding object details: { "guid": str,
 	#          "source": str, "locked": bool, "reported": bool, "tags": [ str, str, ... ],
 	#          "score": { "up": int, "down": int, "fav": int }, "created_on": datetime,
 	#          "comments_n": int, "reported": bool }
 	@abc.abstractmethod
-	def get_objects(self, scope, page=0, page_size=10): return None
+	def get_objects(self, scope, page=0, page_size=10, after=None): return None
 
 	## Gets objects associated to a tag.
 	#  @param scope a transaction scope
 	#  @param tag tag to search
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return an array, each element is a dictionary holding object details: { "guid": str,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page, each element is a dictionary holding object details: { "guid": str,
 	#          "source": str, "locked": bool, "reported": bool, "tags": [ str, str, ... ],
 	#          "score": { "up": int, "down": int, "fav": int }, "created_on": datetime,
 	#          "comments_n": int, "reported": bool }
 	@abc.abstractmethod
-	def get_tagged_objects(self, scope, tag, page=0, page_size=10): return None
+	def get_tagged_objects(self, scope, tag, page=0, page_size=10, after=None): return None
 
 	## Gets the most popular objects.
 	#  @param scope a transaction scope
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return an array, each element is a dictionary holding object details: { "guid": str,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page, each element is a dictionary holding object details: { "guid": str,
 	#          "source": str, "locked": bool, "reported": bool, "tags": [ str, str, ... ],
 	#          "score": { "up": int, "down": int, "fav": int }, "created_on": datetime,
 	#          "comments_n": int, "reported": bool }
 	@abc.abstractmethod
-	def get_popular_objects(self, scope, page=0, page_size=10): return None
+	def get_popular_objects(self, scope, page=0, page_size=10, after=None): return None
 
 	## Gets random objects.
 	#  @param scope a transaction scope
@@ -492,12 +585,13 @@ class ObjectDb(object):
 	@abc.abstractmethod
 	def add_tag(self, scope, guid, user_id, tag): pass
 
-	## Gets tag statistic.
+	## Gets tag statistic ordered by usage (descending).
 	#  @param scope a transaction scope
+	#  @param limit maximum number of returned tags (None to get all tags)
 	#  @return an array, each element is a dictionary holding tag details:
-	#          { "name": str, "count": int }
+	#          { "tag": str, "count": int }
 	@abc.abstractmethod
-	def get_tags(self, scope): return None
+	def get_tags(self, scope, limit=None): return None
 
 	## Tests if a user has already voted.
 	#  @param scope a transaction scope
@@ -523,6 +617,15 @@ class ObjectDb(object):
 	@abc.abstractmethod
 	def get_voting(self, scope, guid, username): return None
 
+	## Gets the votings of multiple users on multiple objects.
+	#  @param scope a transaction scope
+	#  @param guids sequence of object guids
+	#  @param user_ids sequence of user ids
+	#  @return a dictionary mapping (guid, user id) tuples to True (up) or False (down); the
+	#          dictionary contains only existing votings
+	@abc.abstractmethod
+	def get_votings(self, scope, guids, user_ids): return None
+
 	## Appends a comment to an object.
 	#  @param scope a transaction scope
 	#  @param guid guid of an object
@@ -542,10 +645,11 @@ class ObjectDb(object):
 	#  @param guid guid of an object
 	#  @param page page number
 	#  @param page_size size of each page
-	#  @return an array, each element is a dictionary holding a comment: { "id": int, "text": str,
+	#  @param after cursor of the previous page, if specified page is ignored
+	#  @return a database.Page, each element is a dictionary holding a comment: { "id": int, "text": str,
 	#         "created_on": datetime, "author": str, "deleted": bool }
 	@abc.abstractmethod
-	def get_comments(self, scope, guid, page=0, page_size=100): return None
+	def get_comments(self, scope, guid, page=0, page_size=100, after=None): return None
 
 	## Gets the comment with the specific id.
 	#  @param scope a transaction scope
@@ -555,6 +659,14 @@ class ObjectDb(object):
 	@abc.abstractmethod
 	def get_comment(self, scope, id): return None
 
+	## Gets multiple comments.
+	#  @param scope a transaction scope
+	#  @param ids sequence of comment ids
+	#  @return a dictionary mapping ids to comments (see get_comment()), each element has
+	#          an additional "user_id" field; unknown ids are not contained
+	@abc.abstractmethod
+	def get_comments_by_id(self, scope, ids): return None
+
 	## Tests if a comment does exist.
 	#  @param scope a transaction scope
 	#  @param id id of the comment to test
@@ -568,6 +680,18 @@ class ObjectDb(object):
 	@abc.abstractmethod
 	def report_abuse(self, scope, guid): return
 
+	## Recalculates the score and comment counters stored with each object.
+	#  @param scope a transaction scope
+	#  @return number of repaired objects
+	@abc.abstractmethod
+	def reconcile_counters(self, scope): return None
+
+	## Recalculates the tag statistic.
+	#  @param scope a transaction scope
+	#  @return number of repaired tags
+	@abc.abstractmethod
+	def reconcile_tags(self, scope): return None
+
 ## This class provides access to the stream store.
 class StreamDb(object):
 	## Gets messages assigned to a user.
@@ -589,6 +713,15 @@ class StreamDb(object):
 	@abc.abstractmethod
 	def get_public_messages(self, scope, limit=100, after=None): return None
 
+	## Expands events stored in the outbox (see config.STREAM_WORKER) into messages and
+	#  removes them from the outbox. Events locked by other transactions are skipped.
+	#  @param scope a transaction scope
+	#  @param limit maximum number of events to process
+	#  @param fanout True to send notifications to the followers of the event source
+	#  @return number of processed events
+	@abc.abstractmethod
+	def process_events(self, scope, limit=1000, fanout=True): return None
+
 ## This class provides access to the mail store.
 class MailDb(object):
 	## Pushs a message to the mail queue.
@@ -607,41 +740,46 @@ class MailDb(object):
 	@abc.abstractmethod
 	def push_mail(self, scope, subject, body, mail): return
 
-	## Gets unsent messages.
+	## Gets unsent messages which are due to be sent. Messages which failed permanently are
+	#  skipped.
 	#  @param scope a transaction scope
 	#  @param limit maximum numbers of messages to get
 	#  @return an array, each element is a dictionary holding an email: { "id": int,
-	#          "subject": str, "body": str, "created_on": datetime, "email": str }
+	#          "subject": str, "body": str, "created_on": datetime, "attempts": int,
+	#          "email": str }
 	@abc.abstractmethod
 	def get_unsent_messages(self, scope, limit=100): return None
 
-	## Sets the "sent" flag of an email.
+	## Claims unsent messages which are due to be sent. The next attempt of the claimed
+	#  messages is postponed by a lease, so other transactions don't claim them again until
+	#  they have been flagged or the lease has expired. Messages locked by other transactions
+	#  are skipped.
 	#  @param scope a transaction scope
-	#  @param id id of the email to flag
+	#  @param limit maximum numbers of messages to claim
+	#  @param lease seconds the messages are reserved
+	#  @return an array, each element is a dictionary holding an email (see get_unsent_messages())
 	@abc.abstractmethod
-	def mark_sent(self, scope, id): return
+	def claim_messages(self, scope, limit, lease): return None
 
-## This class provides access to the request store.
-class RequestDb(object):
-	## Adds a request to the request store.
+	## Sets the "sent" flag of emails.
 	#  @param scope a transaction scope
-	#  @param ip IP address of the request
-	#  @param user_id a user id
+	#  @param ids ids of the emails to flag
 	@abc.abstractmethod
-	def add_request(self, scope, ip, user_id=None): return
+	def mark_sent(self, scope, ids): return
 
-	## Number of requests in the given timeframe assigned to an IP address.
+	## Records a failed delivery attempt of emails. The next attempt is delayed exponentially,
+	#  emails are flagged as failed when the maximum number of attempts has been reached.
 	#  @param scope a transaction scope
-	#  @param ip an IP address
-	#  @param seconds timeframe to test
-	#  @return number of requests
+	#  @param ids ids of the emails to update
+	#  @param max_attempts maximum number of delivery attempts
+	#  @param delay delay before the second attempt (in seconds), doubled after each attempt
+	#  @param max_delay maximum delay between two attempts (in seconds)
 	@abc.abstractmethod
-	def count_requests_by_ip(self, scope, ip, seconds): return None
+	def mark_failed(self, scope, ids, max_attempts, delay, max_delay): return
 
-	## Number of requests in the given timeframe assigned to a user id.
+	## Releases claimed emails which haven't been sent, so they are due again immediately.
+	#  The number of delivery attempts isn't changed.
 	#  @param scope a transaction scope
-	#  @param user_id a user id
-	#  @param seconds timeframe to test
-	#  @return number of requests
+	#  @param ids ids of the emails to release
 	@abc.abstractmethod
-	def count_requests_by_user_id(self, scope, user_id, seconds): return None
+	def release_messages(self, scope, ids): return
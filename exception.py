@@ -32,29 +32,28 @@
 ## @package exception
 #  Exceptions and error codes.
 
-import util
-
 ## Enumeration indicating error types.
-ErrorCode = util.enum(SUCCESS = 0,
-                      INTERNAL_FAILURE = 1,
-                      STREAM_EXCEEDS_MAXIMUM = 2,
-                      INVALID_IMAGE_FORMAT = 3,
-		      METHOD_NOT_SUPPORTED = 4,
-                      AUTHENTICATION_FAILED = 100,
-                      NOT_AUTHORIZED = 101,
-                      MISSING_PARAMETER = 102,
-                      INVALID_PARAMETER = 200,
-		      NOT_FOUND = 201,
-		      CONFLICT = 202,
-                      INVALID_REQUEST_CODE = 203,
-		      USER_NOT_FOUND = 300,
-                      USER_IS_BLOCKED = 301,
-                      WRONG_PASSWORD = 302,
-                      WRONG_EMAIL_ADDRESS = 303,
-		      NO_FRIENDSHIP = 304,
-                      OBJECT_NOT_FOUND = 400,
-                      OBJECT_IS_LOCKED = 401,
-		      HTTP_FAILURE = 500)
+class ErrorCode:
+	SUCCESS = 0
+	INTERNAL_FAILURE = 1
+	STREAM_EXCEEDS_MAXIMUM = 2
+	INVALID_IMAGE_FORMAT = 3
+	METHOD_NOT_SUPPORTED = 4
+	AUTHENTICATION_FAILED = 100
+	NOT_AUTHORIZED = 101
+	MISSING_PARAMETER = 102
+	INVALID_PARAMETER = 200
+	NOT_FOUND = 201
+	CONFLICT = 202
+	INVALID_REQUEST_CODE = 203
+	USER_NOT_FOUND = 300
+	USER_IS_BLOCKED = 301
+	WRONG_PASSWORD = 302
+	WRONG_EMAIL_ADDRESS = 303
+	NO_FRIENDSHIP = 304
+	OBJECT_NOT_FOUND = 400
+	OBJECT_IS_LOCKED = 401
+	HTTP_FAILURE = 500
 
 ## Exception base class.
 class BaseException:
@@ -32,11 +32,80 @@
 ## @package factory
 #  Various factory functions.
 
-import config, pgdb, smtp
+import config, pgdb, smtp, ratelimit, threading
 
-## Creates a database.Connection instance.
+## Connection pool shared by all database.Connection instances (created on first use).
+db_pool = None
+## Lock protecting the connection pool initialization.
+db_pool_lock = threading.Lock()
+
+## Gets the shared connection pool. The pool is created on first call.
+#  @return a pgdb.PGConnectionPool instance
+def get_db_pool():
+	global db_pool
+
+	with db_pool_lock:
+		if db_pool is None:
+			db_pool = pgdb.PGConnectionPool(config.PG_DB, host=config.PG_HOST, port=config.PG_PORT, username=config.PG_USER, password=config.PG_PWD,
+			                                min_size=config.PG_POOL_MIN_SIZE, max_size=config.PG_POOL_MAX_SIZE, max_lifetime=config.PG_POOL_MAX_LIFETIME,
+			                                timeout=config.PG_POOL_TIMEOUT, check_interval=config.PG_POOL_CHECK_INTERVAL)
+			db_pool.open()
+
+	return db_pool
+
+## Rate limiter shared by all controllers (created on first use).
+rate_limiter = None
+## Lock protecting the rate limiter initialization.
+rate_limiter_lock = threading.Lock()
+
+## Gets the shared rate limiter. The backend is selected by config.RATE_LIMIT_BACKEND.
+#  @return a ratelimit.RateLimiter instance
+def get_rate_limiter():
+	global rate_limiter
+
+	with rate_limiter_lock:
+		if rate_limiter is None:
+			if config.RATE_LIMIT_BACKEND == "memcached":
+				import memcache
+				rate_limiter = ratelimit.SlidingWindowRateLimiter(memcache.Client(config.RATE_LIMIT_SERVERS))
+			else:
+				rate_limiter = ratelimit.TokenBucketRateLimiter()
+
+	return rate_limiter
+
+## Creates a database.Connection instance. The connection is taken from the shared pool and
+#  returned to it when closed.
 def create_db_connection():
-	return pgdb.PGConnection(config.PG_DB, host=config.PG_HOST, port=config.PG_PORT, username=config.PG_USER, password=config.PG_PWD)
+	return pgdb.PGConnection(get_db_pool())
+
+## Shared database.UserDb instance.
+user_db = pgdb.PGUserDb()
+## Shared database.ObjectDb instance.
+object_db = pgdb.PGObjectDb()
+## Shared database.StreamDb instance.
+if config.STREAM_FANOUT == "read":
+	stream_db = pgdb.PGActivityStreamDb()
+else:
+	stream_db = pgdb.PGStreamDb()
+## Shared database.MailDb instance.
+mail_db = pgdb.PGMailDb()
+
+## Gets the shared database.UserDb instance. Data access objects are stateless (all
+#  state is passed in the transaction scope) and can be used by multiple threads.
+def get_user_db():
+	return user_db
+
+## Gets the shared database.ObjectDb instance.
+def get_object_db():
+	return object_db
+
+## Gets the shared database.StreamDb instance.
+def get_stream_db():
+	return stream_db
+
+## Gets the shared database.MailDb instance.
+def get_mail_db():
+	return mail_db
 
 ## Creates a database.TestDb instance.
 def create_test_db():
@@ -50,17 +119,20 @@ def create_user_db():
 def create_object_db():
 	return pgdb.PGObjectDb()
 
-## Creates a database.StreamDb instance.
+## Creates a database.StreamDb instance. The implementation is selected by config.STREAM_FANOUT.
 def create_stream_db():
+	if config.STREAM_FANOUT == "read":
+		return pgdb.PGActivityStreamDb()
+
 	return pgdb.PGStreamDb()
 
 ## Creates a database.MailDb instance.
 def create_mail_db():
 	return pgdb.PGMailDb()
 
-## Creates a database.RequestDb instance.
-def create_request_db():
-	return pgdb.PGRequestDb()
+## Creates a database.Listener instance receiving a notification when mails are queued.
+def create_mail_listener():
+	return pgdb.PGListener(config.PG_DB, "mail_queue", host=config.PG_HOST, port=config.PG_PORT, username=config.PG_USER, password=config.PG_PWD)
 
 ## Creates a mailer.MTA instance.
 def create_mta():
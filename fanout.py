@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+	project............: meat-a
+	description........: web application for sharing meta information
+	date...............: 04/2013
+	copyright..........: Sebastian Fedrau
+
+	Permission is hereby granted, free of charge, to any person obtaining
+	a copy of this software and associated documentation files (the
+	"Software"), to deal in the Software without restriction, including
+	without limitation the rights to use, copy, modify, merge, publish,
+	distribute, sublicense, and/or sell copies of the Software, and to
+	permit persons to whom the Software is furnished to do so, subject to
+	the following conditions:
+
+	The above copyright notice and this permission notice shall be
+	included in all copies or substantial portions of the Software.
+
+	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+	EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+	MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+	IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+	OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+	ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+	OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+##
+#  @file fanout.py
+#  A service expanding stream events found in the outbox into messages. Events are processed
+#  after an interval. This process can also be triggered by UDP.
+
+## @package fanout
+#  A service expanding stream events found in the outbox into messages. Events are processed
+#  after an interval. This process can also be triggered by UDP.
+
+import os, select, socket, threading, traceback, factory, config, logger
+
+## A service expanding events from the outbox (see config.STREAM_WORKER) into messages in
+#  large batches. It processes events after an interval or when triggered over UDP. Events
+#  locked by another worker are skipped, so multiple workers can share the outbox.
+class FanoutWorker:
+	## The constructor.
+	#  @param host host where the service should listen, None disables the UDP listener
+	#  @param port port of the service
+	#  @param batch_size maximum number of events expanded in a single transaction
+	def __init__(self, host, port, batch_size=1000):
+		self.__logger = logger.get_logger()
+
+		self.host = host
+		self.port = port
+		self.socket = None
+
+		if not host is None:
+			self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+			self.socket.setblocking(0)
+
+		self.__event_thread = None
+		self.__running = False
+		self.__running_lock = threading.Lock()
+
+		# pipe used to interrupt the event thread:
+		self.__wakeup = None
+
+		self.__consumer_thread = None
+		self.__consumer_lock = threading.Lock()
+		self.__consumer_cond = threading.Condition(self.__consumer_lock)
+		self.__generation = 0
+
+		self.__batch_size = batch_size
+
+	## Starts the service.
+	def start(self):
+		self.__logger.info("Starting fan-out worker.")
+
+		if not self.socket is None:
+			self.socket.bind((self.host, self.port))
+
+		self.__wakeup = os.pipe()
+		self.__set_running__(True)
+
+		self.__event_thread = threading.Thread(target = self.__event_handler__)
+		self.__event_thread.start()
+
+		self.__consumer_thread = threading.Thread(target = self.__consumer__)
+		self.__consumer_thread.start()
+
+	## Stops the service.
+	def quit(self):
+		self.__logger.info("Stopping fan-out worker.")
+
+		# unset "running" flag:
+		self.__set_running__(False)
+
+		# wait for event thread:
+		self.__logger.debug("Waiting for event thread.")
+
+		os.write(self.__wakeup[1], "\n")
+		self.__event_thread.join()
+
+		# wait for consumer:
+		self.__logger.debug("Waiting for consumer thread.")
+
+		self.__notify__()
+		self.__consumer_thread.join()
+
+		# close pipe & socket:
+		map(os.close, self.__wakeup)
+		self.__wakeup = None
+
+		if not self.socket is None:
+			self.socket.close()
+			self.socket = None
+
+		self.__logger.debug("fan-out worker stopped successfully.")
+
+	## Tests if the service is running.
+	#  @return True if the service is running
+	def is_running(self):
+		with self.__running_lock:
+			return self.__running
+
+	def __set_running__(self, running):
+		with self.__running_lock:
+			self.__running = running
+
+	# waits for UDP requests & the check interval and wakes up the consumer:
+	def __event_handler__(self):
+		while self.is_running():
+			fds = filter(lambda fd: not fd is None, [self.__wakeup[0], self.socket])
+
+			try:
+				readable, _, _ = select.select(fds, [], [], config.FANOUT_CHECK_INTERVAL)
+
+			except Exception as e:
+				self.__logger.error("Couldn't wait for fan-out events: %s", e)
+
+				continue
+
+			if len(readable) == 0:
+				self.__notify__()
+
+			if self.socket in readable:
+				self.__read_request__()
+
+	def __read_request__(self):
+		try:
+			data, addr = self.socket.recvfrom(128)
+
+			self.__logger.debug("UDP request received from: '%s'", addr)
+
+			if addr[0] in config.FANOUT_ALLOWED_CLIENTS:
+				if data == "ping\n":
+					self.__notify__()
+			else:
+				self.__logger.warning("Client not in list of allowed clients.")
+
+		except socket.error:
+			pass
+
+	def __consumer__(self):
+		db = factory.get_stream_db()
+		fanout = config.STREAM_FANOUT == "write"
+		generation = 0
+
+		while True:
+			self.__logger.debug("fan-out worker waits for events.")
+
+			# wait until the consumer has been notified since the last run:
+			with self.__consumer_cond:
+				while self.__generation == generation and self.is_running():
+					self.__consumer_cond.wait()
+
+				generation = self.__generation
+
+			if not self.is_running():
+				break
+
+			# expand events until the outbox is empty:
+			self.__logger.debug("Searching for events to expand.")
+
+			try:
+				with factory.create_db_connection() as conn:
+					while self.is_running():
+						with conn.enter_scope() as scope:
+							count = db.process_events(scope, self.__batch_size, fanout)
+							scope.complete()
+
+						if count > 0:
+							self.__logger.info("Expanded %d event(s).", count)
+
+						if count < self.__batch_size:
+							break
+
+			except Exception as e:
+				self.__logger.error(e)
+				self.__logger.error(traceback.format_exc())
+
+	def __notify__(self):
+		with self.__consumer_cond:
+			self.__generation += 1
+			self.__consumer_cond.notifyAll()
+
+## Triggers the FanoutWorker to expand events.
+#  @param host host of the fan-out worker
+#  @param port port of the fan-out worker
+def ping(host, port):
+	s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	s.sendto("ping\n", (host, port))
+	s.close()
+
+if __name__ == "__main__":
+	w = FanoutWorker(config.FANOUT_HOST, config.FANOUT_PORT, config.FANOUT_BATCH_SIZE)
+	w.start()
+
+	print "[press enter to quit]"
+	raw_input()
+
+	print "Shutting down... please wait!"
+	w.quit()
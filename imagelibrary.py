@@ -41,7 +41,7 @@ def import_images():
 	log.info("Searching for image files in '%s'", config.IMAGE_LIBRARY_PATH)
 
 	with factory.create_db_connection() as conn:
-		db = factory.create_object_db()
+		db = factory.get_object_db()
 
 		for filename in os.listdir(config.IMAGE_LIBRARY_PATH):
 			log.info("Found file: '%s'", filename)
@@ -32,18 +32,97 @@
 ## @package logger
 #  A logging.Logger wrapper.
 
-import config, logging
+import config, logging, threading, Queue, atexit
 
+## The shared logging.Logger instance.
 logger = None
+## Lock synchronizing the creation of the shared logger.
+logger_lock = threading.Lock()
 
-## A logging.Logger wrapper.
+## A logging.Filter setting the default request id of records logged without one.
+class RequestIdFilter(logging.Filter):
+	def filter(self, record):
+		if not hasattr(record, "request_id"):
+			record.request_id = "-"
+
+		return True
+
+## A handler putting log records into a queue without blocking. The records are written by
+#  a QueueListener. Records are dropped when the queue is full.
+class QueueHandler(logging.Handler):
+	## The constructor.
+	#  @param queue a Queue.Queue instance
+	def __init__(self, queue):
+		logging.Handler.__init__(self)
+
+		self.queue = queue
+		## Number of dropped records.
+		self.dropped = 0
+
+	def emit(self, record):
+		try:
+			# merge arguments & exception details, records are formatted by another thread:
+			record.msg = record.getMessage()
+			record.args = None
+
+			if record.exc_info:
+				record.exc_text = logging.Formatter().formatException(record.exc_info)
+				record.exc_info = None
+
+			self.queue.put_nowait(record)
+
+		except Queue.Full:
+			self.dropped += 1
+
+		except Exception:
+			self.handleError(record)
+
+## Writes log records found in a queue to the assigned handlers in a background thread.
+class QueueListener:
+	## The constructor.
+	#  @param queue a Queue.Queue instance
+	#  @param handlers handlers writing the log records
+	def __init__(self, queue, *handlers):
+		self.queue = queue
+		self.handlers = handlers
+		self.__thread = None
+
+	## Starts the background thread.
+	def start(self):
+		self.__thread = threading.Thread(target=self.__process__)
+		self.__thread.daemon = True
+		self.__thread.start()
+
+	## Writes all queued records and stops the background thread.
+	def stop(self):
+		if self.__thread is not None:
+			self.queue.put(None)
+			self.__thread.join()
+			self.__thread = None
+
+	def __process__(self):
+		while True:
+			record = self.queue.get()
+
+			if record is None:
+				break
+
+			for handler in self.handlers:
+				if record.levelno >= handler.level:
+					handler.handle(record)
+
+## A logging.Logger wrapper. Messages are only formatted if the level is enabled.
 class LoggerWrapper():
 	## The constructor.
 	#  @param logger a logging.Logger instance to wrap
 	#  @param request_id optional request id
 	def __init__(self, logger, request_id=None):
 		self.__logger = logger
-		self.__request_id = request_id
+
+		if request_id is None:
+			self.__adapter = logger
+		else:
+			self.__adapter = logging.LoggerAdapter(logger, {"request_id": request_id})
 
 		self.debug = self.__log_func__(logging.DEBUG)
 		self.info = self.__log_func__(logging.INFO)
@@ -52,26 +131,47 @@ class LoggerWrapper():
 		self.critical = self.__log_func__(logging.CRITICAL)
 
 	def log(self, level, msg, *args):
-		if self.__request_id is None:
-			self.__logger.log(level, msg, *args)
-		else:
-			self.__logger.log(level, "%s => %s", self.__request_id, msg % args)
+		if self.__logger.isEnabledFor(level):
+			self.__adapter.log(level, msg, *args)
+
+	## Tests if messages of the given level are logged.
+	#  @param level a logging level
+	#  @return True if the level is enabled
+	def isEnabledFor(self, level):
+		return self.__logger.isEnabledFor(level)
 
 	def __log_func__(self, level):
 		return lambda msg, *args: self.log(level, msg, *args)
 
-## Creates the default logger.
+## Creates the default logger. Records are written by a background thread if
+#  config.LOGGING_QUEUE_SIZE is greater than 0.
 #  @param request_id optional request id
 #  @return a LoggerWrapper instance
 def get_logger(request_id=None):
-	global logger
+	global logger, logger_lock
 
 	if logger is None:
-		logger = logging.Logger(config.LOGGING_NAME)
-		logger.setLevel(config.LOGGING_VERBOSITY)
+		with logger_lock:
+			if logger is None:
+				l = logging.Logger(config.LOGGING_NAME)
+				l.setLevel(config.LOGGING_VERBOSITY)
+				l.addFilter(RequestIdFilter())
+
+				handler = config.LOGGING_HANDLER()
+				handler.setFormatter(logging.Formatter(config.LOGGING_FORMAT))
+
+				if config.LOGGING_QUEUE_SIZE > 0:
+					queue = Queue.Queue(config.LOGGING_QUEUE_SIZE)
+
+					listener = QueueListener(queue, handler)
+					listener.start()
+
+					atexit.register(listener.stop)
+
+					handler = QueueHandler(queue)
+
+				l.addHandler(handler)
 
-		handler = config.LOGGING_HANDLER()
-		handler.setFormatter(logging.Formatter(config.LOGGING_FORMAT))
-		logger.addHandler(handler)
+				logger = l
 
 	return LoggerWrapper(logger, request_id)
@@ -27,20 +27,29 @@
 
 ##
 #  @file mailer.py
-#  A service sending mails found in the mail queue. Mails will be sent after an interval.
-#  This process can also be triggered by UDP.
+#  A service sending mails found in the mail queue. Mails are sent when the database notifies
+#  the service about queued mails or after an interval. This process can also be triggered by UDP.
 
 ## @package mailer
-#  A service sending mails found in the mail queue. Mails will be sent after an interval.
-#  This process can also be triggered by UDP.
+#  A service sending mails found in the mail queue. Mails are sent when the database notifies
+#  the service about queued mails or after an interval. This process can also be triggered by UDP.
 
-import abc, socket, threading, logging, traceback, factory, config, logger
+import abc, os, select, socket, threading, time, logging, traceback, factory, config, logger
+
+## Raised by a MTA when mails can't be sent temporarily, e.g. because the SMTP server isn't
+#  available. The mail doesn't lose an attempt and the Mailer retries after a delay.
+class TransientError(Exception):
+	## The constructor.
+	#  @param message error message
+	def __init__(self, message):
+		Exception.__init__(self, message)
 
 ## Base class for mail transfer agents.
 class MTA():
 	__metaclass__ = abc.ABCMeta
 
 	## Called when the Mailer starts a new session.
+	#  @exception TransientError the server isn't available
 	@abc.abstractmethod
 	def start_session(self): pass
 
@@ -48,8 +57,9 @@ class MTA():
 	#  @param subject subject of the mail
 	#  @param body body of the mail
 	#  @param receiver receiver of the mail
-	#  @return if True the Mailer sets the "Sent" flag of the mail, otherwise it stays
-	#          in the queue
+	#  @return if True the Mailer sets the "Sent" flag of the mail, otherwise the mail
+	#          loses an attempt and stays in the queue
+	#  @exception TransientError the mail couldn't be sent because the server isn't available
 	@abc.abstractmethod
 	def send(self, subject, body, receiver): return None
 
@@ -57,45 +67,68 @@ class MTA():
 	@abc.abstractmethod
 	def end_session(self): pass
 
-## A service sending mails from the mail queue using an assigned MTA. It sends mails after an
-#  interval or when triggered over UDP.
+## A service sending mails from the mail queue using a pool of worker threads. Workers are
+#  woken up by a database.Listener when mails are queued, after an interval or when triggered
+#  over UDP. Each worker claims a batch of mails for a lease, sends them with its own MTA and
+#  flags each mail right after sending it. Claimed mails aren't claimed again until the lease
+#  expires, so multiple mailer processes can share the mail queue. When the MTA raises a
+#  TransientError the remaining mails are released and the worker backs off.
 class Mailer:
 	## The constructor.
-	#  @param host host where the service should listen
+	#  @param host host where the service should listen, None disables the UDP listener
 	#  @param port port of the service
-	#  @param mta a MTA instance used to send mails
-	def __init__(self, host, port, mta):
+	#  @param mta_factory function creating the MTA instance of each worker
+	#  @param workers number of worker threads
+	#  @param listener_factory function creating a database.Listener receiving a notification
+	#                          when mails are queued, None to check the queue only after an
+	#                          interval or when triggered over UDP
+	def __init__(self, host, port, mta_factory, workers=1, listener_factory=None):
 		self.__logger = logger.get_logger()
 
 		self.host = host
 		self.port = port
+		self.socket = None
 
-		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-		self.socket.setblocking(0)
-		self.socket.settimeout(config.MAILER_UDP_TIMEOUT)
+		if not host is None:
+			self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+			self.socket.setblocking(0)
 
-		self.__udp_thread = None
+		self.__event_thread = None
 		self.__running = False
 		self.__running_lock = threading.Lock()
 
-		self.__consumer_thread = None
+		# pipe used to interrupt the event thread:
+		self.__wakeup = None
+
+		self.__listener = None
+		self.__listener_factory = listener_factory
+
+		self.__consumer_threads = []
 		self.__consumer_lock = threading.Lock()
 		self.__consumer_cond = threading.Condition(self.__consumer_lock)
+		self.__generation = 0
 
-		self.__mta = mta
+		self.__mta_factory = mta_factory
+		self.__workers = workers
 
 	## Starts the service.
 	def start(self):
 		self.__logger.info("Starting mailer.")
 
-		self.socket.bind((self.host, self.port))
+		if not self.socket is None:
+			self.socket.bind((self.host, self.port))
+
+		self.__wakeup = os.pipe()
 		self.__set_running__(True)
 
-		self.__udp_thread = threading.Thread(target = self.__network_handler__)
-		self.__udp_thread.start()
+		self.__event_thread = threading.Thread(target = self.__event_handler__)
+		self.__event_thread.start()
+
+		for _ in range(self.__workers):
+			t = threading.Thread(target = self.__consumer__)
+			t.start()
 
-		self.__consumer_thread = threading.Thread(target = self.__consumer__)
-		self.__consumer_thread.start()
+			self.__consumer_threads.append(t)
 
 	## Stops the service.
 	def quit(self):
@@ -104,18 +137,31 @@ class Mailer:
 		# unset "running" flag:
 		self.__set_running__(False)
 
-		# wait for consumer:
-		self.__logger.debug("Waiting for consumer thread.")
+		# wait for event thread:
+		self.__logger.debug("Waiting for event thread.")
+
+		os.write(self.__wakeup[1], "\n")
+		self.__event_thread.join()
+
+		# wait for consumers:
+		self.__logger.debug("Waiting for consumer threads.")
 
 		self.__notify__()
-		self.__consumer_thread.join()
 
-		# wait for network thread & close socket:
-		self.__logger.debug("Waiting for UDP listener thread.")
+		for t in self.__consumer_threads:
+			t.join()
+
+		self.__consumer_threads = []
+
+		# close listener, pipe & socket:
+		self.__close_listener__()
 
-		self.__udp_thread.join()
-		self.socket.close()
-		self.socket= None
+		map(os.close, self.__wakeup)
+		self.__wakeup = None
+
+		if not self.socket is None:
+			self.socket.close()
+			self.socket = None
 
 		self.__logger.debug("mailer stopped successfully.")
 
@@ -133,66 +179,191 @@ class Mailer:
 		self.__running = running
 		self.__running_lock.release()
 
-	def __network_handler__(self):
+	# waits for notifications, UDP requests & the check interval and wakes up the consumers:
+	def __event_handler__(self):
 		while self.is_running():
+			if self.__listener is None and not self.__listener_factory is None:
+				self.__open_listener__()
+
+			fds = filter(lambda fd: not fd is None, [self.__wakeup[0], self.socket, self.__listener])
+
 			try:
-				data, addr = self.socket.recvfrom(128)
+				readable, _, _ = select.select(fds, [], [], config.MAIL_CHECK_INTERVAL)
+
+			except Exception as e:
+				self.__logger.error("Couldn't wait for mailer events: %s", e)
+				self.__close_listener__()
+
+				continue
+
+			if len(readable) == 0:
+				self.__notify__()
+
+			if self.socket in readable:
+				self.__read_request__()
+
+			if not self.__listener is None and self.__listener in readable:
+				self.__read_notifications__()
+
+	def __open_listener__(self):
+		try:
+			self.__listener = self.__listener_factory()
+			self.__logger.debug("Listening for queued mails.")
+
+			# mails might have been queued while the listener was disconnected:
+			self.__notify__()
+
+		except Exception as e:
+			self.__logger.error("Couldn't create mail queue listener: %s", e)
+
+	def __close_listener__(self):
+		if not self.__listener is None:
+			self.__listener.close()
+			self.__listener = None
+
+	def __read_notifications__(self):
+		try:
+			if len(self.__listener.poll()) > 0:
+				self.__logger.debug("Mail queue notification received.")
+				self.__notify__()
+
+		except Exception as e:
+			self.__logger.error("Mail queue listener failed: %s", e)
+			self.__close_listener__()
+
+	def __read_request__(self):
+		try:
+			data, addr = self.socket.recvfrom(128)
 
-				self.__logger.debug("UDP request received from: '%s'", addr)
+			self.__logger.debug("UDP request received from: '%s'", addr)
 
-				if addr[0] in config.MAILER_ALLOWED_CLIENTS:
-					if data == "ping\n":
-						self.__notify__()
-				else:
-					self.__logger.warning("Client not in list of allowed clients.")
+			if addr[0] in config.MAILER_ALLOWED_CLIENTS:
+				if data == "ping\n":
+					self.__notify__()
+			else:
+				self.__logger.warning("Client not in list of allowed clients.")
 
-			except socket.timeout:
-				pass
+		except socket.error:
+			pass
 
 	def __consumer__(self):
-		db = factory.create_mail_db()
+		mta = self.__mta_factory()
+		session = False
+		generation = 0
+		backoff = 0
 
 		while True:
-			self.__logger.debug("mailer waits for events.")
-
 			self.__consumer_cond.acquire()
-			self.__consumer_cond.wait(config.MAIL_CHECK_INTERVAL)
+
+			if backoff == 0:
+				self.__logger.debug("mailer waits for events.")
+
+				# wait until the consumers have been notified since the last run:
+				while self.__generation == generation and self.is_running():
+					self.__consumer_cond.wait()
+			else:
+				# wait until the delay has elapsed or the service is stopped:
+				until = time.time() + backoff
+
+				while time.time() < until and self.is_running():
+					self.__consumer_cond.wait(until - time.time())
+
+			generation = self.__generation
 			self.__consumer_cond.release()
 
 			if not self.is_running():
 				break
 
-			# get & send mails:
-			self.__logger.debug("Searching for mails to send.")
+			# send mails until the queue is empty, the SMTP session is kept open:
+			try:
+				while self.is_running():
+					if not session:
+						mta.start_session()
+						session = True
+
+					if self.__send_batch__(mta) == 0:
+						break
+
+				backoff = 0
+
+			except TransientError as e:
+				backoff = min(max(backoff * 2, config.MAILER_BACKOFF), config.MAILER_MAX_BACKOFF)
+				self.__logger.warning("Couldn't send mails (%s), retrying in %s seconds.", e, backoff)
+
+				session = self.__end_session__(mta, session)
+
+			except Exception as e:
+				self.__logger.error(e)
+				self.__logger.error(traceback.format_exc())
+
+				session = self.__end_session__(mta, session)
+
+		self.__end_session__(mta, session)
+
+	# claims due mails in a short transaction, sends them & flags each mail as sent or schedules
+	# its next attempt right after sending it, returns the number of claimed mails. Unsent mails
+	# are released when the MTA raises a TransientError:
+	def __send_batch__(self, mta):
+		db = factory.get_mail_db()
+
+		self.__logger.debug("Searching for mails to send.")
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				mails = db.claim_messages(scope, config.MAILER_BATCH_SIZE, config.MAILER_LEASE)
+				scope.complete()
+
+			if len(mails) == 0:
+				return 0
+
+			self.__logger.info("Found %d mail(s) to send.", len(mails))
+
+			failed = 0
+
+			for i, m in enumerate(mails):
+				try:
+					sent = mta.send(m["subject"], m["body"], m["email"])
+
+				except TransientError:
+					with conn.enter_scope() as scope:
+						db.release_messages(scope, [r["id"] for r in mails[i:]])
+						scope.complete()
+
+					raise
 
-			with factory.create_db_connection() as conn:
 				with conn.enter_scope() as scope:
-					mails = db.get_unsent_messages(scope, 100)
+					if sent:
+						db.mark_sent(scope, [m["id"]])
+					else:
+						db.mark_failed(scope, [m["id"]], config.MAILER_MAX_ATTEMPTS, config.MAILER_RETRY_DELAY, config.MAILER_MAX_RETRY_DELAY)
 
-				if len(mails) > 0:
-					self.__logger.info("Found %d mail(s) to send.", len(mails))
+					scope.complete()
 
-					try:
-						self.__mta.start_session()
+				if not sent:
+					failed += 1
 
-						for m in mails:
-							with conn.enter_scope() as scope:
-								if self.__mta.send(m["subject"], m["body"], m["email"]):
-									db.mark_sent(scope, m["id"])
-									scope.complete()
+					if m["attempts"] + 1 >= config.MAILER_MAX_ATTEMPTS:
+						self.__logger.error("Giving up sending mail %d to '%s'.", m["id"], m["email"])
 
-							if not self.is_running():
-								break
+			if failed > 0:
+				self.__logger.warning("Couldn't send %d mail(s).", failed)
+
+			return len(mails)
+
+	def __end_session__(self, mta, session):
+		if session:
+			try:
+				mta.end_session()
 
-						self.__mta.end_session()
+			except Exception as e:
+				self.__logger.warning("Couldn't end mailer session: %s", e)
 
-					except Exception as e:
-						self.__logger.error(e)
-						self.__logger.error(traceback.print_exc())
+		return False
 
 	def __notify__(self):
 		self.__consumer_cond.acquire()
-		self.__consumer_cond.notify()
+		self.__generation += 1
+		self.__consumer_cond.notifyAll()
 		self.__consumer_cond.release()
 
 ## Triggers the Mailer to send emails.
@@ -204,7 +375,10 @@ def ping(host, port):
 	s.close()
 
 if __name__ == "__main__":
-	m = Mailer(config.MAILER_HOST, config.MAILER_PORT, factory.create_mta())
+	if config.MAILER_UDP_ENABLED:
+		m = Mailer(config.MAILER_HOST, config.MAILER_PORT, factory.create_mta, config.MAILER_WORKERS, factory.create_mail_listener)
+	else:
+		m = Mailer(None, None, factory.create_mta, config.MAILER_WORKERS, factory.create_mail_listener)
 	m.start()
 
 	print "[press enter to quit]"
@@ -1,4 +1,5 @@
-import database, psycopg2, psycopg2.extras, util, exception, config
+import database, psycopg2, psycopg2.extensions, psycopg2.extras, util, exception, config, threading, time, random, uuid
+from datetime import datetime
 
 class PGTransactionScope(database.TransactionScope):
 	def __init__(self, db):
@@ -18,6 +19,26 @@ class PGTransactionScope(database.TransactionScope):
 	def get_handle(self):
 		return self.__cursor
 
+class PGSavepointScope(database.TransactionScope):
+	def __init__(self, db, name):
+		database.TransactionScope.__init__(self, db)
+		self.__db = db
+		self.__name = name
+		self.__cursor = None
+
+	def __enter_scope__(self):
+		self.__cursor = self.__db.cursor()
+		self.__cursor.execute("savepoint %s" % self.__name)
+
+	def __leave_scope__(self, commit):
+		if commit:
+			self.__cursor.execute("release savepoint %s" % self.__name)
+		else:
+			self.__cursor.execute("rollback to savepoint %s" % self.__name)
+
+	def get_handle(self):
+		return self.__cursor
+
 def execute_scalar(cur, query, *params):
 	cur.execute(query, params)
 	row = cur.fetchone()
@@ -43,6 +64,9 @@ def fetch_all(cur, query, *params):
 
 	return result
 
+def escape_like(text):
+	return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
 def to_dict(row):
 	m = {}
 
@@ -52,26 +76,211 @@ def to_dict(row):
 
 	return m
 
-class PGConnection(database.Connection):
+class PGConnectionPool:
 	def __init__(self, db, **kwargs):
+		self.__cn_str = "host='%s' dbname='%s' port=%d user='%s' password='%s'" % (kwargs["host"], db, kwargs["port"], kwargs["username"], kwargs["password"])
+		self.__min_size = kwargs.get("min_size", 0)
+		self.__max_size = kwargs.get("max_size", 10)
+		self.__max_lifetime = kwargs.get("max_lifetime", 0)
+		self.__timeout = kwargs.get("timeout", 10)
+		self.__check_interval = kwargs.get("check_interval", 30)
+
+		self.__lock = threading.Lock()
+		self.__cond = threading.Condition(self.__lock)
+
+		# idle connections (LIFO) & creation timestamps of all open connections:
+		self.__idle = []
+		self.__created = {}
+		self.__size = 0
+		self.__in_use = 0
+
+		self.__stats = {"checkouts": 0, "failures": 0, "created": 0, "recycled": 0, "broken": 0, "wait_time": 0.0, "max_wait_time": 0.0}
+
+	def open(self):
+		while True:
+			with self.__lock:
+				if self.__size >= self.__min_size:
+					break
+
+				self.__size += 1
+
+			conn = self.__connect__()
+
+			with self.__cond:
+				self.__idle.append((conn, time.time()))
+				self.__cond.notify()
+
+	def get(self):
+		started = time.time()
+
+		try:
+			conn = self.__checkout__(started + self.__timeout)
+
+		except:
+			with self.__lock:
+				self.__stats["failures"] += 1
+
+			raise
+
+		waited = time.time() - started
+
+		with self.__lock:
+			self.__in_use += 1
+			self.__stats["checkouts"] += 1
+			self.__stats["wait_time"] += waited
+			self.__stats["max_wait_time"] = max(self.__stats["max_wait_time"], waited)
+
+		return conn
+
+	def put(self, conn):
+		reusable = not conn.closed and not self.__expired__(conn)
+
+		if reusable and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+			try:
+				conn.rollback()
+
+			except psycopg2.Error:
+				reusable = False
+
+		with self.__cond:
+			self.__in_use -= 1
+
+			if reusable:
+				self.__idle.append((conn, time.time()))
+			else:
+				self.__discard__(conn)
+
+			self.__cond.notify()
+
+	def close(self):
+		with self.__cond:
+			while len(self.__idle) > 0:
+				conn, _ = self.__idle.pop()
+				self.__discard__(conn)
+
+	def get_stats(self):
+		with self.__lock:
+			stats = dict(self.__stats)
+			stats["size"] = self.__size
+			stats["idle"] = len(self.__idle)
+			stats["in_use"] = self.__in_use
+			stats["min_size"] = self.__min_size
+			stats["max_size"] = self.__max_size
+
+		if stats["checkouts"] > 0:
+			stats["avg_wait_time"] = stats["wait_time"] / stats["checkouts"]
+		else:
+			stats["avg_wait_time"] = 0.0
+
+		return stats
+
+	def __checkout__(self, deadline):
+		while True:
+			conn, last_used = None, None
+
+			with self.__cond:
+				while len(self.__idle) == 0 and self.__size >= self.__max_size:
+					remaining = deadline - time.time()
+
+					if remaining <= 0:
+						raise exception.InternalFailureException("No database connection available.")
+
+					self.__cond.wait(remaining)
+
+				if len(self.__idle) > 0:
+					conn, last_used = self.__idle.pop()
+				else:
+					# reserve a slot and connect outside the lock:
+					self.__size += 1
+
+			if conn is None:
+				return self.__connect__()
+
+			# test the connection outside the lock:
+			if self.__is_healthy__(conn, last_used):
+				return conn
+
+			with self.__cond:
+				self.__discard__(conn)
+				self.__cond.notify()
+
+	def __connect__(self):
+		try:
+			conn = psycopg2.connect(self.__cn_str)
+
+		except:
+			with self.__cond:
+				self.__size -= 1
+				self.__cond.notify()
+
+			raise
+
+		with self.__lock:
+			self.__created[conn] = time.time()
+			self.__stats["created"] += 1
+
+		return conn
+
+	def __is_healthy__(self, conn, last_used):
+		if conn.closed:
+			return False
+
+		if self.__expired__(conn):
+			with self.__lock:
+				self.__stats["recycled"] += 1
+
+			return False
+
+		if time.time() - last_used >= self.__check_interval:
+			try:
+				cur = conn.cursor()
+				cur.execute("select 1")
+				cur.close()
+				conn.rollback()
+
+			except psycopg2.Error:
+				with self.__lock:
+					self.__stats["broken"] += 1
+
+				return False
+
+		return True
+
+	def __expired__(self, conn):
+		return self.__max_lifetime > 0 and time.time() - self.__created.get(conn, 0) >= self.__max_lifetime
+
+	# must be called with acquired lock:
+	def __discard__(self, conn):
+		self.__size -= 1
+		self.__created.pop(conn, None)
+
+		try:
+			conn.close()
+
+		except psycopg2.Error:
+			pass
+
+class PGConnection(database.Connection):
+	def __init__(self, pool):
 		database.Connection.__init__(self)
 
 		self.__conn = None
-		self.__host = kwargs["host"]
-		self.__port = kwargs["port"]
-		self.__user = kwargs["username"]
-		self.__pwd = kwargs["password"]
-		self.__db = db
+		self.__pool = pool
 
 	def __connect__(self):
-		if self.__conn == None:
-			cn_str = "host='%s' dbname='%s' port=%d user='%s' password='%s'" % (self.__host, self.__db, self.__port, self.__user, self.__pwd)
-			self.__conn = psycopg2.connect(cn_str)
+		if self.__conn is None:
+			self.__conn = self.__pool.get()
 
 	def __create_transaction_scope__(self):
 		self.__connect__()
 		return PGTransactionScope(self)
 
+	def __create_nested_scope__(self, depth):
+		return PGSavepointScope(self, "sp_%d" % depth)
+
+	def set_read_only(self):
+		self.__conn.cursor().execute("set transaction read only")
+
 	def cursor(self, factory=psycopg2.extras.DictCursor):
 		return self.__conn.cursor(cursor_factory=factory)
 
@@ -83,8 +292,38 @@ class PGConnection(database.Connection):
 
 	def close(self):
 		if self.__conn is not None:
+			self.__pool.put(self.__conn)
+			self.__conn = None
+
+class PGListener(database.Listener):
+	def __init__(self, db, channel, **kwargs):
+		cn_str = "host='%s' dbname='%s' port=%d user='%s' password='%s'" % (kwargs["host"], db, kwargs["port"], kwargs["username"], kwargs["password"])
+
+		self.__conn = psycopg2.connect(cn_str)
+		self.__conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+
+		cur = self.__conn.cursor()
+		cur.execute("listen %s" % channel)
+		cur.close()
+
+	def fileno(self):
+		return self.__conn.fileno()
+
+	def poll(self):
+		self.__conn.poll()
+
+		payloads = map(lambda n: n.payload, self.__conn.notifies)
+		del self.__conn.notifies[:]
+
+		return payloads
+
+	def close(self):
+		try:
 			self.__conn.close()
 
+		except psycopg2.Error:
+			pass
+
 class PGDb:
 	def __init__(self): pass
 
@@ -109,16 +348,39 @@ class PGDb:
 
 		return tags
 
+	def __attach_tags__(self, cur, objs):
+		tags = {}
+
+		for obj in objs:
+			obj["tags"] = tags.setdefault(obj["guid"], [])
+
+		if len(objs) > 0:
+			for row in fetch_all(cur, "select distinct object_guid, tag from object_tag where object_guid=any(%s::uuid[])", tags.keys()):
+				tags[row[0]].append(row[1])
+
+		return objs
+
 	def __get_objects__(self, cur, query, *params):
 		objs = []
 
 		for row in fetch_all(cur, query, *params):
 			objs.append(self.__build_object__(row))
 
-		for obj in objs:
-			obj["tags"] = self.__get_tags__(cur, obj["guid"])
+		return self.__attach_tags__(cur, objs)
 
-		return objs
+	def __create_page__(self, items, rows, page_size, key):
+		cursor = None
+
+		if len(rows) > 0 and len(rows) == page_size:
+			cursor = util.encode_cursor(key(rows[-1]))
+
+		return database.Page(items, cursor)
+
+	def __get_object_page__(self, cur, page_size, key, query, *params):
+		rows = fetch_all(cur, query, *params)
+		objs = self.__attach_tags__(cur, map(self.__build_object__, rows))
+
+		return self.__create_page__(objs, rows, page_size, key)
 
 class PGTestDb(PGDb, database.TestDb):
 	def __init__(self):
@@ -128,7 +390,6 @@ class PGTestDb(PGDb, database.TestDb):
 	def clear(self, scope):
 		cur = scope.get_handle()
 
-		cur.execute("delete from request")
 		cur.execute("delete from public_message")
 		cur.execute("delete from user_favorite")
 		cur.execute("delete from user_recommendation")
@@ -141,6 +402,9 @@ class PGTestDb(PGDb, database.TestDb):
 		cur.execute("delete from user_request")
 		cur.execute("delete from mail")
 		cur.execute("delete from message")
+		cur.execute("delete from activity")
+		cur.execute("delete from stream_event")
+		cur.execute("delete from tag_stats")
 		cur.execute("delete from \"user\"")
 
 class PGUserDb(PGDb, database.UserDb):
@@ -230,6 +494,20 @@ class PGUserDb(PGDb, database.UserDb):
 
 		return user
 
+	def get_users_by_id(self, scope, ids):
+		users = {}
+
+		if len(ids) > 0:
+			for row in fetch_all(scope.get_handle(), "select * from \"user\" where id=any(%s::integer[])", list(ids)):
+				user = {}
+
+				for k in ["id", "username", "firstname", "lastname", "email", "gender", "created_on", "avatar", "protected", "blocked", "language", "deleted"]:
+					user[k] = row[k]
+
+				users[user["id"]] = user
+
+		return users
+
 	def remove_password_requests_by_user_id(self, scope, user_id):
 		cur = scope.get_handle()
 		cur.execute("delete from password_request where user_id=%s", (user_id,))
@@ -289,22 +567,37 @@ class PGUserDb(PGDb, database.UserDb):
 
 		return friends
 
-	def search(self, scope, query):
-		if query is None:
-			query = re.sub("[^0-9a-zA-Z]+", "_", query)
+	def get_followed_usernames_by_id(self, scope, ids):
+		friends = {}
 
-		sql = "select username from \"user\" where (firstname ilike '%%%s%%' or lastname ilike '%%%s%%' or username ilike '%%%s%%' " \
-		      "or iemail like '%%%s%%') and deleted=false order by iusername, firstname, lastname" % (query, query, query, query)
+		for id in ids:
+			friends[id] = []
 
-		cur = scope.get_handle()
-		cur.execute(sql)
+		if len(ids) > 0:
+			query = "select user_id, friends.username from \"user_friendship\" "        + \
+			        "inner join \"user\" as friends on friend_id=friends.id "             + \
+			        "where user_id=any(%s::bigint[]) and friends.deleted=false"
 
-		result = []
+			for row in fetch_all(scope.get_handle(), query, list(ids)):
+				friends[row["user_id"]].append(row["username"])
 
-		for row in cur.fetchall():
-			result.append(row["username"])
+		return friends
+
+	def search(self, scope, query, page_size=100, after=None):
+		pattern = "%%%s%%" % escape_like(util.strip(query).lower())
+		last = None
+
+		if after is not None:
+			last = util.decode_cursor(after, str)[0]
+
+		sql = "select id, username, iusername from \"user\" "                                                      + \
+		      "where (firstname ilike %s or lastname ilike %s or iusername like %s or iemail like %s) and deleted=false " + \
+		      "and (%s is null or iusername>%s) order by iusername limit %s"
+
+		rows = fetch_all(scope.get_handle(), sql, pattern, pattern, pattern, pattern, last, last, page_size)
+		users = map(lambda row: { "id": row["id"], "username": row["username"] }, rows)
 
-		return result
+		return self.__create_page__(users, rows, page_size, lambda row: [row["iusername"]])
 
 	def is_following(self, scope, user1, user2):
 		query = "select count(*) from user_friendship "                                 + \
@@ -352,19 +645,34 @@ class PGUserDb(PGDb, database.UserDb):
 
 		return execute_scalar(scope.get_handle(), query, sender, receiver, guid) > 0
 
-	def get_recommendations(self, scope, username, page=0, page_size=10):
+	def get_recommendations(self, scope, username, page=0, page_size=10, after=None):
 		recommendations = []
 		cur = scope.get_handle()
 
-		for row in fetch_all(cur, "select * from v_recommendations where receiver=lower(%s) order by recommended_on desc offset %s*%s limit %s",
-		                           username, page, page_size, page_size):
+		if after is None:
+			query = "select * from v_recommendations where receiver=lower(%s) " + \
+			        "order by recommended_on desc, guid desc, sender desc offset %s limit %s"
+
+			rows = fetch_all(cur, query, username, page * page_size, page_size)
+		else:
+			recommended_on, guid, sender = util.decode_cursor(after, datetime, uuid.UUID, str)
+
+			query = "select * from v_recommendations where receiver=lower(%s) "                           + \
+			        "and (recommended_on, guid, sender)<(%s::timestamp, %s::uuid, %s) "                  + \
+			        "order by recommended_on desc, guid desc, sender desc limit %s"
+
+			rows = fetch_all(cur, query, username, recommended_on, guid, sender, page_size)
+
+		for row in rows:
 			details = self.__build_object__(row)
 			details["username"] = row["sender"]
 			details["recommended_on"] = row["recommended_on"]
 
 			recommendations.append(details)
 
-		return recommendations
+		self.__attach_tags__(cur, recommendations)
+
+		return self.__create_page__(recommendations, rows, page_size, lambda row: [row["recommended_on"], row["guid"], row["sender"]])
 
 class PGObjectDb(PGDb, database.ObjectDb):
 	def __init__(self):
@@ -399,23 +707,118 @@ class PGObjectDb(PGDb, database.ObjectDb):
 
 		return obj
 
-	def get_objects(self, scope, page=0, page_size=10):
-		query = "select * from v_objects order by created_on desc limit %d offset %d*%d" % (page_size, page, page_size)
+	def get_objects_by_guid(self, scope, guids):
+		objs = {}
+
+		if len(guids) > 0:
+			for obj in self.__get_objects__(scope.get_handle(), "select * from v_objects where guid=any(%s::uuid[])", list(guids)):
+				objs[obj["guid"]] = obj
+
+		return objs
+
+	def get_objects(self, scope, page=0, page_size=10, after=None):
+		key = lambda row: [row["created_on"], row["guid"]]
+
+		if after is None:
+			query = "select * from v_objects order by created_on desc, guid desc limit %s offset %s"
 
-		return self.__get_objects__(scope.get_handle(), query)
+			return self.__get_object_page__(scope.get_handle(), page_size, key, query, page_size, page * page_size)
 
-	def get_tagged_objects(self, scope, tag, page=0, page_size=10):
-		return self.__get_objects__(scope.get_handle(), "select * from object_get_tagged(%s) limit %s offset %s*%s", tag, page_size, page, page_size)
+		created_on, guid = util.decode_cursor(after, datetime, uuid.UUID)
 
-	def get_popular_objects(self, scope, page=0, page_size=10):
-		query = "select * from v_popular_objects limit %d offset %d*%d" % (page_size, page, page_size)
+		query = "select * from v_objects where (created_on, guid)<(%s::timestamp, %s::uuid) " + \
+		        "order by created_on desc, guid desc limit %s"
 
-		return self.__get_objects__(scope.get_handle(), query)
+		return self.__get_object_page__(scope.get_handle(), page_size, key, query, created_on, guid, page_size)
+
+	def get_tagged_objects(self, scope, tag, page=0, page_size=10, after=None):
+		key = lambda row: [row["tagcount"], row["created_on"], row["guid"]]
+
+		if after is None:
+			query = "select * from object_get_tagged(%s) order by tagcount desc, created_on desc, guid desc limit %s offset %s"
+
+			return self.__get_object_page__(scope.get_handle(), page_size, key, query, tag, page_size, page * page_size)
+
+		tagcount, created_on, guid = util.decode_cursor(after, int, datetime, uuid.UUID)
+
+		query = "select * from object_get_tagged(%s) where (tagcount, created_on, guid)<(%s, %s::timestamp, %s::uuid) " + \
+		        "order by tagcount desc, created_on desc, guid desc limit %s"
+
+		return self.__get_object_page__(scope.get_handle(), page_size, key, query, tag, tagcount, created_on, guid, page_size)
+
+	def get_popular_objects(self, scope, page=0, page_size=10, after=None):
+		key = lambda row: [row["score"], row["created_on"], row["guid"]]
+
+		if after is None:
+			query = "select * from v_popular_objects order by score desc, created_on desc, guid desc limit %s offset %s"
+
+			return self.__get_object_page__(scope.get_handle(), page_size, key, query, page_size, page * page_size)
+
+		score, created_on, guid = util.decode_cursor(after, int, datetime, uuid.UUID)
+
+		query = "select * from v_popular_objects where (score, created_on, guid)<(%s, %s::timestamp, %s::uuid) " + \
+		        "order by score desc, created_on desc, guid desc limit %s"
+
+		return self.__get_object_page__(scope.get_handle(), page_size, key, query, score, created_on, guid, page_size)
 
 	def get_random_objects(self, scope, page_size=10):
-		query = "select * from v_random_objects limit %d" % (page_size)
+		cur = scope.get_handle()
+		objs = []
+
+		if page_size > 0:
+			low, high = fetch_one(cur, "select min(id), max(id) from object where not deleted")
+
+			if low is not None:
+				rows = self.__sample_objects__(cur, low, high, page_size)
+				objs = self.__attach_tags__(cur, map(self.__build_object__, rows))
+
+		return objs
+
+	# the predicate on "deleted" lets the planner use the partial index idx_object_id:
+	def __sample_objects__(self, cur, low, high, count):
+		query = "select v_objects.*, object.id from v_objects inner join object on object.guid=v_objects.guid where not object.deleted "
+
+		found = {}
+		ids = []
+		tried = set()
+		rounds = 0
+
+		# draw distinct ids & retry for ids of deleted objects:
+		while len(ids) < count and len(tried) <= high - low and rounds < 3:
+			n = min(count - len(ids), high - low + 1 - len(tried))
+			drawn = [id for id in random.sample(xrange(low, high + 1), n) if id not in tried]
+
+			tried.update(drawn)
+
+			for row in fetch_all(cur, query + "and object.id=any(%s::bigint[])", drawn):
+				found[row["id"]] = row
 
-		return self.__get_objects__(scope.get_handle(), query)
+			ids.extend([id for id in drawn if found.has_key(id)])
+			rounds += 1
+
+		# sparse id range => take the first object following each of multiple random positions
+		# (objects following large gaps are picked more likely):
+		rounds = 0
+
+		while len(ids) < count and rounds < 3:
+			starts = map(lambda _: random.randint(low, high), range(count - len(ids)))
+
+			for row in fetch_all(cur, "select sample.* from unnest(%s::bigint[]) as start, lateral (" + query +
+			                     "and object.id>=start and not object.id=any(%s::bigint[]) order by object.id limit 1) as sample",
+			                     starts, ids):
+				if not found.has_key(row["id"]):
+					found[row["id"]] = row
+					ids.append(row["id"])
+
+			rounds += 1
+
+		# less objects than requested or unlucky draws => fill up in id order:
+		if len(ids) < count:
+			for row in fetch_all(cur, query + "and not object.id=any(%s::bigint[]) order by object.id limit %s", ids, count - len(ids)):
+				found[row["id"]] = row
+				ids.append(row["id"])
+
+		return [found[id] for id in ids]
 
 	def add_tag(self, scope, guid, user_id, tag):
 		cur = scope.get_handle()
@@ -425,16 +828,19 @@ class PGObjectDb(PGDb, database.ObjectDb):
 		else:
 			raise exception.ConflictException("Tag already exists.")
 
-	def get_tags(self, scope):
+	def get_tags(self, scope, limit=None):
 		tags = []
 
-		for tag in fetch_all(scope.get_handle(), "select * from v_tags"):
+		for tag in fetch_all(scope.get_handle(), "select tag, count from tag_stats order by count desc, tag limit %s", limit):
 			tags.append(to_dict(tag))
 
 		return tags
 
+	def reconcile_tags(self, scope):
+		return execute_scalar(scope.get_handle(), "select tag_stats_reconcile()")
+
 	def user_can_vote(self, scope, guid, username):
-		query = "select count(*) from object_score inner join \"user\" on user_id=id where object_guid=%s and lower(iusername)=lower(%s)"
+		query = "select count(*) from object_score inner join \"user\" on user_id=id where object_guid=%s and iusername=lower(%s)"
 
 		return execute_scalar(scope.get_handle(), query, guid, username) == 0
 
@@ -446,21 +852,37 @@ class PGObjectDb(PGDb, database.ObjectDb):
 
 		return execute_scalar(scope.get_handle(), query, username, guid)
 
+	def get_votings(self, scope, guids, user_ids):
+		votings = {}
+
+		if len(guids) > 0 and len(user_ids) > 0:
+			query = "select object_guid, user_id, up from object_score where object_guid=any(%s::uuid[]) and user_id=any(%s::integer[])"
+
+			for row in fetch_all(scope.get_handle(), query, list(guids), list(user_ids)):
+				votings[(row["object_guid"], row["user_id"])] = row["up"]
+
+		return votings
+
 	def add_comment(self, scope, guid, user_id, text):
 		scope.get_handle().execute("insert into object_comment (user_id, object_guid, comment_text) values (%s, %s, %s)", (user_id, guid, text))
 
 	def flag_comment_deleted(self, scope, id):
 		scope.get_handle().execute("update object_comment set deleted=true where id=%s", (id,))
 
-	def get_comments(self, scope, guid, page=0, page_size=100):
-		comments = []
+	def get_comments(self, scope, guid, page=0, page_size=100, after=None):
+		if after is None:
+			rows = fetch_all(scope.get_handle(), "select * from object_get_comments(%s, %s, %s)", guid, page, page_size)
+		else:
+			created_on, id = util.decode_cursor(after, datetime, int)
 
-		query = "select * from object_get_comments(%s, %s, %s)"
+			query = "select object_comment.id, comment_text as text, object_comment.created_on, object_comment.deleted, " + \
+			        "\"user\".username from object_comment join \"user\" on object_comment.user_id=\"user\".id "          + \
+			        "where object_guid=%s and (object_comment.created_on, object_comment.id)<(%s::timestamp, %s) "         + \
+			        "order by object_comment.created_on desc, object_comment.id desc limit %s"
 
-		for row in fetch_all(scope.get_handle(), query, guid, page, page_size):
-			comments.append(to_dict(row))
+			rows = fetch_all(scope.get_handle(), query, guid, created_on, id, page_size)
 
-		return comments
+		return self.__create_page__(map(to_dict, rows), rows, page_size, lambda row: [row["created_on"], row["id"]])
 
 	def get_comment(self, scope, id):
 		query = "select object_comment.id, comment_text as text, object_comment.created_on, object_comment.deleted, " + \
@@ -469,6 +891,20 @@ class PGObjectDb(PGDb, database.ObjectDb):
 
 		return to_dict(fetch_one(scope.get_handle(), query, id))
 
+	def get_comments_by_id(self, scope, ids):
+		comments = {}
+
+		if len(ids) > 0:
+			query = "select object_comment.id, comment_text as text, object_comment.created_on, object_comment.deleted, " + \
+			        "\"user\".username, object_comment.user_id, object_guid as \"object-guid\" "                          + \
+			        "from object_comment join \"user\" on object_comment.user_id=\"user\".id "                              + \
+			        "where object_comment.id=any(%s::bigint[])"
+
+			for row in fetch_all(scope.get_handle(), query, list(ids)):
+				comments[row["id"]] = to_dict(row)
+
+		return comments
+
 	def comment_exists(self, scope, id):
 		return util.to_bool(execute_scalar(scope.get_handle(), "select count(id) from object_comment where id=%s", id))
 
@@ -476,6 +912,9 @@ class PGObjectDb(PGDb, database.ObjectDb):
 		cur = scope.get_handle()
 		cur.execute("update object set reported=true where guid=%s", (guid,))
 
+	def reconcile_counters(self, scope):
+		return execute_scalar(scope.get_handle(), "select object_reconcile_counters()")
+
 class PGStreamDb(PGDb, database.StreamDb):
 	def __init__(self):
 		database.StreamDb.__init__(self)
@@ -507,6 +946,60 @@ class PGStreamDb(PGDb, database.StreamDb):
 
 		return messages
 
+	def process_events(self, scope, limit=1000, fanout=True):
+		cur = scope.get_handle()
+		ids = map(lambda row: row[0], fetch_all(cur, "select id from stream_event order by id limit %s for update skip locked", limit))
+
+		if len(ids) > 0:
+			# messages sent to a single user:
+			cur.execute("insert into message (receiver_id, type, target, source, created_on) "          + \
+			            "select receiver_id, type, target, source_id::varchar, created_on from stream_event " + \
+			            "where id=any(%s::bigint[]) and receiver_id is not null", (ids,))
+
+			# notifications sent to all followers:
+			if fanout:
+				cur.execute("insert into message (receiver_id, type, target, source, created_on) "                          + \
+				            "select follower_id, type, target, source_id::varchar, created_on from stream_event "                 + \
+				            "cross join lateral user_get_follower_ids(source_id) as follower_id "                                 + \
+				            "where id=any(%s::bigint[]) and receiver_id is null", (ids,))
+
+			# public messages:
+			cur.execute("insert into public_message (type, target, source, created_on) "         + \
+			            "select type, target, source_id::varchar, created_on from stream_event " + \
+			            "where id=any(%s::bigint[]) and public", (ids,))
+
+			cur.execute("delete from stream_event where id=any(%s::bigint[])", (ids,))
+
+		return len(ids)
+
+class PGActivityStreamDb(PGStreamDb):
+	def __init__(self):
+		PGStreamDb.__init__(self)
+
+	def get_messages(self, scope, user, limit=100, after=None):
+		cur = scope.get_handle()
+
+		# messages sent directly to the user:
+		query = "select message.id, target, source, message.created_on, type from message "                            + \
+		        "inner join \"user\" on \"user\".id=receiver_id "                                                      + \
+		        "where iusername=lower(%s) and type in ('recommendation', 'following', 'unfollowing') "                + \
+		        "and (%s is null or message.created_on>%s) order by created_on desc, message.id desc limit %s"
+
+		streams = [map(to_dict, fetch_all(cur, query, user, after, after, limit))]
+
+		# latest activities of the followed users (the database merges the activities, only the
+		# first rows are fetched):
+		query = "select activity.id, activity.target, activity.user_id::varchar as source, activity.created_on, activity.type " + \
+		        "from user_friendship inner join \"user\" on \"user\".id=user_friendship.user_id "                                 + \
+		        "cross join lateral (select * from activity where activity.user_id=user_friendship.friend_id "                  + \
+		        "and (%s is null or activity.created_on>%s) order by created_on desc, id desc limit %s) activity "               + \
+		        "where iusername=lower(%s) order by activity.created_on desc, activity.id desc limit %s"
+
+		streams.append(map(to_dict, fetch_all(cur, query, after, after, limit, user, limit)))
+
+		# merge streams (activities & messages share a sequence, ids are unique):
+		return util.merge_descending(streams, lambda msg: (msg["created_on"], msg["id"]), limit)
+
 class PGMailDb(PGDb, database.MailDb):
 	def __init__(self):
 		database.MailDb.__init__(self)
@@ -521,40 +1014,49 @@ class PGMailDb(PGDb, database.MailDb):
 		cur.execute("insert into mail (subject, body, mail) values (%s, %s, %s)", (subject, body, mail))
 
 	def get_unsent_messages(self, scope, limit=100):
-		query = "select mail.id, mail.subject, mail.body, mail.created_on, " + \
-		        "coalesce(mail.mail, \"user\".email) as email "              + \
-		        "from mail left join \"user\" on receiver_id=\"user\".id "   + \
-		        "where sent=false order by created_on, id limit %d" % (limit)
+		query = "select mail.id, mail.subject, mail.body, mail.created_on, mail.attempts, "  + \
+		        "coalesce(mail.mail, \"user\".email) as email "                              + \
+		        "from mail left join \"user\" on receiver_id=\"user\".id "                   + \
+		        "where sent=false and failed=false and next_attempt_on<=timezone('utc'::text, now()) " + \
+		        "order by next_attempt_on, id limit %s"
 
 		mails = []
 		cur = scope.get_handle()
 
-		for row in fetch_all(cur, query):
+		for row in fetch_all(cur, query, limit):
 			mails.append(to_dict(row))
 
 		return mails
 
-	def mark_sent(self, scope, id):
-		cur = scope.get_handle()
-		cur.execute("update mail set sent=true where id=%s" % (id,))
-
-class PGRequestDb(PGDb, database.RequestDb):
-	def __init__(self):
-		database.RequestDb.__init__(self)
-		PGDb.__init__(self)
+	def claim_messages(self, scope, limit, lease):
+		query = "update mail set next_attempt_on=timezone('utc'::text, now())+%s*interval '1 second' "               + \
+		        "where id in (select id from mail where sent=false and failed=false "                                + \
+		        "and next_attempt_on<=timezone('utc'::text, now()) order by next_attempt_on, id limit %s "            + \
+		        "for update skip locked) "                                                                          + \
+		        "returning id, subject, body, created_on, attempts, "                                               + \
+		        "coalesce(mail, (select email from \"user\" where \"user\".id=receiver_id)) as email"
 
-	def add_request(self, scope, ip, user_id=None):
+		mails = []
 		cur = scope.get_handle()
-		cur.execute("insert into request (address, user_id) values (%s, %s)", (ip, user_id))
 
-	def count_requests_by_ip(self, scope, ip, seconds):
-		cur = scope.get_handle()
-		query = "select count(id) from request where address=%s and date_part('epoch'::text, age(timezone('utc'::text, now()), created_on))<=%s"
+		for row in fetch_all(cur, query, lease, limit):
+			mails.append(to_dict(row))
 
-		return execute_scalar(cur, query, ip, seconds)
+		return sorted(mails, key=lambda m: m["id"])
 
-	def count_requests_by_user_id(self, scope, user_id, seconds):
-		cur = scope.get_handle()
-		query = "select count(id) from request where user_id=%s and date_part('epoch'::text, age(timezone('utc'::text, now()), created_on))<=%s"
+	def mark_sent(self, scope, ids):
+		if len(ids) > 0:
+			cur = scope.get_handle()
+			cur.execute("update mail set sent=true, sent_on=timezone('utc'::text, now()) where id=any(%s::bigint[])", (list(ids),))
+
+	def mark_failed(self, scope, ids, max_attempts, delay, max_delay):
+		if len(ids) > 0:
+			cur = scope.get_handle()
+			cur.execute("update mail set attempts=attempts+1, failed=(attempts+1>=%s), "                                                    + \
+			            "next_attempt_on=timezone('utc'::text, now())+least(%s*power(2, attempts), %s)*interval '1 second' " + \
+			            "where id=any(%s::bigint[])", (max_attempts, delay, max_delay, list(ids)))
 
-		return execute_scalar(cur, query, user_id, seconds)
+	def release_messages(self, scope, ids):
+		if len(ids) > 0:
+			cur = scope.get_handle()
+			cur.execute("update mail set next_attempt_on=timezone('utc'::text, now()) where id=any(%s::bigint[]) and sent=false", (list(ids),))
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+	project............: meat-a
+	description........: web application for sharing meta information
+	date...............: 04/2013
+	copyright..........: Sebastian Fedrau
+
+	Permission is hereby granted, free of charge, to any person obtaining
+	a copy of this software and associated documentation files (the
+	"Software"), to deal in the Software without restriction, including
+	without limitation the rights to use, copy, modify, merge, publish,
+	distribute, sublicense, and/or sell copies of the Software, and to
+	permit persons to whom the Software is furnished to do so, subject to
+	the following conditions:
+
+	The above copyright notice and this permission notice shall be
+	included in all copies or substantial portions of the Software.
+
+	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+	EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+	MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+	IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+	OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+	ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+	OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+##
+#  @file ratelimit.py
+#  Request rate limiting.
+
+## @package ratelimit
+#  Request rate limiting.
+
+import abc, threading, time, util
+
+## Base class for rate limiters. A rate limiter counts events (e.g. HTTP requests) by key
+#  (e.g. an IP address) and tests if the number of events exceeds a limit.
+class RateLimiter():
+	__metaclass__ = abc.ABCMeta
+
+	## Counts an event and tests if the limit has been reached.
+	#  @param key identifies the counter (e.g. "ip:127.0.0.1")
+	#  @param limit maximum number of events within the specified period
+	#  @param period length of the period (in seconds)
+	#  @return True if the event is allowed, False if the limit has been reached
+	@abc.abstractmethod
+	def consume(self, key, limit, period=3600): return None
+
+## An in-process rate limiter implementing the token bucket algorithm. Each key holds a
+#  bucket with a capacity of "limit" tokens which is refilled continuously within the period.
+#  Buckets are stored in memory, so limits are counted separately by each process.
+class TokenBucketRateLimiter(RateLimiter):
+	## The constructor.
+	#  @param prune_interval interval (in seconds) to remove refilled buckets
+	def __init__(self, prune_interval=60):
+		self.__buckets = {}
+		self.__lock = threading.Lock()
+		self.__prune_interval = prune_interval
+		self.__last_prune = time.time()
+
+	def consume(self, key, limit, period=3600):
+		with self.__lock:
+			now = time.time()
+
+			try:
+				tokens, last_update, bucket_period = self.__buckets[key]
+				tokens = min(limit, tokens + (now - last_update) * limit / float(period))
+
+			except KeyError:
+				tokens = limit
+
+			allowed = tokens >= 1
+
+			if allowed:
+				tokens -= 1
+
+			self.__buckets[key] = (tokens, now, period)
+
+			if now - self.__last_prune >= self.__prune_interval:
+				self.__prune__(now)
+
+		return allowed
+
+	## Gets the number of stored buckets.
+	#  @return number of buckets
+	def size(self):
+		with self.__lock:
+			return len(self.__buckets)
+
+	def __prune__(self, now):
+		# a bucket which hasn't been updated within its period is full again and can be dropped:
+		for key in [k for k, v in self.__buckets.items() if now - v[1] >= v[2]]:
+			del self.__buckets[key]
+
+		self.__last_prune = now
+
+## A rate limiter storing its counters in a shared key-value store (e.g. memcached). It
+#  implements the sliding window counter algorithm: the number of events within the last
+#  period is estimated from the counters of the current and the previous fixed window.
+#
+#  The store has to provide the methods of a python-memcached client used by this class:
+#  get(key), add(key, value, time) and incr(key, delta). LocalStore can be used instead of
+#  a shared store for testing or single process deployments.
+class SlidingWindowRateLimiter(RateLimiter):
+	## The constructor.
+	#  @param store a key-value store
+	#  @param prefix prefix of stored keys
+	def __init__(self, store, prefix="meat-a:ratelimit"):
+		self.__store = store
+		self.__prefix = prefix
+
+	def consume(self, key, limit, period=3600):
+		now = time.time()
+		window = int(now // period)
+		elapsed = (now - window * period) / float(period)
+
+		key = util.hash(key)
+		current_key = "%s:%s:%d" % (self.__prefix, key, window)
+
+		# increment counter of the current window (create the counter if it doesn't exist):
+		current = self.__store.incr(current_key, 1)
+
+		if current is None:
+			self.__store.add(current_key, 0, period * 2)
+			current = self.__store.incr(current_key, 1) or 1
+
+		previous = int(self.__store.get("%s:%s:%d" % (self.__prefix, key, window - 1)) or 0)
+
+		return previous * (1.0 - elapsed) + current <= limit
+
+## An in-process key-value store providing the subset of the python-memcached client API
+#  used by SlidingWindowRateLimiter.
+class LocalStore:
+	## The constructor.
+	#  @param purge_interval interval (in seconds) to remove expired values
+	def __init__(self, purge_interval=60):
+		self.__items = {}
+		self.__lock = threading.Lock()
+		self.__purge_interval = purge_interval
+		self.__last_purge = time.time()
+
+	## Gets a value.
+	#  @param key key of the value
+	#  @return the found value or None
+	def get(self, key):
+		with self.__lock:
+			return self.__lookup__(key)
+
+	## Stores a value if the key doesn't exist.
+	#  @param key key of the value
+	#  @param value value to store
+	#  @param time expiration time (in seconds, 0 to store the value permanently)
+	#  @return True if the value has been stored
+	def add(self, key, value, time=0):
+		with self.__lock:
+			if self.__lookup__(key) is not None:
+				return False
+
+			self.__items[key] = (value, self.__expiry__(time))
+			self.__purge__()
+
+			return True
+
+	## Increments a numeric value.
+	#  @param key key of the value
+	#  @param delta value to add
+	#  @return the new value or None if the key doesn't exist
+	def incr(self, key, delta=1):
+		with self.__lock:
+			value = self.__lookup__(key)
+
+			if value is None:
+				return None
+
+			value = int(value) + delta
+			self.__items[key] = (value, self.__items[key][1])
+
+			return value
+
+	def __lookup__(self, key):
+		try:
+			value, expiry = self.__items[key]
+
+			if expiry is None or expiry > time.time():
+				return value
+
+			del self.__items[key]
+
+		except KeyError:
+			pass
+
+		return None
+
+	def __purge__(self):
+		now = time.time()
+
+		if now - self.__last_purge >= self.__purge_interval:
+			for key in [k for k, v in self.__items.items() if v[1] is not None and v[1] <= now]:
+				del self.__items[key]
+
+			self.__last_purge = now
+
+	def __expiry__(self, seconds):
+		if seconds > 0:
+			return time.time() + seconds
+
+		return None
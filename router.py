@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+	project............: meat-a
+	description........: web application for sharing meta information
+	date...............: 04/2013
+	copyright..........: Sebastian Fedrau
+
+	Permission is hereby granted, free of charge, to any person obtaining
+	a copy of this software and associated documentation files (the
+	"Software"), to deal in the Software without restriction, including
+	without limitation the rights to use, copy, modify, merge, publish,
+	distribute, sublicense, and/or sell copies of the Software, and to
+	permit persons to whom the Software is furnished to do so, subject to
+	the following conditions:
+
+	The above copyright notice and this permission notice shall be
+	included in all copies or substantial portions of the Software.
+
+	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+	EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+	MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+	IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+	OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+	ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+	OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+##
+#  @file router.py
+#  URL routing.
+
+## @package router
+#  URL routing.
+
+import re
+
+## Raised when no route matches a path.
+class RouteNotFoundException(Exception):
+	pass
+
+## Dispatches paths to routes. The regular expressions of the routing table are split
+#  into path segments and compiled into a prefix tree once, so a path is matched segment
+#  by segment instead of testing every route.
+#
+#  A route is a dictionary holding at least a compiled regular expression ("path") which
+#  has to start with "^/" and end with "$". Parameters must not span multiple segments.
+#  If multiple routes match a path the first one in the routing table wins.
+class Router:
+	## The constructor.
+	#  @param routes the routing table
+	def __init__(self, routes):
+		self.__root = self.__create_node__()
+
+		for index, route in enumerate(routes):
+			node = self.__root
+
+			for segment in split_pattern(route["path"].pattern):
+				node = self.__add_segment__(node, segment, index)
+
+			node["routes"].append((index, route))
+
+	## Finds the route matching a path.
+	#  @param path path to match
+	#  @return the found route and a dictionary holding the parameters found in the path
+	def match(self, path):
+		if not path.startswith("/"):
+			raise RouteNotFoundException()
+
+		found = self.__match__(self.__root, path[1:].split("/"), 0)
+
+		if found is None:
+			raise RouteNotFoundException()
+
+		return found[1], found[2]
+
+	def __create_node__(self, index=0):
+		# "first" is the lowest index of all routes below the node:
+		return {"literals": {}, "patterns": [], "routes": [], "first": index}
+
+	def __add_segment__(self, node, segment, index):
+		if is_literal(segment):
+			return node["literals"].setdefault(segment, self.__create_node__(index))
+
+		for pattern, child in node["patterns"]:
+			if pattern.pattern == "^%s$" % segment:
+				return child
+
+		child = self.__create_node__(index)
+		node["patterns"].append((re.compile("^%s$" % segment), child))
+
+		return child
+
+	def __match__(self, node, segments, depth):
+		# end of path => take the first route of the current node:
+		if depth == len(segments):
+			if len(node["routes"]) > 0:
+				index, route = node["routes"][0]
+
+				return index, route, {}
+
+			return None
+
+		segment = segments[depth]
+		best = None
+
+		child = node["literals"].get(segment)
+
+		if child is not None:
+			best = self.__match__(child, segments, depth + 1)
+
+		# parametrized children are sorted by route index, keep the match with the lowest index:
+		for pattern, child in node["patterns"]:
+			if best is not None and best[0] < child["first"]:
+				break
+
+			m = pattern.match(segment)
+
+			if m is not None:
+				found = self.__match__(child, segments, depth + 1)
+
+				if found is not None and (best is None or found[0] < best[0]):
+					found[2].update(m.groupdict())
+					best = found
+
+		return best
+
+## Splits a regular expression matching a path into path segments.
+#  @param pattern a regular expression starting with "^/" and ending with "$"
+#  @return an array holding the regular expression of each segment
+def split_pattern(pattern):
+	if not pattern.startswith("^/") or not pattern.endswith("$"):
+		raise ValueError("Pattern must start with '^/' and end with '$': %s" % pattern)
+
+	segments = []
+	current = []
+	depth = 0
+	escaped = False
+
+	for c in pattern[2:-1]:
+		if escaped:
+			escaped = False
+		elif c == "\\":
+			escaped = True
+		elif c in "([":
+			depth += 1
+		elif c in ")]":
+			depth -= 1
+		elif c == "/" and depth == 0:
+			segments.append("".join(current))
+			current = []
+			continue
+
+		current.append(c)
+
+	segments.append("".join(current))
+
+	return segments
+
+## Tests if a segment of a regular expression is a plain string.
+#  @param segment segment to test
+#  @return True if the segment doesn't contain special characters
+def is_literal(segment):
+	return re.search(r"[\\.^$*+?{}\[\]|()]", segment) is None
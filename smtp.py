@@ -32,11 +32,13 @@
 ## @package smtp
 #  SMTP functionality.
 
-from mailer import MTA
+from mailer import MTA, TransientError
 from email.mime.text import MIMEText
-import smtplib, logging, traceback, logger
+import smtplib, socket, logging, traceback, logger
 
-## MTA sending emails via SMTP.
+## MTA sending emails via SMTP. The connection is kept open until the session ends, a lost
+#  connection is reestablished. Connection failures and "service not available" responses
+#  raise a mailer.TransientError, other rejections only fail the affected mail.
 class SMTP_MTA(MTA):
 	## The constructor.
 	#  @param host hostname of the SMTP server
@@ -53,15 +55,14 @@ class SMTP_MTA(MTA):
 	def start_session(self):
 		self.__logger.debug("Starting mailer session.")
 
-		if self.ssl:
-			self.__client = smtplib.SMTP_SSL()
-		else:
-			self.__client = smtplib.SMTP()
+		try:
+			self.__connect__()
 
-		self.__client.connect(self.server, self.port)
+		except Exception, ex:
+			if self.__is_transient_error__(ex):
+				self.__raise_transient_error__(ex)
 
-                if len(self.username) > 0 and len(self.password) > 0:
-                    self.__client.login(self.username, self.password)
+			raise
 
 	def send(self, subject, body, receiver):
 		try:
@@ -73,16 +74,68 @@ class SMTP_MTA(MTA):
 			msg['From'] = self.address.strip()
 			msg['To'] = receiver.strip()
 
-			self.__client.sendmail(self.address, [ receiver ], msg.as_string())
+			try:
+				if self.__client is None:
+					self.__connect__()
+
+				self.__client.sendmail(self.address, [ receiver ], msg.as_string())
+
+			except (smtplib.SMTPServerDisconnected, socket.error):
+				self.__logger.warning("Connection to SMTP server lost, reconnecting.")
+				self.__connect__()
+				self.__client.sendmail(self.address, [ receiver ], msg.as_string())
 
 			return True
 
 		except Exception, ex:
+			if self.__is_transient_error__(ex):
+				self.__raise_transient_error__(ex)
+
 			self.__logger.error(ex)
-			self.__logger.error(traceback.print_exc())
+			self.__logger.error(traceback.format_exc())
 
 		return False
 
 	def end_session(self):
 		self.__logger.debug("Stopping mailer session.")
-		self.__client.quit()
+
+		if self.__client is not None:
+			try:
+				self.__client.quit()
+
+			except (smtplib.SMTPException, socket.error):
+				self.__client.close()
+
+			self.__client = None
+
+	def __connect__(self):
+		if self.__client is not None:
+			self.__client.close()
+			self.__client = None
+
+		if self.ssl:
+			client = smtplib.SMTP_SSL()
+		else:
+			client = smtplib.SMTP()
+
+		client.connect(self.server, self.port)
+
+		if len(self.username) > 0 and len(self.password) > 0:
+			client.login(self.username, self.password)
+
+		self.__client = client
+
+	# tests if the server isn't available (connection failures, failed login or reply code 421):
+	def __is_transient_error__(self, ex):
+		if isinstance(ex, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError,
+		                   smtplib.SMTPAuthenticationError, socket.error)):
+			return True
+
+		return isinstance(ex, smtplib.SMTPResponseException) and ex.smtp_code == 421
+
+	def __raise_transient_error__(self, ex):
+		if self.__client is not None:
+			self.__client.close()
+			self.__client = None
+
+		raise TransientError("SMTP server not available: %s" % ex)
@@ -1,5 +1,4 @@
-﻿delete from request;
-delete from public_message;
+﻿delete from public_message;
 delete from user_favorite;
 delete from user_recommendation;
 delete from object_score;
@@ -11,4 +10,7 @@ delete from user_friendship;
 delete from user_request;
 delete from mail;
 delete from message;
+delete from activity;
+delete from stream_event;
+delete from tag_stats;
 delete from "user";
\ No newline at end of file
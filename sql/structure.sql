@@ -23,6 +23,20 @@ CREATE EXTENSION IF NOT EXISTS plpgsql WITH SCHEMA pg_catalog;
 COMMENT ON EXTENSION plpgsql IS 'PL/pgSQL procedural language';
 
 
+--
+-- Name: pg_trgm; Type: EXTENSION; Schema: -; Owner: -
+--
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
+
+--
+-- Name: EXTENSION pg_trgm; Type: COMMENT; Schema: -; Owner: -
+--
+
+COMMENT ON EXTENSION pg_trgm IS 'text similarity measurement and index searching based on trigrams';
+
+
 SET search_path = public, pg_catalog;
 
 --
@@ -68,7 +82,7 @@ return query select
    from object_comment
      join "user" on object_comment.user_id="user".id
      where object_guid=obj_guid
-  ORDER BY object_comment.created_on desc
+  ORDER BY object_comment.created_on desc, object_comment.id desc
   offset page*page_size limit page_size;
 end; $$;
 
@@ -90,6 +104,105 @@ begin
 end; $$;
 
 
+--
+-- Name: object_reconcile_counters(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION object_reconcile_counters() RETURNS bigint
+    LANGUAGE plpgsql
+    AS $$
+declare
+	repaired bigint default 0;
+
+begin
+	update object set up=counted.up, down=counted.down, favorites=counted.favorites, comments=counted.comments
+		from (select object.guid,
+		             (select count(*) from object_score where object_score.object_guid=object.guid and object_score.up) as up,
+		             (select count(*) from object_score where object_score.object_guid=object.guid and not object_score.up) as down,
+		             (select count(*) from user_favorite where user_favorite.object_guid=object.guid) as favorites,
+		             (select count(*) from object_comment where object_comment.object_guid=object.guid) as comments
+		        from object) counted
+		where object.guid=counted.guid
+		      and (object.up, object.down, object.favorites, object.comments) is distinct from (counted.up, counted.down, counted.favorites, counted.comments);
+
+	get diagnostics repaired = row_count;
+
+	return repaired;
+end; $$;
+
+
+--
+-- Name: tag_stats_add(character varying, bigint); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION tag_stats_add(tag_name character varying, delta bigint) RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+begin
+	loop
+		update tag_stats set count=count+delta where tag=tag_name;
+
+		if found then
+			delete from tag_stats where tag=tag_name and count<=0;
+			return;
+		end if;
+
+		if delta<=0 then
+			return;
+		end if;
+
+		begin
+			insert into tag_stats (tag, count) values (tag_name, delta);
+			return;
+
+		exception when unique_violation then
+			-- tag has been inserted by a concurrent transaction => update it
+		end;
+	end loop;
+end; $$;
+
+
+--
+-- Name: tag_stats_reconcile(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION tag_stats_reconcile() RETURNS bigint
+    LANGUAGE plpgsql
+    AS $$
+declare
+	repaired bigint default 0;
+	changed bigint;
+
+begin
+	lock table tag_stats in exclusive mode;
+
+	create temporary table counted_tags on commit drop as
+		select object_tag.tag, count(*) as count from object_tag
+			inner join object on object.guid=object_tag.object_guid
+			where not object.deleted
+			group by object_tag.tag;
+
+	delete from tag_stats where not exists (select 1 from counted_tags where counted_tags.tag=tag_stats.tag);
+	get diagnostics changed = row_count;
+	repaired := repaired + changed;
+
+	update tag_stats set count=counted_tags.count from counted_tags
+		where tag_stats.tag=counted_tags.tag and tag_stats.count<>counted_tags.count;
+	get diagnostics changed = row_count;
+	repaired := repaired + changed;
+
+	insert into tag_stats (tag, count)
+		select tag, count from counted_tags
+		where not exists (select 1 from tag_stats where tag_stats.tag=counted_tags.tag);
+	get diagnostics changed = row_count;
+	repaired := repaired + changed;
+
+	drop table counted_tags;
+
+	return repaired;
+end; $$;
+
+
 --
 -- Name: trg_fn_check_if_email_can_be_changed(); Type: FUNCTION; Schema: public; Owner: -
 --
@@ -147,7 +260,7 @@ CREATE FUNCTION trg_fn_create_comment_message() RETURNS trigger
 
 	if not is_protected then
 		insert into "public_message" ("type", "target", "source") values ('wrote-comment', NEW.id, NEW.user_id::varchar);
-        end if;
+	end if;
         
         RETURN NEW;
     END;
@@ -222,13 +335,28 @@ CREATE FUNCTION trg_fn_generate_vote_messages() RETURNS trigger
 
 	if not is_protected then
 		insert into "public_message" ("type", "target", "source") values ('voted-object', NEW.object_guid, NEW.user_id::varchar);
-        end if;
+	end if;
         
         RETURN NEW;
     END;
 $$;
 
 
+--
+-- Name: trg_fn_notify_mail(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION trg_fn_notify_mail() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	perform pg_notify('mail_queue', '');
+
+	return null;
+    END;
+$$;
+
+
 --
 -- Name: trg_fn_update_iusername_and_iemail(); Type: FUNCTION; Schema: public; Owner: -
 --
@@ -245,6 +373,65 @@ CREATE FUNCTION trg_fn_update_iusername_and_iemail() RETURNS trigger
 $$;
 
 
+--
+-- Name: trg_fn_update_object_comment_counter(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION trg_fn_update_object_comment_counter() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if TG_OP = 'INSERT' then
+		update object set comments=comments+1 where guid=NEW.object_guid;
+	elsif TG_OP = 'DELETE' then
+		update object set comments=comments-1 where guid=OLD.object_guid;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+
+--
+-- Name: trg_fn_update_object_favorite_counter(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION trg_fn_update_object_favorite_counter() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if TG_OP = 'INSERT' then
+		update object set favorites=favorites+1 where guid=NEW.object_guid;
+	elsif TG_OP = 'DELETE' then
+		update object set favorites=favorites-1 where guid=OLD.object_guid;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+
+--
+-- Name: trg_fn_update_object_score_counters(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION trg_fn_update_object_score_counters() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if TG_OP = 'DELETE' or TG_OP = 'UPDATE' then
+		update object set up=up-(case when OLD.up then 1 else 0 end), down=down-(case when OLD.up then 0 else 1 end) where guid=OLD.object_guid;
+	end if;
+
+	if TG_OP = 'INSERT' or TG_OP = 'UPDATE' then
+		update object set up=up+(case when NEW.up then 1 else 0 end), down=down+(case when NEW.up then 0 else 1 end) where guid=NEW.object_guid;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+
 --
 -- Name: trg_fn_update_object_timestamps(); Type: FUNCTION; Schema: public; Owner: -
 --
@@ -276,6 +463,45 @@ CREATE FUNCTION trg_fn_update_object_timestamps() RETURNS trigger
 $$;
 
 
+--
+-- Name: trg_fn_update_tag_stats(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION trg_fn_update_tag_stats() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if TG_OP = 'INSERT' then
+		perform tag_stats_add(NEW.tag, 1) from object where guid=NEW.object_guid and not deleted;
+	elsif TG_OP = 'DELETE' then
+		perform tag_stats_add(OLD.tag, -1) from object where guid=OLD.object_guid and not deleted;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+
+--
+-- Name: trg_fn_update_tag_stats_deleted(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION trg_fn_update_tag_stats_deleted() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if OLD.deleted <> NEW.deleted then
+		perform tag_stats_add(tag, (case when NEW.deleted then -count(*) else count(*) end))
+			from object_tag where object_guid=NEW.guid
+			group by tag
+			order by tag;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+
 --
 -- Name: trg_fn_update_user_timestamps(); Type: FUNCTION; Schema: public; Owner: -
 --
@@ -427,6 +653,18 @@ begin
 end; $$;
 
 
+--
+-- Name: seq_message_id; Type: SEQUENCE; Schema: public; Owner: -
+--
+
+CREATE SEQUENCE seq_message_id
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
 --
 -- Name: seq_mail_id; Type: SEQUENCE; Schema: public; Owner: -
 --
@@ -443,6 +681,19 @@ SET default_tablespace = '';
 
 SET default_with_oids = false;
 
+--
+-- Name: activity; Type: TABLE; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE TABLE activity (
+    id bigint DEFAULT nextval('seq_message_id'::regclass) NOT NULL,
+    user_id bigint NOT NULL,
+    created_on timestamp without time zone DEFAULT timezone('utc'::text, now()) NOT NULL,
+    target character varying(64),
+    type message_type NOT NULL
+);
+
+
 --
 -- Name: mail; Type: TABLE; Schema: public; Owner: -; Tablespace: 
 --
@@ -455,22 +706,13 @@ CREATE TABLE mail (
     created_on timestamp without time zone DEFAULT timezone('utc'::text, now()),
     sent boolean DEFAULT false,
     sent_on timestamp without time zone,
-    mail character varying(128)
+    mail character varying(128),
+    attempts integer DEFAULT 0 NOT NULL,
+    next_attempt_on timestamp without time zone DEFAULT timezone('utc'::text, now()) NOT NULL,
+    failed boolean DEFAULT false NOT NULL
 );
 
 
---
--- Name: seq_message_id; Type: SEQUENCE; Schema: public; Owner: -
---
-
-CREATE SEQUENCE seq_message_id
-    START WITH 1
-    INCREMENT BY 1
-    NO MINVALUE
-    NO MAXVALUE
-    CACHE 1;
-
-
 --
 -- Name: message; Type: TABLE; Schema: public; Owner: -; Tablespace: 
 --
@@ -487,11 +729,24 @@ CREATE TABLE message (
 );
 
 
+--
+-- Name: seq_object_id; Type: SEQUENCE; Schema: public; Owner: -
+--
+
+CREATE SEQUENCE seq_object_id
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
 --
 -- Name: object; Type: TABLE; Schema: public; Owner: -; Tablespace: 
 --
 
 CREATE TABLE object (
+    id bigint DEFAULT nextval('seq_object_id'::regclass) NOT NULL,
     guid uuid NOT NULL,
     source character varying(512) NOT NULL,
     created_on timestamp without time zone DEFAULT timezone('utc'::text, now()) NOT NULL,
@@ -500,7 +755,11 @@ CREATE TABLE object (
     reported boolean DEFAULT false,
     reported_on timestamp without time zone,
     locked boolean DEFAULT false,
-    locked_on timestamp without time zone
+    locked_on timestamp without time zone,
+    up bigint DEFAULT 0 NOT NULL,
+    down bigint DEFAULT 0 NOT NULL,
+    favorites bigint DEFAULT 0 NOT NULL,
+    comments bigint DEFAULT 0 NOT NULL
 );
 
 
@@ -591,10 +850,19 @@ CREATE TABLE public_message (
 
 
 --
--- Name: seq_request_id; Type: SEQUENCE; Schema: public; Owner: -
+-- Name: request_count; Type: TABLE; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE TABLE request_count (
+    count bigint
+);
+
+
+--
+-- Name: seq_stream_event_id; Type: SEQUENCE; Schema: public; Owner: -
 --
 
-CREATE SEQUENCE seq_request_id
+CREATE SEQUENCE seq_stream_event_id
     START WITH 1
     INCREMENT BY 1
     NO MINVALUE
@@ -603,23 +871,27 @@ CREATE SEQUENCE seq_request_id
 
 
 --
--- Name: request; Type: TABLE; Schema: public; Owner: -; Tablespace: 
+-- Name: stream_event; Type: TABLE; Schema: public; Owner: -; Tablespace: 
 --
 
-CREATE TABLE request (
-    id bigint DEFAULT nextval('seq_request_id'::regclass),
-    user_id bigint,
-    address character varying(64) NOT NULL,
-    created_on timestamp without time zone DEFAULT timezone('utc'::text, now())
+CREATE TABLE stream_event (
+    id bigint DEFAULT nextval('seq_stream_event_id'::regclass) NOT NULL,
+    created_on timestamp without time zone DEFAULT timezone('utc'::text, now()) NOT NULL,
+    type message_type NOT NULL,
+    source_id bigint NOT NULL,
+    receiver_id bigint,
+    target character varying(64),
+    public boolean DEFAULT false NOT NULL
 );
 
 
 --
--- Name: request_count; Type: TABLE; Schema: public; Owner: -; Tablespace: 
+-- Name: tag_stats; Type: TABLE; Schema: public; Owner: -; Tablespace: 
 --
 
-CREATE TABLE request_count (
-    count bigint
+CREATE TABLE tag_stats (
+    tag character varying(32) NOT NULL,
+    count bigint DEFAULT 0 NOT NULL
 );
 
 
@@ -719,21 +991,12 @@ CREATE VIEW v_objects AS
     object.created_on,
     object.locked,
     object.reported,
-    ( SELECT count(*) AS count
-           FROM object_score
-          WHERE (object_score.up AND (object_score.object_guid = object.guid))) AS up,
-    ( SELECT count(*) AS count
-           FROM object_score
-          WHERE ((NOT object_score.up) AND (object_score.object_guid = object.guid))) AS down,
-    ( SELECT count(*) AS count
-           FROM user_favorite
-          WHERE (user_favorite.object_guid = object.guid)) AS favorites,
-    ( SELECT count(*) AS count
-           FROM object_comment
-          WHERE (object_comment.object_guid = object.guid)) AS comments
+    object.up,
+    object.down,
+    object.favorites,
+    object.comments
    FROM object
-  WHERE (NOT object.deleted)
-  GROUP BY object.guid, object.source, object.created_on, object.locked, object.reported;
+  WHERE (NOT object.deleted);
 
 
 --
@@ -753,37 +1016,7 @@ CREATE VIEW v_password_requests AS
 -- Name: v_popular_objects; Type: VIEW; Schema: public; Owner: -
 --
 
-CREATE VIEW v_popular_objects AS 
- SELECT object.guid,
-    object.source,
-    object.created_on,
-    object.locked,
-    object.reported,
-    object.up,
-    object.down,
-    object.favorites,
-    object.comments,
-    object.score
-   FROM ( SELECT v_objects.guid,
-            v_objects.source,
-            v_objects.created_on,
-            v_objects.locked,
-            v_objects.reported,
-            v_objects.up,
-            v_objects.down,
-            v_objects.favorites,
-            v_objects.comments,
-            v_objects.up - v_objects.down + v_objects.favorites AS score
-           FROM v_objects
-          ORDER BY v_objects.up - v_objects.down + v_objects.favorites DESC, v_objects.created_on DESC) object
-  WHERE object.score > 0;
-
-
---
--- Name: v_random_objects; Type: VIEW; Schema: public; Owner: -
---
-
-CREATE VIEW v_random_objects AS
+CREATE VIEW v_popular_objects AS
  SELECT v_objects.guid,
     v_objects.source,
     v_objects.created_on,
@@ -792,9 +1025,11 @@ CREATE VIEW v_random_objects AS
     v_objects.up,
     v_objects.down,
     v_objects.favorites,
-    v_objects.comments
+    v_objects.comments,
+    ((v_objects.up - v_objects.down) + v_objects.favorites) AS score
    FROM v_objects
-  ORDER BY random();
+  WHERE (((v_objects.up - v_objects.down) + v_objects.favorites) > 0)
+  ORDER BY ((v_objects.up - v_objects.down) + v_objects.favorites) DESC, v_objects.created_on DESC;
 
 
 --
@@ -820,19 +1055,6 @@ CREATE VIEW v_recommendations AS
      JOIN "user" receiver_table ON ((user_recommendation.receiver_id = receiver_table.id)));
 
 
---
--- Name: v_tags; Type: VIEW; Schema: public; Owner: -
---
-
-CREATE VIEW v_tags AS
- SELECT object_tag.tag,
-    count(v_objects.guid) AS count
-   FROM (object_tag
-     JOIN v_objects ON ((object_tag.object_guid = v_objects.guid)))
-  GROUP BY object_tag.tag
-  ORDER BY count(v_objects.guid) DESC;
-
-
 --
 -- Name: v_user_requests; Type: VIEW; Schema: public; Owner: -
 --
@@ -857,6 +1079,14 @@ ALTER TABLE ONLY password_request
     ADD CONSTRAINT password_request_unique_request_id UNIQUE (request_id);
 
 
+--
+-- Name: pk_activity; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
+--
+
+ALTER TABLE ONLY activity
+    ADD CONSTRAINT pk_activity PRIMARY KEY (id);
+
+
 --
 -- Name: pk_message; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
 --
@@ -921,6 +1151,22 @@ ALTER TABLE ONLY user_request
     ADD CONSTRAINT pk_request PRIMARY KEY (request_id, request_code);
 
 
+--
+-- Name: pk_stream_event; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
+--
+
+ALTER TABLE ONLY stream_event
+    ADD CONSTRAINT pk_stream_event PRIMARY KEY (id);
+
+
+--
+-- Name: pk_tag_stats; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
+--
+
+ALTER TABLE ONLY tag_stats
+    ADD CONSTRAINT pk_tag_stats PRIMARY KEY (tag);
+
+
 --
 -- Name: pk_user_favorite; Type: CONSTRAINT; Schema: public; Owner: -; Tablespace: 
 --
@@ -975,13 +1221,6 @@ CREATE INDEX fk_object_guid ON object_comment USING btree (object_guid);
 CREATE INDEX fk_user_id ON object_comment USING btree (user_id);
 
 
---
--- Name: fki_favorite_user_id; Type: INDEX; Schema: public; Owner: -; Tablespace: 
---
-
-CREATE INDEX fki_favorite_user_id ON user_favorite USING btree (user_id);
-
-
 --
 -- Name: fki_mail_receiver_id; Type: INDEX; Schema: public; Owner: -; Tablespace: 
 --
@@ -1024,6 +1263,118 @@ CREATE INDEX fki_receiver_id ON message USING btree (receiver_id);
 CREATE INDEX fki_user_friendship_friendship_id ON user_friendship USING btree (friend_id);
 
 
+--
+-- Name: idx_activity_user_created_on; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_activity_user_created_on ON activity USING btree (user_id, created_on DESC, id DESC);
+
+
+--
+-- Name: idx_mail_due; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_mail_due ON mail USING btree (next_attempt_on, id) WHERE ((sent = false) AND (failed = false));
+
+
+--
+-- Name: idx_object_comment_created_on; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_object_comment_created_on ON object_comment USING btree (object_guid, created_on DESC, id DESC);
+
+
+--
+-- Name: idx_object_created_on; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_object_created_on ON object USING btree (created_on DESC, guid DESC) WHERE (NOT deleted);
+
+
+--
+-- Name: idx_object_id; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE UNIQUE INDEX idx_object_id ON object USING btree (id) WHERE (NOT deleted);
+
+
+--
+-- Name: idx_object_popular; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_object_popular ON object USING btree ((((up - down) + favorites)) DESC, created_on DESC, guid DESC) WHERE (NOT deleted);
+
+
+--
+-- Name: idx_object_tag_tag; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_object_tag_tag ON object_tag USING btree (lower((tag)::text), object_guid);
+
+
+--
+-- Name: idx_tag_stats_count; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_tag_stats_count ON tag_stats USING btree (count DESC, tag);
+
+
+--
+-- Name: idx_user_favorite_user_id; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_user_favorite_user_id ON user_favorite USING btree (user_id, object_guid);
+
+
+--
+-- Name: idx_user_iemail; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_user_iemail ON "user" USING btree (iemail);
+
+
+--
+-- Name: idx_user_iusername; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_user_iusername ON "user" USING btree (iusername);
+
+
+--
+-- Name: idx_user_recommendation_created_on; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_user_recommendation_created_on ON user_recommendation USING btree (receiver_id, created_on DESC);
+
+
+--
+-- Name: idx_user_search_email; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_user_search_email ON "user" USING gin (iemail gin_trgm_ops) WHERE (NOT deleted);
+
+
+--
+-- Name: idx_user_search_firstname; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_user_search_firstname ON "user" USING gin (firstname gin_trgm_ops) WHERE (NOT deleted);
+
+
+--
+-- Name: idx_user_search_lastname; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_user_search_lastname ON "user" USING gin (lastname gin_trgm_ops) WHERE (NOT deleted);
+
+
+--
+-- Name: idx_user_search_username; Type: INDEX; Schema: public; Owner: -; Tablespace: 
+--
+
+CREATE INDEX idx_user_search_username ON "user" USING gin (iusername gin_trgm_ops) WHERE (NOT deleted);
+
+
 --
 -- Name: trg_check_user_request_username_and_email; Type: TRIGGER; Schema: public; Owner: -
 --
@@ -1031,6 +1382,13 @@ CREATE INDEX fki_user_friendship_friendship_id ON user_friendship USING btree (f
 CREATE TRIGGER trg_check_user_request_username_and_email BEFORE INSERT OR UPDATE ON user_request FOR EACH ROW EXECUTE PROCEDURE trg_fn_check_if_username_and_email_are_unique();
 
 
+--
+-- Name: trg_mail_notify; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER trg_mail_notify AFTER INSERT ON mail FOR EACH STATEMENT EXECUTE PROCEDURE trg_fn_notify_mail();
+
+
 --
 -- Name: trg_object_comment_create_message; Type: TRIGGER; Schema: public; Owner: -
 --
@@ -1045,6 +1403,20 @@ CREATE TRIGGER trg_object_comment_create_message AFTER INSERT ON object_comment
 CREATE TRIGGER trg_object_score_create_message AFTER INSERT ON object_score FOR EACH ROW EXECUTE PROCEDURE trg_fn_generate_vote_messages();
 
 
+--
+-- Name: trg_object_comment_update_counter; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER trg_object_comment_update_counter AFTER INSERT OR DELETE ON object_comment FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_object_comment_counter();
+
+
+--
+-- Name: trg_object_score_update_counters; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER trg_object_score_update_counters AFTER INSERT OR DELETE OR UPDATE OF up, object_guid ON object_score FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_object_score_counters();
+
+
 --
 -- Name: trg_object_update_timestamps; Type: TRIGGER; Schema: public; Owner: -
 --
@@ -1052,6 +1424,20 @@ CREATE TRIGGER trg_object_score_create_message AFTER INSERT ON object_score FOR
 CREATE TRIGGER trg_object_update_timestamps BEFORE UPDATE ON object FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_object_timestamps();
 
 
+--
+-- Name: trg_object_tag_update_tag_stats; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER trg_object_tag_update_tag_stats AFTER INSERT OR DELETE ON object_tag FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_tag_stats();
+
+
+--
+-- Name: trg_object_update_tag_stats; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER trg_object_update_tag_stats AFTER UPDATE OF deleted ON object FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_tag_stats_deleted();
+
+
 --
 -- Name: trg_update_user_request_iusername_and_iemail; Type: TRIGGER; Schema: public; Owner: -
 --
@@ -1073,6 +1459,13 @@ CREATE TRIGGER trg_user_check_email BEFORE UPDATE ON "user" FOR EACH ROW EXECUTE
 CREATE TRIGGER trg_user_create_recommendation_message BEFORE INSERT ON user_recommendation FOR EACH ROW EXECUTE PROCEDURE trg_fn_create_recommendation_message();
 
 
+--
+-- Name: trg_user_favorite_update_counter; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER trg_user_favorite_update_counter AFTER INSERT OR DELETE ON user_favorite FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_object_favorite_counter();
+
+
 --
 -- Name: trg_user_friendship_destroyed; Type: TRIGGER; Schema: public; Owner: -
 --
@@ -1101,6 +1494,14 @@ CREATE TRIGGER trg_user_update_iusername_and_iemail BEFORE INSERT OR UPDATE ON "
 CREATE TRIGGER trg_user_update_timestamps BEFORE UPDATE ON "user" FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_user_timestamps();
 
 
+--
+-- Name: fk_activity_user_id; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY activity
+    ADD CONSTRAINT fk_activity_user_id FOREIGN KEY (user_id) REFERENCES "user"(id);
+
+
 --
 -- Name: fk_message_receiver_id; Type: FK CONSTRAINT; Schema: public; Owner: -
 --
@@ -1213,14 +1614,6 @@ ALTER TABLE ONLY mail
     ADD CONSTRAINT mail_receiver_id FOREIGN KEY (receiver_id) REFERENCES "user"(id);
 
 
---
--- Name: user_id; Type: FK CONSTRAINT; Schema: public; Owner: -
---
-
-ALTER TABLE ONLY request
-    ADD CONSTRAINT user_id FOREIGN KEY (user_id) REFERENCES "user"(id);
-
-
 --
 -- Name: public; Type: ACL; Schema: -; Owner: -
 --
@@ -1,3 +1,4 @@
+changequote([[, ]])dnl
 CREATE OR REPLACE FUNCTION trg_fn_check_if_email_can_be_changed()
   RETURNS trigger AS
 $BODY$
@@ -25,3 +26,111 @@ $BODY$
 $BODY$
   LANGUAGE plpgsql VOLATILE
   COST 100;
+
+CREATE OR REPLACE FUNCTION trg_fn_create_comment_message()
+  RETURNS trigger AS
+$BODY$
+    DECLARE
+	is_protected boolean;
+	friend_id bigint;
+    
+    BEGIN
+	select protected
+		into is_protected
+		from "user"
+		where id=NEW.user_id;
+
+ifelse(STREAM_FANOUT, 'read', [[	insert into "activity" ("user_id", "type", "target") values (NEW.user_id, 'wrote-comment', NEW.id);
+
+]])dnl
+ifelse(STREAM_WORKER, True, [[	insert into "stream_event" ("type", "source_id", "target", "public") values ('wrote-comment', NEW.user_id, NEW.id, not is_protected);
+]], [[ifelse(STREAM_FANOUT, 'write', [[	for friend_id in select * from user_get_follower_ids(NEW.user_id) loop
+		insert into "message" ("receiver_id", "type", "target", "source") values (friend_id, 'wrote-comment', NEW.id, NEW.user_id::varchar);
+	end loop;
+
+]])dnl
+	if not is_protected then
+		insert into "public_message" ("type", "target", "source") values ('wrote-comment', NEW.id, NEW.user_id::varchar);
+	end if;
+]])dnl
+        
+        RETURN NEW;
+    END;
+$BODY$
+  LANGUAGE plpgsql VOLATILE
+  COST 100;
+
+CREATE OR REPLACE FUNCTION trg_fn_generate_vote_messages()
+  RETURNS trigger AS
+$BODY$
+    DECLARE
+	is_protected boolean;
+	friend_id bigint;
+    
+    BEGIN
+	select protected
+		into is_protected
+		from "user"
+		where id=NEW.user_id;
+
+ifelse(STREAM_FANOUT, 'read', [[	insert into "activity" ("user_id", "type", "target") values (NEW.user_id, 'voted-object', NEW.object_guid);
+
+]])dnl
+ifelse(STREAM_WORKER, True, [[	insert into "stream_event" ("type", "source_id", "target", "public") values ('voted-object', NEW.user_id, NEW.object_guid, not is_protected);
+]], [[ifelse(STREAM_FANOUT, 'write', [[	for friend_id in select * from user_get_follower_ids(NEW.user_id) loop
+		insert into "message" ("receiver_id", "type", "target", "source") values (friend_id, 'voted-object', NEW.object_guid, NEW.user_id::varchar);
+	end loop;
+
+]])dnl
+	if not is_protected then
+		insert into "public_message" ("type", "target", "source") values ('voted-object', NEW.object_guid, NEW.user_id::varchar);
+	end if;
+]])dnl
+        
+        RETURN NEW;
+    END;
+$BODY$
+  LANGUAGE plpgsql VOLATILE
+  COST 100;
+
+CREATE OR REPLACE FUNCTION trg_fn_create_friendship_message()
+  RETURNS trigger AS
+$BODY$
+    BEGIN
+ifelse(STREAM_WORKER, True, [[	insert into "stream_event" ("type", "source_id", "receiver_id") values ('following', NEW.user_id, NEW.friend_id);
+]], [[	insert into "message" ("receiver_id", "type", "source") values (NEW.friend_id, 'following', NEW.user_id::varchar);
+]])dnl
+        
+        RETURN NEW;
+    END;
+$BODY$
+  LANGUAGE plpgsql VOLATILE
+  COST 100;
+
+CREATE OR REPLACE FUNCTION trg_fn_create_recommendation_message()
+  RETURNS trigger AS
+$BODY$
+    BEGIN
+ifelse(STREAM_WORKER, True, [[	insert into "stream_event" ("type", "source_id", "receiver_id", "target") values ('recommendation', NEW.user_id, NEW.receiver_id, NEW.object_guid);
+]], [[	insert into "message" ("receiver_id", "type", "source", "target") values (NEW.receiver_id, 'recommendation', NEW.user_id::varchar, NEW.object_guid);
+]])dnl
+        
+        RETURN NEW;
+    END;
+$BODY$
+  LANGUAGE plpgsql VOLATILE
+  COST 100;
+
+CREATE OR REPLACE FUNCTION trg_fn_destroy_friendship_message()
+  RETURNS trigger AS
+$BODY$
+    BEGIN
+ifelse(STREAM_WORKER, True, [[	insert into "stream_event" ("type", "source_id", "receiver_id") values ('unfollowing', OLD.user_id, OLD.friend_id);
+]], [[	insert into "message" ("receiver_id", "type", "source") values (OLD.friend_id, 'unfollowing', OLD.user_id::varchar);
+]])dnl
+        
+        RETURN NEW;
+    END;
+$BODY$
+  LANGUAGE plpgsql VOLATILE
+  COST 100;
@@ -0,0 +1,19 @@
+-- Adds the indexes used for case-insensitive lookups of usernames, email addresses
+-- and tags and for reading the favorites of a user to an existing database.
+--
+-- The indexes are built concurrently, which isn't possible inside a transaction
+-- block. Run the script with psql in autocommit mode (default):
+--
+-- # psql -f sql/upgrade/001-lookup-indexes.sql meat-a
+
+create index concurrently idx_user_iusername on "user" using btree (iusername);
+create index concurrently idx_user_iemail on "user" using btree (iemail);
+create index concurrently idx_object_tag_tag on object_tag using btree (lower((tag)::text), object_guid);
+create index concurrently idx_user_favorite_user_id on user_favorite using btree (user_id, object_guid);
+
+-- superseded by idx_user_favorite_user_id:
+drop index concurrently if exists fki_favorite_user_id;
+
+analyze "user";
+analyze object_tag;
+analyze user_favorite;
@@ -0,0 +1,5 @@
+-- Adds the index used by mailer workers to claim unsent mails to an existing database.
+--
+-- # psql -f sql/upgrade/002-mail-queue.sql meat-a
+
+create index concurrently idx_mail_unsent on mail using btree (created_on, id) where (sent = false);
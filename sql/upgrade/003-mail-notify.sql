@@ -0,0 +1,15 @@
+-- Adds the trigger waking up the mailer when mails are queued to an existing database.
+--
+-- # psql -f sql/upgrade/003-mail-notify.sql meat-a
+
+create function trg_fn_notify_mail() returns trigger
+    language plpgsql
+    as $$
+    begin
+	perform pg_notify('mail_queue', '');
+
+	return null;
+    end;
+$$;
+
+create trigger trg_mail_notify after insert on mail for each statement execute procedure trg_fn_notify_mail();
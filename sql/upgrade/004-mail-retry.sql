@@ -0,0 +1,14 @@
+-- Adds the columns used to schedule the delivery attempts of mails and replaces the index
+-- used by mailer workers to claim due mails.
+--
+-- The index is built concurrently, which isn't possible inside a transaction block. Run
+-- the script with psql in autocommit mode (default):
+--
+-- # psql -f sql/upgrade/004-mail-retry.sql meat-a
+
+alter table mail add column attempts integer default 0 not null,
+                 add column next_attempt_on timestamp without time zone default timezone('utc'::text, now()) not null,
+                 add column failed boolean default false not null;
+
+create index concurrently idx_mail_due on mail using btree (next_attempt_on, id) where ((sent = false) and (failed = false));
+drop index concurrently idx_mail_unsent;
@@ -0,0 +1,25 @@
+-- Adds the table storing activities of the fan-out-on-read stream mode to an existing
+-- database. Activities share the id sequence of messages, so ids of activities and
+-- messages merged into a stream are unique.
+--
+-- # psql -f sql/upgrade/005-activity.sql meat-a
+--
+-- Rebuild and install sql/triggers.sql afterwards, activities are only recorded when
+-- STREAM_FANOUT is "read".
+
+begin;
+
+create table activity (
+    id bigint default nextval('seq_message_id'::regclass) not null,
+    user_id bigint not null,
+    created_on timestamp without time zone default timezone('utc'::text, now()) not null,
+    target character varying(64),
+    type message_type not null
+);
+
+alter table only activity add constraint pk_activity primary key (id);
+alter table only activity add constraint fk_activity_user_id foreign key (user_id) references "user"(id);
+
+create index idx_activity_user_created_on on activity using btree (user_id, created_on desc, id desc);
+
+commit;
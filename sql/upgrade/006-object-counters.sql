@@ -0,0 +1,123 @@
+-- Adds the score, favorite and comment counters of objects maintained by triggers to an
+-- existing database. The counters are initialized by object_reconcile_counters(), which
+-- is also run by sql/maintenance.sql.
+--
+-- The index is built concurrently, which isn't possible inside a transaction block. Run
+-- the script with psql in autocommit mode (default):
+--
+-- # psql -f sql/upgrade/006-object-counters.sql meat-a
+
+begin;
+
+alter table object add column up bigint default 0 not null,
+                   add column down bigint default 0 not null,
+                   add column favorites bigint default 0 not null,
+                   add column comments bigint default 0 not null;
+
+CREATE FUNCTION object_reconcile_counters() RETURNS bigint
+    LANGUAGE plpgsql
+    AS $$
+declare
+	repaired bigint default 0;
+
+begin
+	update object set up=counted.up, down=counted.down, favorites=counted.favorites, comments=counted.comments
+		from (select object.guid,
+		             (select count(*) from object_score where object_score.object_guid=object.guid and object_score.up) as up,
+		             (select count(*) from object_score where object_score.object_guid=object.guid and not object_score.up) as down,
+		             (select count(*) from user_favorite where user_favorite.object_guid=object.guid) as favorites,
+		             (select count(*) from object_comment where object_comment.object_guid=object.guid) as comments
+		        from object) counted
+		where object.guid=counted.guid
+		      and (object.up, object.down, object.favorites, object.comments) is distinct from (counted.up, counted.down, counted.favorites, counted.comments);
+
+	get diagnostics repaired = row_count;
+
+	return repaired;
+end; $$;
+
+CREATE FUNCTION trg_fn_update_object_comment_counter() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if TG_OP = 'INSERT' then
+		update object set comments=comments+1 where guid=NEW.object_guid;
+	elsif TG_OP = 'DELETE' then
+		update object set comments=comments-1 where guid=OLD.object_guid;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+CREATE FUNCTION trg_fn_update_object_favorite_counter() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if TG_OP = 'INSERT' then
+		update object set favorites=favorites+1 where guid=NEW.object_guid;
+	elsif TG_OP = 'DELETE' then
+		update object set favorites=favorites-1 where guid=OLD.object_guid;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+CREATE FUNCTION trg_fn_update_object_score_counters() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if TG_OP = 'DELETE' or TG_OP = 'UPDATE' then
+		update object set up=up-(case when OLD.up then 1 else 0 end), down=down-(case when OLD.up then 0 else 1 end) where guid=OLD.object_guid;
+	end if;
+
+	if TG_OP = 'INSERT' or TG_OP = 'UPDATE' then
+		update object set up=up+(case when NEW.up then 1 else 0 end), down=down+(case when NEW.up then 0 else 1 end) where guid=NEW.object_guid;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+CREATE TRIGGER trg_object_comment_update_counter AFTER INSERT OR DELETE ON object_comment FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_object_comment_counter();
+
+CREATE TRIGGER trg_object_score_update_counters AFTER INSERT OR DELETE OR UPDATE OF up, object_guid ON object_score FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_object_score_counters();
+
+CREATE TRIGGER trg_user_favorite_update_counter AFTER INSERT OR DELETE ON user_favorite FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_object_favorite_counter();
+
+select object_reconcile_counters();
+
+CREATE OR REPLACE VIEW v_objects AS
+ SELECT object.guid,
+    object.source,
+    object.created_on,
+    object.locked,
+    object.reported,
+    object.up,
+    object.down,
+    object.favorites,
+    object.comments
+   FROM object
+  WHERE (NOT object.deleted);
+
+CREATE OR REPLACE VIEW v_popular_objects AS
+ SELECT v_objects.guid,
+    v_objects.source,
+    v_objects.created_on,
+    v_objects.locked,
+    v_objects.reported,
+    v_objects.up,
+    v_objects.down,
+    v_objects.favorites,
+    v_objects.comments,
+    ((v_objects.up - v_objects.down) + v_objects.favorites) AS score
+   FROM v_objects
+  WHERE (((v_objects.up - v_objects.down) + v_objects.favorites) > 0)
+  ORDER BY ((v_objects.up - v_objects.down) + v_objects.favorites) DESC, v_objects.created_on DESC;
+
+commit;
+
+CREATE INDEX CONCURRENTLY idx_object_popular ON object USING btree ((((up - down) + favorites)) DESC, created_on DESC, guid DESC) WHERE (NOT deleted);
+
+analyze object;
@@ -0,0 +1,35 @@
+-- Adds the indexes used by keyset pagination of objects, comments and recommendations
+-- to an existing database and orders comments with the same key.
+--
+-- The indexes are built concurrently, which isn't possible inside a transaction block.
+-- Run the script with psql in autocommit mode (default):
+--
+-- # psql -f sql/upgrade/007-keyset-pagination.sql meat-a
+
+CREATE OR REPLACE FUNCTION object_get_comments(obj_guid uuid, page bigint, page_size bigint) RETURNS TABLE(id bigint, text character varying, created_on timestamp without time zone, deleted boolean, username character varying)
+    LANGUAGE plpgsql
+    AS $$
+
+begin
+return query select
+    object_comment.id,
+    object_comment.comment_text as text,
+    object_comment.created_on,
+    object_comment.deleted,
+    "user".username
+   from object_comment
+     join "user" on object_comment.user_id="user".id
+     where object_guid=obj_guid
+  ORDER BY object_comment.created_on desc, object_comment.id desc
+  offset page*page_size limit page_size;
+end; $$;
+
+CREATE INDEX CONCURRENTLY idx_object_created_on ON object USING btree (created_on DESC, guid DESC) WHERE (NOT deleted);
+
+CREATE INDEX CONCURRENTLY idx_object_comment_created_on ON object_comment USING btree (object_guid, created_on DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY idx_user_recommendation_created_on ON user_recommendation USING btree (receiver_id, created_on DESC);
+
+analyze object;
+analyze object_comment;
+analyze user_recommendation;
@@ -0,0 +1,27 @@
+-- Adds the numeric ids used to sample random objects to an existing database. Existing
+-- objects are numbered when the column is added.
+--
+-- The index is built concurrently, which isn't possible inside a transaction block. Run
+-- the script with psql in autocommit mode (default):
+--
+-- # psql -f sql/upgrade/008-object-ids.sql meat-a
+
+begin;
+
+CREATE SEQUENCE seq_object_id
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+alter table object add column id bigint default nextval('seq_object_id'::regclass) not null;
+
+-- superseded by sampling object ids:
+drop view v_random_objects;
+
+commit;
+
+CREATE UNIQUE INDEX CONCURRENTLY idx_object_id ON object USING btree (id) WHERE (NOT deleted);
+
+analyze object;
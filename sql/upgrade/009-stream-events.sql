@@ -0,0 +1,30 @@
+-- Adds the outbox read by the fan-out worker (fanout.py) to an existing database.
+--
+-- # psql -f sql/upgrade/009-stream-events.sql meat-a
+--
+-- Rebuild and install sql/triggers.sql afterwards, events are only appended to the
+-- outbox when STREAM_WORKER is True.
+
+begin;
+
+CREATE SEQUENCE seq_stream_event_id
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+CREATE TABLE stream_event (
+    id bigint DEFAULT nextval('seq_stream_event_id'::regclass) NOT NULL,
+    created_on timestamp without time zone DEFAULT timezone('utc'::text, now()) NOT NULL,
+    type message_type NOT NULL,
+    source_id bigint NOT NULL,
+    receiver_id bigint,
+    target character varying(64),
+    public boolean DEFAULT false NOT NULL
+);
+
+ALTER TABLE ONLY stream_event
+    ADD CONSTRAINT pk_stream_event PRIMARY KEY (id);
+
+commit;
@@ -0,0 +1,20 @@
+-- Adds the trigram indexes used to search users to an existing database. The pg_trgm
+-- extension is part of the PostgreSQL contrib package, creating it may require superuser
+-- privileges.
+--
+-- The indexes are built concurrently, which isn't possible inside a transaction block.
+-- Run the script with psql in autocommit mode (default):
+--
+-- # psql -f sql/upgrade/010-user-search.sql meat-a
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
+CREATE INDEX CONCURRENTLY idx_user_search_email ON "user" USING gin (iemail gin_trgm_ops) WHERE (NOT deleted);
+
+CREATE INDEX CONCURRENTLY idx_user_search_firstname ON "user" USING gin (firstname gin_trgm_ops) WHERE (NOT deleted);
+
+CREATE INDEX CONCURRENTLY idx_user_search_lastname ON "user" USING gin (lastname gin_trgm_ops) WHERE (NOT deleted);
+
+CREATE INDEX CONCURRENTLY idx_user_search_username ON "user" USING gin (iusername gin_trgm_ops) WHERE (NOT deleted);
+
+analyze "user";
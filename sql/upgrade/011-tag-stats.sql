@@ -0,0 +1,118 @@
+-- Adds the tag statistics maintained by triggers to an existing database. The statistics
+-- are initialized by tag_stats_reconcile(), which is also run by sql/maintenance.sql.
+--
+-- # psql -f sql/upgrade/011-tag-stats.sql meat-a
+
+begin;
+
+CREATE TABLE tag_stats (
+    tag character varying(32) NOT NULL,
+    count bigint DEFAULT 0 NOT NULL
+);
+
+ALTER TABLE ONLY tag_stats
+    ADD CONSTRAINT pk_tag_stats PRIMARY KEY (tag);
+
+CREATE INDEX idx_tag_stats_count ON tag_stats USING btree (count DESC, tag);
+
+CREATE FUNCTION tag_stats_add(tag_name character varying, delta bigint) RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+begin
+	loop
+		update tag_stats set count=count+delta where tag=tag_name;
+
+		if found then
+			delete from tag_stats where tag=tag_name and count<=0;
+			return;
+		end if;
+
+		if delta<=0 then
+			return;
+		end if;
+
+		begin
+			insert into tag_stats (tag, count) values (tag_name, delta);
+			return;
+
+		exception when unique_violation then
+			-- tag has been inserted by a concurrent transaction => update it
+		end;
+	end loop;
+end; $$;
+
+CREATE FUNCTION tag_stats_reconcile() RETURNS bigint
+    LANGUAGE plpgsql
+    AS $$
+declare
+	repaired bigint default 0;
+	changed bigint;
+
+begin
+	lock table tag_stats in exclusive mode;
+
+	create temporary table counted_tags on commit drop as
+		select object_tag.tag, count(*) as count from object_tag
+			inner join object on object.guid=object_tag.object_guid
+			where not object.deleted
+			group by object_tag.tag;
+
+	delete from tag_stats where not exists (select 1 from counted_tags where counted_tags.tag=tag_stats.tag);
+	get diagnostics changed = row_count;
+	repaired := repaired + changed;
+
+	update tag_stats set count=counted_tags.count from counted_tags
+		where tag_stats.tag=counted_tags.tag and tag_stats.count<>counted_tags.count;
+	get diagnostics changed = row_count;
+	repaired := repaired + changed;
+
+	insert into tag_stats (tag, count)
+		select tag, count from counted_tags
+		where not exists (select 1 from tag_stats where tag_stats.tag=counted_tags.tag);
+	get diagnostics changed = row_count;
+	repaired := repaired + changed;
+
+	drop table counted_tags;
+
+	return repaired;
+end; $$;
+
+CREATE FUNCTION trg_fn_update_tag_stats() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if TG_OP = 'INSERT' then
+		perform tag_stats_add(NEW.tag, 1) from object where guid=NEW.object_guid and not deleted;
+	elsif TG_OP = 'DELETE' then
+		perform tag_stats_add(OLD.tag, -1) from object where guid=OLD.object_guid and not deleted;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+CREATE FUNCTION trg_fn_update_tag_stats_deleted() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+	if OLD.deleted <> NEW.deleted then
+		perform tag_stats_add(tag, (case when NEW.deleted then -count(*) else count(*) end))
+			from object_tag where object_guid=NEW.guid
+			group by tag
+			order by tag;
+	end if;
+
+        RETURN NULL;
+    END;
+$$;
+
+CREATE TRIGGER trg_object_tag_update_tag_stats AFTER INSERT OR DELETE ON object_tag FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_tag_stats();
+
+CREATE TRIGGER trg_object_update_tag_stats AFTER UPDATE OF deleted ON object FOR EACH ROW EXECUTE PROCEDURE trg_fn_update_tag_stats_deleted();
+
+select tag_stats_reconcile();
+
+-- superseded by tag_stats:
+drop view v_tags;
+
+commit;
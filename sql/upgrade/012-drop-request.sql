@@ -0,0 +1,11 @@
+-- Removes the table which stored HTTP requests for rate limiting from an existing
+-- database. Requests are counted by the rate limiter (see RATE_LIMIT_BACKEND).
+--
+-- # psql -f sql/upgrade/012-drop-request.sql meat-a
+
+begin;
+
+drop table request;
+drop sequence seq_request_id;
+
+commit;
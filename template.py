@@ -32,30 +32,70 @@
 ## @package template
 #  Classes used to build strings.
 
-import abc, os, config, Cheetah.Template
+import abc, os, threading, config, Cheetah.Template
 
-## Dictionary storing content of template files.
+## Dictionary storing compiled templates. Maps template paths to tuples holding the compiled
+#  Cheetah class and the modification time of the file (None if config.TEMPLATE_AUTO_RELOAD
+#  is disabled).
 tpl_cache = {}
+## Lock synchronizing template compilation.
+tpl_lock = threading.Lock()
 
-## Loads the content from a template file and stores it in the template cache. Returns the
-#  cached content whenever possible.
+## Loads the content from a template file.
 #  @param language language of the template
 #  @param filename filename of the template to load
 #  @return content of the template file
 def load_template_def(language, filename):
-	global tpl_cache
-
 	filename = os.path.join(config.TEMPLATE_DIR, language, filename)
 
-	try:
-		tpl = tpl_cache[filename]
-
-	except KeyError:
-		with open(filename) as f:
-			tpl = f.read()
+	with open(filename) as f:
+		tpl = f.read()
 
 	return tpl
 
+## Compiles a template file to a Cheetah class and stores it in the template cache. Returns the
+#  cached class whenever possible. If config.TEMPLATE_AUTO_RELOAD is enabled modified template
+#  files are compiled again.
+#  @param language language of the template
+#  @param filename filename of the template to load
+#  @return a Cheetah.Template.Template subclass
+def load_template_class(language, filename):
+	global tpl_cache, tpl_lock
+
+	path = os.path.join(config.TEMPLATE_DIR, language, filename)
+	mtime = None
+
+	if config.TEMPLATE_AUTO_RELOAD:
+		mtime = os.path.getmtime(path)
+
+	entry = tpl_cache.get(path)
+
+	if entry is None or entry[1] != mtime:
+		with tpl_lock:
+			entry = tpl_cache.get(path)
+
+			if entry is None or entry[1] != mtime:
+				entry = (Cheetah.Template.Template.compile(source=load_template_def(language, filename)), mtime)
+				tpl_cache[path] = entry
+
+	return entry[0]
+
+## Compiles all template files found in the template directory.
+#  @return number of compiled templates
+def precompile_templates():
+	count = 0
+
+	for language in sorted(os.listdir(config.TEMPLATE_DIR)):
+		path = os.path.join(config.TEMPLATE_DIR, language)
+
+		if os.path.isdir(path):
+			for filename in sorted(os.listdir(path)):
+				if filename.endswith(".tpl"):
+					load_template_class(language, filename)
+					count += 1
+
+	return count
+
 ## Base class for templates. A template can be exported to a string which contains binded data.
 class Template:
 	## The constructor.
@@ -82,19 +122,15 @@ class CheetahTemplate(Template):
 	def __init__(self, language, tpl):
 		Template.__init__(self, language)
 		self.__namespace = {}
-		self.__def = None
 		self.__tpl = tpl
 
 	def bind(self, **kwargs):
 		self.__namespace = kwargs
 
 	def render(self):
-		if self.__def is None:
-			self.__def = load_template_def(self.language, self.__tpl)
+		cls = load_template_class(self.language, self.__tpl)
 
-		t = Cheetah.Template.Template(self.__def, searchList = [ self.__namespace ])
-
-		return str(t)
+		return str(cls(searchList = [ self.__namespace ]))
 
 ## A Template implementation using the Cheetah framework. It renders body and subject of a mail.
 class CheetahMailTemplate(Template):
@@ -105,7 +141,6 @@ class CheetahMailTemplate(Template):
 	def __init__(self, language, subject_tpl, body_tpl):
 		Template.__init__(self, language)
 		self.__namespace = {}
-		self.__defs = None
 		self.__subject_tpl = subject_tpl
 		self.__body_tpl = body_tpl
 
@@ -115,13 +150,8 @@ class CheetahMailTemplate(Template):
 	## Converts subject and body template to a string.
 	#  @return subject and body
 	def render(self):
-		if self.__defs is None:
-			self.__defs = []
-			self.__defs.append(load_template_def(self.language, self.__subject_tpl))
-			self.__defs.append(load_template_def(self.language, self.__body_tpl))
-
-		subject = Cheetah.Template.Template(self.__defs[0], searchList = [ self.__namespace ])
-		body = Cheetah.Template.Template(self.__defs[1], searchList = [ self.__namespace ])
+		subject = load_template_class(self.language, self.__subject_tpl)(searchList = [ self.__namespace ])
+		body = load_template_class(self.language, self.__body_tpl)(searchList = [ self.__namespace ])
 
 		return str(subject).strip(), str(body).strip()
 
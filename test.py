@@ -30,7 +30,65 @@
 ## @TODO: test controllers
 ## @TODO: test WSGI
 
-import unittest, factory, app, mailer, util, exception, config, string, random, re, itertools, datetime, time, os
+import unittest, select, subprocess, factory, pgdb, context, app, controller, view, template, mailer, fanout, ratelimit, cache, router, wsgi, util, exception, config, string, random, re, itertools, datetime, time, os, threading, inspect, json, urllib, tempfile, shutil, uuid, base64, gc, logging, logger, Queue, Cheetah.Template
+from bson import json_util
+
+## Scope wrapper counting executed queries.
+class QueryCounter:
+	def __init__(self, scope):
+		self.__cursor = scope.get_handle()
+		self.count = 0
+
+	def get_handle(self):
+		return self
+
+	def execute(self, query, params=None):
+		self.count += 1
+
+		return self.__cursor.execute(query, params)
+
+	def __getattr__(self, name):
+		return getattr(self.__cursor, name)
+
+## Proxy counting the method calls of a data access object.
+class CallCounter:
+	def __init__(self, obj):
+		self.__obj = obj
+		self.count = 0
+
+	def __getattr__(self, name):
+		attr = getattr(self.__obj, name)
+
+		if not callable(attr):
+			return attr
+
+		def call(*args, **kwargs):
+			self.count += 1
+
+			return attr(*args, **kwargs)
+
+		return call
+
+class RecordingCursor:
+	def __init__(self, cursor, queries):
+		self.__cursor = cursor
+		self.__queries = queries
+
+	def execute(self, query, params=None):
+		self.__queries.append((query, params))
+
+		return self.__cursor.execute(query, params)
+
+	def __getattr__(self, name):
+		return getattr(self.__cursor, name)
+
+class RecordingScope:
+	def __init__(self, scope):
+		self.__scope = scope
+		self.queries = []
+
+	def get_handle(self):
+		return RecordingCursor(self.__scope.get_handle(), self.queries)
 
 class TestBase:
 	def __init__(self): pass
@@ -162,6 +220,30 @@ class TestBase:
 
 				assert(eq(a[1], b[0]) == True)
 
+	def assertKeysetPaging(self, count, eq, f, *args):
+		all = apply(f, list(args) + [0, count])
+		assert(len(all) == count)
+
+		for page_size in set([1, 3, max(count, 1)]):
+			result = []
+			cursor = None
+
+			while True:
+				page = apply(f, list(args) + [0, page_size, cursor])
+				assert(len(page) <= page_size)
+
+				result.extend(page)
+
+				if page.cursor is None:
+					break
+
+				cursor = page.cursor
+
+			assert(len(result) == count)
+
+			for a, b in zip(all, result):
+				assert(eq(a, b) == True)
+
 	def sequencesAreEqual(self, a, b, eq=lambda a, b: a == b):
 			if len(a) != len(b):
 				return False
@@ -475,10 +557,32 @@ class TestUserDb(unittest.TestCase, TestBase):
 					if query in user["username"] or query in user["email"] or query in user["firstname"] or query in user["lastname"]:
 						expected += 1
 
-				result = db.search(scope, query)
+				result = db.search(scope, query, 1000)
 
 				self.assertEqual(expected, len(result))
 
+			# page through search results:
+			query = users[0]["firstname"].lower()[0]
+			result = db.search(scope, query, 1000)
+
+			found = []
+			page = db.search(scope, query, 7)
+
+			while len(page) > 0:
+				self.assertTrue(len(page) <= 7)
+				found.extend(page)
+
+				if page.cursor is None:
+					break
+
+				page = db.search(scope, query, 7, page.cursor)
+
+			self.assertEqual(map(lambda u: u["username"], result), map(lambda u: u["username"], found))
+
+			# wildcards & quotes are searched literally:
+			for query in ["%", "_", "'", "\\"]:
+				self.assertEqual(len(db.search(scope, query)), 0)
+
 	def test_07_friendship(self):
 		with self.__connection.enter_scope() as scope:
 			self.clear(scope)
@@ -643,6 +747,8 @@ class TestUserDb(unittest.TestCase, TestBase):
 
 				self.assertPaging(count_b, eq, db.get_recommendations, scope, b["username"])
 				self.assertPaging(count_a, eq, db.get_recommendations, scope, a["username"])
+				self.assertKeysetPaging(count_b, eq, db.get_recommendations, scope, b["username"])
+				self.assertKeysetPaging(count_a, eq, db.get_recommendations, scope, a["username"])
 
 				# delete object and test recommendations:
 				recommendations = db.get_recommendations(scope, b["username"], 0, count_b)
@@ -747,6 +853,7 @@ class TestObjectDb(unittest.TestCase, TestBase):
 			# paging:
 			eq = lambda a, b: a["guid"] == b["guid"] and a["source"] == b["source"]
 			self.assertPaging(len(objects), eq, db.get_objects, scope)
+			self.assertKeysetPaging(len(objects), eq, db.get_objects, scope)
 
 	def test_02_vote(self):
 		with self.__connection.enter_scope() as scope:
@@ -819,6 +926,7 @@ class TestObjectDb(unittest.TestCase, TestBase):
 			result = filter(lambda obj: (obj["score"]["up"] - obj["score"]["down"]  + obj["score"]["fav"]) > 0, objects)
 
 			self.assertPaging(len(result), eq, db.get_popular_objects, scope)
+			self.assertKeysetPaging(len(result), eq, db.get_popular_objects, scope)
 
 			# test sort order:
 			prev_score = size * 4
@@ -905,6 +1013,7 @@ class TestObjectDb(unittest.TestCase, TestBase):
 						sum += 1
 
 				self.assertPaging(sum, lambda a, b: a["guid"] == b["guid"], db.get_tagged_objects, scope, t)
+				self.assertKeysetPaging(sum, lambda a, b: a["guid"] == b["guid"], db.get_tagged_objects, scope, t)
 
 	def test_04_comments(self):
 		with self.__connection.enter_scope() as scope:
@@ -946,6 +1055,7 @@ class TestObjectDb(unittest.TestCase, TestBase):
 			for k, v in comments.items():
 				# paging:
 				self.assertPaging(len(v), eq, db.get_comments, scope, k)
+				self.assertKeysetPaging(len(v), eq, db.get_comments, scope, k)
 
 				# get all comments:
 				l = db.get_comments(scope, k, 0, len(v))
@@ -1043,6 +1153,159 @@ class TestObjectDb(unittest.TestCase, TestBase):
 			for v in objects.values():
 				self.assertTrue(v >= 800 and v <= 1200)
 
+			# deleted objects are excluded:
+			deleted = objects.keys()[::2]
+
+			for guid in deleted:
+				db.delete_object(scope, guid)
+
+			for _ in range(100):
+				result = db.get_random_objects(scope, 10)
+
+				self.assertEqual(len(result), 10)
+				self.assertEqual(len(set(map(lambda obj: obj["guid"], result))), 10)
+
+				for obj in result:
+					self.assertNotIn(obj["guid"], deleted)
+
+			self.assertEqual(len(db.get_random_objects(scope, 100)), 50)
+
+	def test_07_tag_queries(self):
+		with self.__connection.enter_scope() as scope:
+			self.clear(scope)
+
+			db = factory.create_object_db()
+			user_db = factory.create_user_db()
+
+			user = self.generate_user_account(scope)
+			size = 50
+
+			for _ in range(size):
+				obj = self.generate_object(scope)
+
+				for tag in self.generate_set(3, lambda: self.generate_text(3, 10)):
+					db.add_tag(scope, obj["guid"], user["id"], tag)
+
+				db.vote(scope, obj["guid"], user["id"], True)
+				user_db.favor(scope, user["id"], obj["guid"])
+
+			for name, f, args, queries in [["objects", db.get_objects, [0, size], 2],
+			                               ["popular", db.get_popular_objects, [0, size], 2],
+			                               ["random", db.get_random_objects, [size], 3],
+			                               ["favorites", user_db.get_favorites, [user["id"]], 2]]:
+				counter = QueryCounter(scope)
+				started = time.time()
+
+				objs = apply(f, [counter] + args)
+
+				elapsed = time.time() - started
+
+				print "%s: %d objects, %d queries, %.4fs" % (name, len(objs), counter.count, elapsed)
+
+				self.assertEqual(len(objs), size)
+				self.assertTrue(counter.count <= queries)
+
+				for obj in objs:
+					self.assertEqual(len(obj["tags"]), 3)
+
+	def test_08_counters(self):
+		with self.__connection.enter_scope() as scope:
+			self.clear(scope)
+
+			db = factory.create_object_db()
+			user_db = factory.create_user_db()
+
+			objects = [self.generate_object(scope) for _ in range(10)]
+			users = [self.generate_user_account(scope) for _ in range(5)]
+
+			for obj in objects:
+				for i in range(len(users)):
+					db.vote(scope, obj["guid"], users[i]["id"], i % 2 == 0)
+					user_db.favor(scope, users[i]["id"], obj["guid"])
+					db.add_comment(scope, obj["guid"], users[i]["id"], self.generate_text())
+
+			user_db.favor(scope, users[0]["id"], objects[0]["guid"], False)
+
+			# counters are maintained by triggers:
+			self.assertEqual(db.reconcile_counters(scope), 0)
+
+			obj = db.get_object(scope, objects[0]["guid"])
+
+			self.assertEqual(obj["score"]["up"], 3)
+			self.assertEqual(obj["score"]["down"], 2)
+			self.assertEqual(obj["score"]["fav"], 4)
+			self.assertEqual(obj["comments_n"], 5)
+
+			# damage counters & repair them:
+			scope.get_handle().execute("update object set up=0, comments=100")
+
+			self.assertEqual(db.reconcile_counters(scope), len(objects))
+
+			obj = db.get_object(scope, objects[0]["guid"])
+
+			self.assertEqual(obj["score"]["up"], 3)
+			self.assertEqual(obj["comments_n"], 5)
+
+	def test_09_tag_stats(self):
+		with self.__connection.enter_scope() as scope:
+			self.clear(scope)
+
+			db = factory.create_object_db()
+
+			objects = [self.generate_object(scope) for _ in range(10)]
+			users = [self.generate_user_account(scope) for _ in range(5)]
+			tags = self.generate_set(5, lambda: self.generate_text(2, 16).lower())
+
+			for i in range(len(objects)):
+				for j in range(len(tags)):
+					for user in users[:(i + j) % len(users) + 1]:
+						db.add_tag(scope, objects[i]["guid"], user["id"], tags[j])
+
+			def count_tags(deleted):
+				counted = {}
+
+				for i in range(len(objects)):
+					if i not in deleted:
+						for j in range(len(tags)):
+							counted[tags[j]] = counted.get(tags[j], 0) + (i + j) % len(users) + 1
+
+				return counted
+
+			def get_tags(limit=None):
+				return dict(map(lambda t: (t["tag"], t["count"]), db.get_tags(scope, limit)))
+
+			# statistic is maintained by triggers:
+			self.assertEqual(get_tags(), count_tags([]))
+			self.assertEqual(db.reconcile_tags(scope), 0)
+
+			# deleted objects aren't counted:
+			db.delete_object(scope, objects[0]["guid"], True)
+			db.delete_object(scope, objects[1]["guid"], True)
+			self.assertEqual(get_tags(), count_tags([0, 1]))
+
+			db.delete_object(scope, objects[1]["guid"], False)
+			self.assertEqual(get_tags(), count_tags([0]))
+
+			db.add_tag(scope, objects[0]["guid"], users[0]["id"], self.generate_text(2, 16).lower())
+			self.assertEqual(get_tags(), count_tags([0]))
+			self.assertEqual(db.reconcile_tags(scope), 0)
+
+			# tags are ordered by usage:
+			counts = map(lambda t: t["count"], db.get_tags(scope))
+			self.assertEqual(counts, sorted(counts, reverse=True))
+
+			top = db.get_tags(scope, 2)
+			self.assertEqual(len(top), 2)
+			self.assertEqual(map(lambda t: t["count"], top), counts[:2])
+
+			# damage statistic & repair it:
+			scope.get_handle().execute("delete from tag_stats where tag=%s", (tags[0],))
+			scope.get_handle().execute("update tag_stats set count=100 where tag=%s", (tags[1],))
+			scope.get_handle().execute("insert into tag_stats (tag, count) values (%s, 1)", (self.generate_text(20, 30).lower(),))
+
+			self.assertEqual(db.reconcile_tags(scope), 3)
+			self.assertEqual(get_tags(), count_tags([0]))
+
 class TestStreamDb(unittest.TestCase, TestBase):
 	def setUp(self):
 		self.__connection = factory.create_db_connection()
@@ -1226,6 +1489,156 @@ class TestStreamDb(unittest.TestCase, TestBase):
 				for v in vote_stat[user["id"]].values():
 					self.assertEqual(v, 0)
 
+	def test_03_fanout_on_read(self):
+		with self.__connection.enter_scope() as scope:
+			self.clear(scope)
+
+			# activities are only recorded in "read" mode (the triggers are rolled back with the transaction):
+			self.__install_triggers__(scope, "read")
+
+			# create test data:
+			activity_db = pgdb.PGActivityStreamDb()
+			user_db = factory.create_user_db()
+			object_db = factory.create_object_db()
+
+			a = self.generate_user_account(scope)
+			users = map(lambda _: self.generate_user_account(scope), range(10))
+			objects = map(lambda _: self.generate_object(scope), range(50))
+
+			for user in users:
+				user_db.follow(scope, a["id"], user["id"], True)
+				user_db.follow(scope, user["id"], a["id"], True)
+
+			for obj in objects:
+				author = self.pick_one(users)
+
+				object_db.add_comment(scope, obj["guid"], author["id"], self.generate_text())
+				object_db.vote(scope, obj["guid"], author["id"], random.randint(0, 1) == 1)
+				user_db.recommend(scope, author["id"], a["id"], obj["guid"])
+
+			# compare stream with created events:
+			key = lambda msg: (msg["type"], str(msg["target"]), long(msg["source"]))
+
+			cur = scope.get_handle()
+			cur.execute("select 'wrote-comment', id::varchar, user_id from object_comment "    + \
+			            "union all select 'voted-object', object_guid::varchar, user_id from object_score " + \
+			            "union all select 'recommendation', object_guid::varchar, user_id from user_recommendation")
+
+			events = map(lambda row: (row[0], row[1], long(row[2])), cur.fetchall())
+			events.extend(map(lambda user: ("following", "None", user["id"]), users))
+
+			activities = activity_db.get_messages(scope, a["username"], pow(2, 31))
+
+			self.assertEqual(len(activities), len(users) + len(objects) * 3)
+			self.assertEqual(sorted(map(key, activities)), sorted(events))
+
+			# ids of activities & messages are unique:
+			self.assertEqual(len(set(map(lambda msg: msg["id"], activities))), len(activities))
+
+			for i in range(1, len(activities)):
+				self.assertTrue(activities[i - 1]["created_on"] >= activities[i]["created_on"])
+
+			# test limit:
+			self.assertEqual(len(activity_db.get_messages(scope, a["username"], 10)), 10)
+
+			# the account followed by the other users has no activities:
+			for user in users:
+				messages = activity_db.get_messages(scope, user["username"], pow(2, 31))
+
+				self.assertEqual(len(messages), 1)
+				self.assertEqual(messages[0]["type"], "following")
+				self.assertEqual(long(messages[0]["source"]), a["id"])
+
+	# installs the message triggers of a stream mode generated from sql/triggers.m4:
+	def __install_triggers__(self, scope, fanout, worker=False):
+		path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "triggers.m4")
+
+		sql = subprocess.check_output(["m4", "-DUSER_REQUEST_TIMEOUT=%d" % config.USER_REQUEST_TIMEOUT,
+		                               "-DPASSWORD_REQUEST_TIMEOUT=%d" % config.PASSWORD_REQUEST_TIMEOUT,
+		                               "-DSTREAM_FANOUT='%s'" % fanout, "-DSTREAM_WORKER=%s" % worker, path])
+
+		scope.get_handle().execute(sql)
+
+	def test_04_merge(self):
+		sequences = map(lambda _: sorted(map(lambda _: random.randint(0, 1000), range(random.randint(0, 100))), reverse=True), range(50))
+		merged = sorted(itertools.chain(*sequences), reverse=True)
+
+		for limit in [0, 1, 10, len(merged), len(merged) + 1]:
+			self.assertEqual(util.merge_descending(sequences, lambda v: v, limit), merged[:limit])
+
+class TestQueryPlans(unittest.TestCase, TestBase):
+	def setUp(self):
+		self.__connection = factory.create_db_connection()
+
+	def tearDown(self):
+		self.__connection.close()
+
+	def test_00_index_scans(self):
+		with self.__connection.enter_scope() as scope:
+			self.clear(scope)
+
+			user_db = factory.create_user_db()
+			object_db = factory.create_object_db()
+
+			# seed database:
+			users = [self.generate_user_account(scope) for _ in range(50)]
+			objects = [self.generate_object(scope) for _ in range(50)]
+			tags = self.generate_set(10, lambda: self.generate_text(2, 16))
+
+			for i in range(len(users)):
+				user_db.follow(scope, users[i]["id"], users[(i + 1) % len(users)]["id"], True)
+
+				for obj in objects[i:i + 5]:
+					user_db.favor(scope, users[i]["id"], obj["guid"])
+					object_db.vote(scope, obj["guid"], users[i]["id"], i % 2 == 0)
+					object_db.add_tag(scope, obj["guid"], users[i]["id"], tags[i % len(tags)])
+
+			user_db.recommend(scope, users[0]["id"], users[1]["id"], objects[0]["guid"])
+
+			a, b = users[0], users[1]
+			guid = objects[0]["guid"]
+
+			low, high = pgdb.fetch_one(scope.get_handle(), "select min(id), max(id) from object where not deleted")
+
+			# indexes have to be used even if the planner would prefer scanning the small tables:
+			scope.get_handle().execute("set local enable_seqscan=off")
+
+			calls = [lambda s: user_db.user_exists(s, a["username"].upper()),
+			         lambda s: user_db.get_user(s, a["username"]),
+			         lambda s: user_db.is_following(s, a["username"], b["username"]),
+			         lambda s: user_db.get_followed_usernames(s, a["username"]),
+			         lambda s: user_db.is_favorite(s, a["id"], guid),
+			         lambda s: user_db.get_favorites(s, a["id"]),
+			         lambda s: user_db.recommendation_exists(s, a["username"], b["username"], guid),
+			         lambda s: object_db.user_can_vote(s, guid, a["username"]),
+			         lambda s: object_db.get_voting(s, guid, a["username"]),
+			         lambda s: object_db.add_tag(s, guid, b["id"], tags[0].upper()),
+			         lambda s: object_db.get_random_objects(s, 10),
+			         # sparse id range (draws miss, objects following random positions are sampled):
+			         lambda s: object_db.__sample_objects__(s.get_handle(), low, high + 1000000, 10)]
+
+			for f in calls:
+				recorder = RecordingScope(scope)
+				f(recorder)
+
+				queries = filter(lambda q: q[0].lstrip().lower().startswith("select"), recorder.queries)
+				self.assertTrue(len(queries) > 0)
+
+				for query, params in queries:
+					self.__test_index_scan__(scope, query, params)
+
+			# object_get_tagged() filters by tag:
+			self.__test_index_scan__(scope, "select object_guid from object_tag where lower(tag)=lower(%s)", (tags[0].upper(),))
+
+	def __test_index_scan__(self, scope, query, params):
+		cur = scope.get_handle()
+		cur.execute("explain " + query, params)
+
+		plan = "\n".join(map(lambda row: row[0], cur.fetchall()))
+
+		self.assertNotIn("Seq Scan", plan, "%s\n%s" % (query, plan))
+		self.assertIn("Index", plan, "%s\n%s" % (query, plan))
+
 class TestMailDb(unittest.TestCase, TestBase):
 	def setUp(self):
 		self.__connection = factory.create_db_connection()
@@ -1275,10 +1688,11 @@ class TestMailDb(unittest.TestCase, TestBase):
 			sent = []
 
 			for i in range(0, 100, 2):
-				id = all[i]["id"]
+				sent.append(all[i]["id"])
 
-				sent.append(id)
-				db.mark_sent(scope, id)
+			db.mark_sent(scope, sent[:10])
+			db.mark_sent(scope, sent[10:])
+			db.mark_sent(scope, [])
 
 			all = db.get_unsent_messages(scope, len(bodies))
 			self.assertEqual(len(all), len(bodies) - len(bodies) / 2)
@@ -1286,148 +1700,1360 @@ class TestMailDb(unittest.TestCase, TestBase):
 			for msg in all:
 				self.assertFalse(msg["id"] in sent)
 
-class TestMTA():
-	def __init__(self):
-		self.mails = []
-
-	def start_session(self): pass
-	def end_session(self): pass
+	def test_01_claim(self):
+		db = factory.create_mail_db()
 
-	def send(self, subject, body, receiver):
-		self.mails.append({ "subject": subject, "body": body, "receiver": receiver })
+		with self.__connection.enter_scope() as scope:
+			self.clear(scope)
 
-		return True
+			for i in range(10):
+				db.push_mail(scope, self.generate_text(), self.generate_text(), self.generate_email())
 
-class TestMailer(unittest.TestCase, TestBase):
-	def test_00_mailer(self):
-		# start mailer:
-		mta = TestMTA()
+			scope.complete()
 
-		m = mailer.Mailer("localhost", 8888, mta)
-		m.start()
+		# claimed mails aren't claimed again & aren't due until the lease expires:
+		with self.__connection.enter_scope() as scope:
+			a = db.claim_messages(scope, 4, 600)
+			self.assertEqual(len(a), 4)
 
-		# generate mails:
-		size = 1000
+			scope.complete()
 
 		with factory.create_db_connection() as conn:
 			with conn.enter_scope() as scope:
-				self.clear(scope)
-
-				db = factory.create_mail_db()
+				b = db.claim_messages(scope, 4, 600)
+				self.assertEqual(len(b), 4)
 
-				subjects = self.generate_set(size, self.generate_text)
-				bodies = self.generate_set(size, self.generate_text)
-				emails = self.generate_set(size, self.generate_email)
+				# mails locked by a concurrent claim are skipped:
+				with self.__connection.enter_scope() as other:
+					c = db.claim_messages(other, 10, 600)
+					self.assertEqual(len(c), 2)
 
-				for i in range(size):
-					db.push_mail(scope, subjects[i], bodies[i], emails[i])
+					other.complete()
 
 				scope.complete()
 
-		# transfer mails & stop mailer:
-		mailer.ping("localhost", 8888)
+		ids = map(lambda m: m["id"], a + b + c)
+		self.assertEqual(len(set(ids)), 10)
 
-		started = datetime.datetime.utcnow()
-
-		while len(mta.mails) < size:
-			time.sleep(1)
+		with self.__connection.enter_scope() as scope:
+			self.assertEqual(db.get_unsent_messages(scope, 10), [])
 
-			diff = datetime.datetime.utcnow() - started
+			self.assertEqual(db.claim_messages(scope, 10, 600), [])
 
-			if diff.total_seconds() >= 30:
-				break
+			# expired leases:
+			scope.get_handle().execute("update mail set next_attempt_on=timezone('utc'::text, now())-interval '1 second'")
 
-			mailer.ping("localhost", 8888)
+			self.assertEqual(sorted(map(lambda m: m["id"], db.claim_messages(scope, 10, 0))), sorted(ids))
 
-		m.quit()
+			# released mails are due again without losing an attempt:
+			db.claim_messages(scope, 10, 600)
+			db.release_messages(scope, ids[:3])
 
-		# test transferred mails:
-		self.assertEqual(len(mta.mails), size)
+			self.assertEqual(map(lambda m: (m["id"], m["attempts"]), db.get_unsent_messages(scope, 10)), map(lambda id: (id, 0), sorted(ids[:3])))
 
-		i = 0
+	def test_02_notify(self):
+		listener = factory.create_mail_listener()
 
-		for mail in mta.mails:
-			self.assertEqual(mail["subject"], subjects[i])
-			self.assertEqual(mail["body"], bodies[i])
-			self.assertEqual(mail["receiver"], emails[i])
+		try:
+			db = factory.create_mail_db()
 
-			i += 1
+			# no notification before the transaction has been committed:
+			with self.__connection.enter_scope() as scope:
+				self.clear(scope)
 
-class TestApp(unittest.TestCase, TestBase):
-	def setUp(self):
-		self.app = app.Application()
-		self.__clear_database__()
-		self.__delete_files__()
+				db.push_mail(scope, self.generate_text(), self.generate_text(), self.generate_email())
+				db.push_mail(scope, self.generate_text(), self.generate_text(), self.generate_email())
 
-	def tearDown(self):
-		self.__clear_database__()
-		self.__delete_files__()
+				readable, _, _ = select.select([listener], [], [], 0.5)
+				self.assertEqual(len(readable), 0)
 
-	def test_00_create_user(self):
-		username = self.generate_username()
-		email = self.generate_email()
+				scope.complete()
 
-		id, code = self.app.request_account(username, email)
+			# a single notification is sent for the committed transaction:
+			readable, _, _ = select.select([listener], [], [], 5)
+			self.assertEqual(readable, [listener])
+			self.assertEqual(listener.poll(), [""])
 
-		self.assertRaises(exception.InvalidParameterException, self.app.request_account, "", self.generate_text(100, 200))
-		self.assertRaises(exception.InvalidParameterException, self.app.request_account, self.generate_text(100, 200), "")
-		self.assertRaises(exception.ConflictException, self.app.request_account, username, email)
+			# rolled back transactions don't notify the listener:
+			with self.__connection.enter_scope() as scope:
+				db.push_mail(scope, self.generate_text(), self.generate_text(), self.generate_email())
 
-		self.assertRaises(exception.NotFoundException, self.app.activate_user, self.generate_text(), code)
-		self.assertRaises(exception.InvalidRequestCodeException, self.app.activate_user, id, self.generate_text())
+			readable, _, _ = select.select([listener], [], [], 0.5)
+			self.assertEqual(len(readable), 0)
+			self.assertEqual(listener.poll(), [])
 
-		username2, email2, password = self.app.activate_user(id, code)
+		finally:
+			listener.close()
 
-		self.assertEqual(username, username2)
-		self.assertEqual(email, email2)
+	def test_03_retry(self):
+		with self.__connection.enter_scope() as scope:
+			self.clear(scope)
 
-		self.assertRaises(exception.NotFoundException, self.app.activate_user, self.generate_text(), code)
+			db = factory.create_mail_db()
 
-	def test_01_block_and_delete_user(self):
-		user = self.__generate_test_account__()
+			for i in range(3):
+				db.push_mail(scope, self.generate_text(), self.generate_text(), self.generate_email())
 
-		# disable account:
-		self.assertRaises(exception.ConflictException, self.app.disable_user, user["username"], False)
+			a, b, c = map(lambda m: m["id"], db.get_unsent_messages(scope, 3))
 
-		self.app.disable_user(user["username"], True)
+			# failed mails without delay stay due until the maximum number of attempts is reached:
+			db.mark_failed(scope, [a, b], 2, 0, 0)
+			db.mark_failed(scope, [], 2, 0, 0)
 
-		self.assertRaises(exception.ConflictException, self.app.disable_user, user["username"])
+			mails = db.get_unsent_messages(scope, 3)
+			self.assertEqual(sorted(map(lambda m: (m["id"], m["attempts"]), mails)), [(a, 1), (b, 1), (c, 0)])
 
-		# delete account:
-		self.app.delete_user(user["username"])
+			db.mark_failed(scope, [a], 2, 0, 0)
 
-		self.assertRaises(exception.UserNotFoundException, self.app.delete_user, user["username"])
+			mails = db.get_unsent_messages(scope, 3)
+			self.assertEqual(sorted(map(lambda m: m["id"], mails)), [b, c])
 
-		# disable deleted account:
-		self.assertRaises(exception.UserNotFoundException, self.app.disable_user, user["username"])
+			# delayed mails aren't due:
+			db.mark_failed(scope, [b], 5, 60, 3600)
 
-	def test_02_change_and_verify_password(self):
-		user = self.__generate_test_account__()
-		disabled = self.__generate_blocked_test_account__()
-		deleted = self.__generate_deleted_test_account__()
+			mails = db.get_unsent_messages(scope, 3)
+			self.assertEqual(map(lambda m: m["id"], mails), [c])
 
-		# validate password:
-		self.assertRaises(exception.UserNotFoundException, self.app.validate_password, self.generate_username(), disabled["password"])
-		self.assertRaises(exception.UserIsBlockedException, self.app.validate_password, disabled["username"], disabled["password"])
-		self.assertRaises(exception.UserNotFoundException, self.app.validate_password, deleted["username"], deleted["password"])
+			# test delay & state of failed mails:
+			cur = scope.get_handle()
+			cur.execute("select id, attempts, failed, extract(epoch from next_attempt_on - timezone('utc'::text, now())) from mail order by id")
 
-		self.assertTrue(self.app.validate_password(user["username"], user["password"]))
-		self.assertFalse(self.app.validate_password(user["username"], self.generate_text()))
+			self.assertEqual(map(lambda r: (r[0], r[1], r[2], int(r[3])), cur.fetchall()), [(a, 2, True, 0), (b, 2, False, 120), (c, 0, False, 0)])
 
-		# change password:
-		new_password = self.generate_text(8, 32)
+class TestMTA():
+	def __init__(self):
+		self.mails = []
 
-		self.assertRaises(exception.UserNotFoundException, self.app.change_password, self.generate_username(), self.generate_text(), new_password, new_password)
-		self.assertRaises(exception.UserIsBlockedException, self.app.change_password, disabled["username"], self.generate_text(), new_password, new_password)
-		self.assertRaises(exception.UserNotFoundException, self.app.change_password, deleted["username"], self.generate_text(), new_password, new_password)
-		self.assertRaises(exception.InvalidParameterException, self.app.change_password, user["username"], self.generate_text(), "", "")
-		self.assertRaises(exception.InvalidParameterException, self.app.change_password, user["username"], self.generate_text(), self.generate_text(), self.generate_text())
-		self.assertRaises(exception.WrongPasswordException, self.app.change_password, user["username"], self.generate_text(), new_password, new_password)
+	def start_session(self): pass
+	def end_session(self): pass
+
+	def send(self, subject, body, receiver):
+		self.mails.append({ "subject": subject, "body": body, "receiver": receiver })
+
+		return True
+
+class FailingTestMTA(TestMTA):
+	def __init__(self, receivers):
+		TestMTA.__init__(self)
+
+		self.receivers = receivers
+		self.failed = []
+
+	def send(self, subject, body, receiver):
+		if receiver in self.receivers:
+			self.failed.append(receiver)
+
+			return False
+
+		return TestMTA.send(self, subject, body, receiver)
+
+class UnavailableTestMTA(TestMTA):
+	def __init__(self, failures):
+		TestMTA.__init__(self)
+
+		self.failures = failures
+		self.lock = threading.Lock()
+
+	def send(self, subject, body, receiver):
+		self.lock.acquire()
+
+		try:
+			if self.failures > 0:
+				self.failures -= 1
+
+				raise mailer.TransientError("Server not available.")
+
+			return TestMTA.send(self, subject, body, receiver)
+
+		finally:
+			self.lock.release()
+
+class TestMailer(unittest.TestCase, TestBase):
+	def test_00_notify(self):
+		# start mailer without UDP listener:
+		mta = TestMTA()
+
+		m = mailer.Mailer(None, None, lambda: mta, 4, factory.create_mail_listener)
+		m.start()
+
+		try:
+			# mails are sent as soon as the transaction has been committed:
+			self.__test_mailer__(mta, 1000, lambda: None)
+
+		finally:
+			m.quit()
+
+	def test_01_udp(self):
+		# start mailer without database listener:
+		mta = TestMTA()
+
+		m = mailer.Mailer("localhost", 8888, lambda: mta, 4)
+		m.start()
+
+		try:
+			self.__test_mailer__(mta, 1000, lambda: mailer.ping("localhost", 8888))
+
+		finally:
+			m.quit()
+
+	def test_02_retry(self):
+		# start mailer, failed mails are retried immediately:
+		max_attempts, delay = config.MAILER_MAX_ATTEMPTS, config.MAILER_RETRY_DELAY
+		config.MAILER_MAX_ATTEMPTS, config.MAILER_RETRY_DELAY = 3, 0
+
+		invalid = self.generate_set(10, self.generate_email)
+		mta = FailingTestMTA(invalid)
+
+		m = mailer.Mailer(None, None, lambda: mta, 4, factory.create_mail_listener)
+		m.start()
+
+		try:
+			with factory.create_db_connection() as conn:
+				with conn.enter_scope() as scope:
+					self.clear(scope)
+
+					db = factory.create_mail_db()
+
+					for receiver in invalid:
+						db.push_mail(scope, self.generate_text(), self.generate_text(), receiver)
+
+					# valid mails aren't blocked by failing ones:
+					for i in range(100):
+						db.push_mail(scope, self.generate_text(), self.generate_text(), self.generate_email())
+
+					scope.complete()
+
+			started = datetime.datetime.utcnow()
+
+			while len(mta.mails) < 100 or len(mta.failed) < 30:
+				time.sleep(0.1)
+
+				if (datetime.datetime.utcnow() - started).total_seconds() >= 30:
+					break
+
+		finally:
+			m.quit()
+
+			config.MAILER_MAX_ATTEMPTS, config.MAILER_RETRY_DELAY = max_attempts, delay
+
+		self.assertEqual(len(mta.mails), 100)
+		self.assertEqual(len(mta.failed), 30)
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.assertEqual(len(factory.create_mail_db().get_unsent_messages(scope, 200)), 0)
+
+				cur = scope.get_handle()
+				cur.execute("select mail, attempts from mail where failed")
+
+				self.assertEqual(sorted(cur.fetchall()), sorted(map(lambda r: [r, 3], invalid)))
+
+	def test_03_unavailable(self):
+		# start mailer, workers back off while the server isn't available:
+		backoff = config.MAILER_BACKOFF
+		config.MAILER_BACKOFF = 0.5
+
+		mta = UnavailableTestMTA(8)
+
+		m = mailer.Mailer(None, None, lambda: mta, 4, factory.create_mail_listener)
+		m.start()
+
+		try:
+			self.__test_mailer__(mta, 100, lambda: None)
+
+		finally:
+			m.quit()
+
+			config.MAILER_BACKOFF = backoff
+
+		self.assertEqual(mta.failures, 0)
+
+		# mails don't lose an attempt:
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				cur = scope.get_handle()
+				cur.execute("select count(*) from mail where attempts>0 or failed")
+
+				self.assertEqual(cur.fetchone()[0], 0)
+
+	def __test_mailer__(self, mta, size, ping):
+		# generate mails:
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.clear(scope)
+
+				db = factory.create_mail_db()
+
+				subjects = self.generate_set(size, self.generate_text)
+				bodies = self.generate_set(size, self.generate_text)
+				emails = self.generate_set(size, self.generate_email)
+
+				for i in range(size):
+					db.push_mail(scope, subjects[i], bodies[i], emails[i])
+
+				scope.complete()
+
+		# transfer mails:
+		ping()
+
+		started = datetime.datetime.utcnow()
+
+		while len(mta.mails) < size:
+			time.sleep(0.1)
+
+			diff = datetime.datetime.utcnow() - started
+
+			if diff.total_seconds() >= 30:
+				break
+
+			ping()
+
+		# test transferred mails (workers send batches in parallel):
+		self.assertEqual(len(mta.mails), size)
+
+		sent = sorted(map(lambda m: (m["subject"], m["body"], m["receiver"]), mta.mails))
+		expected = sorted(map(lambda i: (subjects[i], bodies[i], emails[i]), range(size)))
+
+		self.assertEqual(sent, expected)
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.assertEqual(len(factory.create_mail_db().get_unsent_messages(scope, size)), 0)
+
+class TestFanout(unittest.TestCase, TestBase):
+	def test_00_process_events(self):
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.clear(scope)
+
+				db = factory.create_stream_db()
+				user_db = factory.create_user_db()
+				cur = scope.get_handle()
+
+				a, b, c = map(lambda _: self.generate_user_account(scope), range(3))
+
+				user_db.follow(scope, b["id"], a["id"], True)
+				user_db.follow(scope, c["id"], a["id"], True)
+
+				counts = map(lambda user: len(db.get_messages(scope, user["username"], pow(2, 31))), [a, b, c])
+				public = len(db.get_public_messages(scope, pow(2, 31)))
+
+				# append events to the outbox:
+				guid = util.new_guid()
+				size = 25
+
+				for i in range(size):
+					cur.execute("insert into stream_event (type, source_id, target, public) values ('voted-object', %s, %s, %s)", (a["id"], guid, i % 2 == 0))
+					cur.execute("insert into stream_event (type, source_id, receiver_id, target) values ('recommendation', %s, %s, %s)", (a["id"], b["id"], guid))
+
+				# expand events in batches:
+				processed = []
+
+				while True:
+					count = db.process_events(scope, 10)
+					processed.append(count)
+
+					if count < 10:
+						break
+
+				self.assertEqual(processed, [10, 10, 10, 10, 10, 0])
+				self.assertEqual(db.process_events(scope, 10), 0)
+
+				# test messages:
+				messages = map(lambda user: db.get_messages(scope, user["username"], pow(2, 31)), [a, b, c])
+
+				self.assertEqual(len(messages[0]), counts[0])
+				self.assertEqual(len(messages[1]), counts[1] + size * 2)
+				self.assertEqual(len(messages[2]), counts[2] + size)
+
+				for msg in messages[1] + messages[2]:
+					if msg["type"] != "following":
+						self.assertEqual(long(msg["source"]), a["id"])
+						self.assertEqual(msg["target"], guid)
+
+				self.assertEqual(len(db.get_public_messages(scope, pow(2, 31))), public + (size + 1) / 2)
+
+	def test_01_worker(self):
+		# start worker, events are only expanded when it's pinged:
+		interval = config.FANOUT_CHECK_INTERVAL
+		config.FANOUT_CHECK_INTERVAL = 3600
+
+		w = fanout.FanoutWorker("localhost", 8889, 100)
+		w.start()
+
+		# append events to the outbox:
+		size = 1000
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.clear(scope)
+
+				a, b = map(lambda _: self.generate_user_account(scope), range(2))
+				cur = scope.get_handle()
+
+				for i in range(size):
+					cur.execute("insert into stream_event (type, source_id, receiver_id, target) values ('recommendation', %s, %s, %s)", (a["id"], b["id"], util.new_guid()))
+
+				scope.complete()
+
+		# expand events & stop worker:
+		fanout.ping("localhost", 8889)
+
+		db = factory.create_stream_db()
+		started = datetime.datetime.utcnow()
+		messages = []
+
+		while len(messages) < size:
+			time.sleep(1)
+
+			with factory.create_db_connection() as conn:
+				with conn.enter_scope() as scope:
+					messages = db.get_messages(scope, b["username"], pow(2, 31))
+
+			diff = datetime.datetime.utcnow() - started
+
+			if diff.total_seconds() >= 30:
+				break
+
+		w.quit()
+
+		config.FANOUT_CHECK_INTERVAL = interval
+
+		self.assertEqual(len(messages), size)
+
+	def test_02_concurrent_workers(self):
+		db = factory.create_stream_db()
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.clear(scope)
+
+				a, b = map(lambda _: self.generate_user_account(scope), range(2))
+				cur = scope.get_handle()
+
+				for i in range(15):
+					cur.execute("insert into stream_event (type, source_id, receiver_id, target) values ('recommendation', %s, %s, %s)", (a["id"], b["id"], util.new_guid()))
+
+				scope.complete()
+
+		# events locked by another transaction are skipped:
+		with factory.create_db_connection() as first:
+			with first.enter_scope() as scope:
+				self.assertEqual(db.process_events(scope, 10), 10)
+
+				with factory.create_db_connection() as second:
+					with second.enter_scope() as other:
+						self.assertEqual(db.process_events(other, 10), 5)
+						other.complete()
+
+				scope.complete()
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.assertEqual(len(db.get_messages(scope, b["username"], pow(2, 31))), 15)
+				self.assertEqual(db.process_events(scope, 10), 0)
+
+class TestConnectionPool(unittest.TestCase, TestBase):
+	def test_00_reuse(self):
+		pool = factory.get_db_pool()
+		before = pool.get_stats()
+
+		for _ in range(100):
+			with factory.create_db_connection() as conn:
+				with conn.enter_scope() as scope:
+					scope.get_handle().execute("select 1")
+
+		after = pool.get_stats()
+
+		self.assertEqual(after["checkouts"] - before["checkouts"], 100)
+		self.assertTrue(after["created"] - before["created"] <= 1)
+		self.assertEqual(after["in_use"], 0)
+		self.assertTrue(after["size"] <= config.PG_POOL_MAX_SIZE)
+
+	def test_01_concurrency(self):
+		pool = factory.get_db_pool()
+		failures = []
+
+		def worker():
+			try:
+				for _ in range(20):
+					with factory.create_db_connection() as conn:
+						with conn.enter_scope() as scope:
+							scope.get_handle().execute("select pg_sleep(0.01)")
+
+			except Exception as e:
+				failures.append(e)
+
+		threads = [threading.Thread(target=worker) for _ in range(config.PG_POOL_MAX_SIZE * 2)]
+
+		for t in threads:
+			t.start()
+
+		for t in threads:
+			t.join()
+
+		stats = pool.get_stats()
+
+		self.assertEqual(len(failures), 0)
+		self.assertEqual(stats["in_use"], 0)
+		self.assertTrue(stats["size"] <= config.PG_POOL_MAX_SIZE)
+
+class TestRequestContext(unittest.TestCase, TestBase):
+	def setUp(self):
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.clear(scope)
+				scope.complete()
+
+	def test_00_shared_connection(self):
+		pool = factory.get_db_pool()
+		a = app.Application()
+
+		with context.RequestContext(util.new_guid()):
+			before = pool.get_stats()["checkouts"]
+
+			for _ in range(10):
+				a.get_objects()
+
+			self.assertEqual(pool.get_stats()["checkouts"] - before, 1)
+
+	def test_01_nested_scopes(self):
+		guids = [util.new_guid(), util.new_guid()]
+
+		with context.RequestContext(util.new_guid()):
+			db = factory.create_object_db()
+
+			with context.create_db_connection() as conn:
+				with conn.enter_scope() as scope:
+					db.create_object(scope, guids[0], self.generate_text())
+					scope.complete()
+
+			with context.create_db_connection() as conn:
+				with conn.enter_scope() as scope:
+					db.create_object(scope, guids[1], self.generate_text())
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				self.assertTrue(db.object_exists(scope, guids[0]))
+				self.assertFalse(db.object_exists(scope, guids[1]))
+
+	def test_02_read_only(self):
+		with context.RequestContext(util.new_guid(), True) as ctx:
+			ctx.enter_handler()
+
+			with context.create_db_connection() as conn:
+				with conn.enter_scope() as scope:
+					db = factory.create_object_db()
+
+					self.assertRaises(Exception, db.create_object, scope, util.new_guid(), self.generate_text())
+
+	def test_03_after_commit(self):
+		called = []
+
+		context.after_commit(lambda: called.append(0))
+		self.assertEqual(called, [0])
+
+		with context.RequestContext(util.new_guid()):
+			with context.create_db_connection() as conn:
+				with conn.enter_scope() as scope:
+					scope.get_handle().execute("select 1")
+					scope.complete()
+
+			context.after_commit(lambda: called.append(1))
+			self.assertEqual(called, [0])
+
+		self.assertEqual(called, [0, 1])
+
+		try:
+			with context.RequestContext(util.new_guid()):
+				context.after_commit(lambda: called.append(2))
+				raise exception.InternalFailureException("test")
+
+		except exception.InternalFailureException:
+			pass
+
+		self.assertEqual(called, [0, 1])
+
+## Handler storing log records.
+class ListHandler(logging.Handler):
+	def __init__(self):
+		logging.Handler.__init__(self)
+		self.records = []
+
+	def emit(self, record):
+		self.records.append(record)
+
+## Object counting how often it's converted to a string.
+class StrCounter:
+	def __init__(self):
+		self.count = 0
+
+	def __str__(self):
+		self.count += 1
+
+		return "foo"
+
+class TestLogger(unittest.TestCase, TestBase):
+	def __create_logger__(self, level, handler):
+		l = logging.Logger(self.generate_text())
+		l.setLevel(level)
+		l.addFilter(logger.RequestIdFilter())
+		l.addHandler(handler)
+
+		return l
+
+	def test_00_lazy_formatting(self):
+		handler = ListHandler()
+		l = self.__create_logger__(logging.INFO, handler)
+
+		for request_id in [None, util.new_guid()]:
+			log = logger.LoggerWrapper(l, request_id)
+			obj = StrCounter()
+
+			log.debug("%s", obj)
+			self.assertEqual(obj.count, 0)
+			self.assertFalse(log.isEnabledFor(logging.DEBUG))
+
+			log.info("%s %d%%", obj, 100)
+			self.assertEqual(obj.count, 0)
+
+			self.assertEqual(handler.records[-1].getMessage(), "foo 100%")
+			self.assertEqual(obj.count, 1)
+
+		# messages without arguments aren't formatted:
+		log.info("100%")
+		self.assertEqual(handler.records[-1].getMessage(), "100%")
+
+	def test_01_request_id(self):
+		handler = ListHandler()
+		handler.setFormatter(logging.Formatter("%(levelname)s %(request_id)s %(message)s"))
+
+		l = self.__create_logger__(logging.DEBUG, handler)
+		request_id = util.new_guid()
+
+		logger.LoggerWrapper(l, request_id).info("foo")
+		logger.LoggerWrapper(l).warning("bar")
+
+		self.assertEqual(map(handler.format, handler.records), ["INFO %s foo" % request_id, "WARNING - bar"])
+
+	def test_02_queue(self):
+		queue = Queue.Queue(100)
+		handler = ListHandler()
+		listener = logger.QueueListener(queue, handler)
+
+		l = self.__create_logger__(logging.DEBUG, logger.QueueHandler(queue))
+		log = logger.LoggerWrapper(l, util.new_guid())
+
+		# records are queued when the listener isn't running:
+		try:
+			raise Exception("foo")
+
+		except:
+			l.exception("failure")
+
+		for i in range(150):
+			log.info("message %d", i)
+
+		self.assertEqual(queue.qsize(), 100)
+		self.assertEqual(l.handlers[0].dropped, 51)
+		self.assertEqual(len(handler.records), 0)
+
+		# write queued records:
+		listener.start()
+		listener.stop()
+
+		self.assertEqual(len(handler.records), 100)
+		self.assertIn("Exception: foo", handler.records[0].exc_text)
+		self.assertEqual(map(lambda r: r.getMessage(), handler.records[1:]), map(lambda i: "message %d" % i, range(99)))
+
+class TestRateLimiter(unittest.TestCase, TestBase):
+	def test_00_token_bucket(self):
+		self.__test_limiter__(ratelimit.TokenBucketRateLimiter())
+
+	def test_01_sliding_window(self):
+		self.__test_limiter__(ratelimit.SlidingWindowRateLimiter(ratelimit.LocalStore()))
+
+	def test_02_memory(self):
+		limiter = ratelimit.TokenBucketRateLimiter(prune_interval=0)
+
+		for i in range(1000):
+			limiter.consume("ip:%d" % i, 10, 1)
+
+		self.assertEqual(limiter.size(), 1000)
+
+		time.sleep(1.1)
+
+		limiter.consume("ip:0", 10, 1)
+
+		self.assertEqual(limiter.size(), 1)
+
+	def __test_limiter__(self, limiter):
+		for key in ["a", "b"]:
+			for _ in range(10):
+				self.assertTrue(limiter.consume(key, 10, 2))
+
+			self.assertFalse(limiter.consume(key, 10, 2))
+
+		# the limit is released within the period:
+		time.sleep(4.1)
+
+		self.assertTrue(limiter.consume("a", 10, 2))
+
+		# throughput:
+		started = time.time()
+
+		for i in range(100000):
+			limiter.consume("ip:%d" % (i % 1000), 1000, 3600)
+
+		print "%s: %.2f checks/s" % (limiter.__class__.__name__, 100000 / (time.time() - started))
+
+class TestCache(unittest.TestCase, TestBase):
+	def test_00_lru(self):
+		c = cache.Cache(10, 60)
+
+		for i in range(10):
+			c.put(i, str(i))
+
+		self.assertEqual(c.get(0), "0")
+
+		c.put(10, "10")
+
+		self.assertIsNone(c.get(1))
+		self.assertEqual(c.get(0), "0")
+		self.assertEqual(c.get(10), "10")
+
+		c.remove(10)
+
+		self.assertIsNone(c.get(10))
+
+		stats = c.get_stats()
+
+		self.assertEqual(stats["size"], 9)
+		self.assertEqual(stats["evictions"], 1)
+		self.assertEqual(stats["hits"], 3)
+		self.assertEqual(stats["misses"], 2)
+
+	def test_01_ttl(self):
+		c = cache.Cache(10, 1)
+
+		c.put("foo", "bar")
+		self.assertEqual(c.get("foo"), "bar")
+
+		time.sleep(1.1)
+
+		self.assertIsNone(c.get("foo"))
+
+	def test_02_disabled(self):
+		c = cache.Cache(0, 60)
+
+		c.put("foo", "bar")
+		self.assertIsNone(c.get("foo"))
+
+class TestCursors(unittest.TestCase, TestBase):
+	def test_00_decode(self):
+		now = datetime.datetime.utcnow()
+		guid = util.new_guid()
+
+		cursor = util.encode_cursor([now, guid, 42, "foo"])
+		values = util.decode_cursor(cursor, datetime.datetime, uuid.UUID, int, str)
+
+		self.assertEqual(values, [now, guid, 42, "foo"])
+
+	def test_01_malformed(self):
+		now = datetime.datetime.utcnow()
+		guid = util.new_guid()
+
+		types = [datetime.datetime, uuid.UUID, int]
+		invalid = [[now, guid], [now, guid, 42, 42], ["foo", guid, 42], [now, "foo", 42], [now, guid, "42"],
+		           [now, guid, 4.2], [now, guid, True], [now, guid, pow(2, 63)], [42, guid, 42]]
+
+		for values in invalid:
+			self.assertRaises(exception.InvalidParameterException, util.decode_cursor, util.encode_cursor(values), *types)
+
+		for cursor in [None, "", "foo", "!", util.encode_cursor([]), base64.urlsafe_b64encode("{}")]:
+			self.assertRaises(exception.InvalidParameterException, util.decode_cursor, cursor, *types)
+
+class TestRouting(unittest.TestCase, TestBase):
+	paths = ["/rest/registration", "/html/registration/abc", "/rest/user/john.doe", "/rest/user/john.doe/password/reset",
+	         "/html/user/john.doe/password/reset/abc", "/rest/user/john.doe/password", "/rest/user/search/john",
+	         "/rest/user/john.doe/friendship", "/rest/user/john.doe/avatar", "/rest/favorites/123", "/rest/favorites",
+	         "/rest/messages", "/rest/public", "/rest/object/123", "/rest/object/123/tags", "/rest/object/123/vote",
+	         "/rest/object/123/comments", "/rest/object/123/comments/page/12", "/rest/object/123/abuse", "/rest/comment/42",
+	         "/rest/object/123/recommend", "/rest/objects", "/rest/objects/page/3", "/rest/objects/tag/foo/page/3",
+	         "/rest/objects/tag/foo", "/rest/objects/tags", "/rest/objects/popular/page/3", "/rest/objects/popular",
+	         "/rest/objects/random", "/rest/recommendations", "/rest/recommendations/page/23", "/rest/user/search",
+	         "/rest/comment/abc", "/rest/objects/", "/foo", "/", ""]
+
+	def test_00_dispatch(self):
+		for path in self.paths:
+			expected = self.__linear_scan__(path)
+
+			try:
+				route, params = wsgi.dispatcher.match(path)
+
+				self.assertIsNotNone(expected)
+				self.assertIs(route, expected[0])
+				self.assertEqual(params, expected[1])
+
+			except router.RouteNotFoundException:
+				self.assertIsNone(expected)
+
+	def test_01_benchmark(self):
+		n = 200
+
+		started = time.time()
+
+		# previous implementation testing all routes:
+		f = lambda route: [route, route["path"].match(path)]
+
+		for _ in range(n):
+			for path in self.paths:
+				try:
+					next(pair for pair in map(f, wsgi.routing) if pair[1] is not None)
+
+				except StopIteration:
+					pass
+
+		linear = time.time() - started
+		started = time.time()
+
+		for _ in range(n):
+			for path in self.paths:
+				try:
+					wsgi.dispatcher.match(path)
+
+				except router.RouteNotFoundException:
+					pass
+
+		trie = time.time() - started
+
+		print "linear scan: %.4fs, trie: %.4fs (%d paths)" % (linear, trie, n * len(self.paths))
+
+		self.assertTrue(trie < linear)
+
+	def __linear_scan__(self, path):
+		for route in wsgi.routing:
+			m = route["path"].match(path)
+
+			if m is not None:
+				return route, m.groupdict()
+
+		return None
+
+## Controller returning its arguments.
+class EchoController(controller.Controller):
+	def __get__(self, env, foo, bar=23, baz=None):
+		v = view.JSONView(200)
+		v.bind({"foo": foo, "bar": bar, "baz": baz})
+
+		return v
+
+	__get__.__required__ = ["foo"]
+
+class TestControllerDispatch(unittest.TestCase, TestBase):
+	def setUp(self):
+		self.__limit_requests_by_ip = config.LIMIT_REQUESTS_BY_IP
+		config.LIMIT_REQUESTS_BY_IP = False
+
+	def tearDown(self):
+		config.LIMIT_REQUESTS_BY_IP = self.__limit_requests_by_ip
+
+	def test_00_arguments(self):
+		c = EchoController()
+		env = {"REMOTE_ADDR": "127.0.0.1"}
+
+		v = c.handle_request(util.new_guid(), "GET", env, foo="a")
+		self.assertEqual(v.status, 200)
+		self.assertEqual(v.model, {"foo": "a", "bar": 23, "baz": None})
+
+		v = c.handle_request(util.new_guid(), "GET", env, foo="a", bar="b", baz="c", unknown="d")
+		self.assertEqual(v.model, {"foo": "a", "bar": "b", "baz": "c"})
+
+		v = c.handle_request(util.new_guid(), "GET", env, bar="b")
+		self.assertEqual(v.status, 400)
+
+		v = c.handle_request(util.new_guid(), "POST", env, foo="a")
+		self.assertEqual(v.status, 405)
+
+		v = c.handle_request(util.new_guid(), "OPTIONS", env)
+		self.assertEqual(v.headers["Access-Control-Allow-Methods"], "OPTIONS, GET")
+
+	def test_01_benchmark(self):
+		c = EchoController()
+		env = {"REMOTE_ADDR": "127.0.0.1"}
+		n = 10000
+
+		# previous implementation inspecting the handler on each request:
+		started = time.time()
+
+		for _ in range(n):
+			spec = inspect.getargspec(c.__get__)
+			values = util.select_values({"foo": "a"}, spec[0][2:])
+
+		inspected = time.time() - started
+
+		started = time.time()
+
+		for _ in range(n):
+			c.handle_request(util.new_guid(), "GET", env, foo="a")
+
+		elapsed = time.time() - started
+
+		print "getargspec: %.2fus/request, handle_request: %.2fus/request" % (inspected * 1000000 / n, elapsed * 1000000 / n)
+
+class FileController(controller.Controller):
+	def __get__(self, env, filename):
+		v = view.FileView(200, "text/plain", env)
+		v.bind({"filename": filename})
+
+		return v
+
+	__get__.__required__ = ["filename"]
+
+class TestViews(unittest.TestCase, TestBase):
+	def test_00_streaming(self):
+		now = datetime.datetime.utcnow().replace(microsecond=0)
+		comments = map(lambda i: {"id": i, "text": self.generate_text(100, 200), "created_on": now, "user": {"username": self.generate_username()}}, range(1000))
+
+		for model in [comments, comments[:1], [], {"foo": now, "bar": [1, 2, 3]}, "foo", 23]:
+			v = view.JSONView(200, True)
+			v.bind(model)
+
+			chunks = list(v.render())
+
+			self.assertEqual(json.loads("".join(chunks), object_hook=json_util.object_hook), json.loads(util.to_json(model), object_hook=json_util.object_hook))
+
+			for chunk in chunks[:-1]:
+				self.assertTrue(len(chunk) >= 8192)
+
+		self.assertTrue(len(list(util.iter_json(comments))) > 1)
+
+		v = view.JSONView(200, True)
+		self.assertEqual(v.render(), "null")
+
+	def test_01_response_body(self):
+		headers = {}
+		self.assertEqual(wsgi.response_body("foo", headers), ["foo"])
+		self.assertEqual(headers["Content-Length"], "3")
+
+		headers = {}
+		self.assertEqual(wsgi.response_body(None, headers), [])
+		self.assertNotIn("Content-Length", headers)
+
+		headers = {}
+		body = wsgi.response_body(util.iter_json([1, 2, 3]), headers)
+		self.assertEqual("".join(body), "[1, 2, 3]")
+		self.assertNotIn("Content-Length", headers)
+
+	def test_02_file_view(self):
+		data = self.generate_text(1000, 1000)
+
+		fd, path = tempfile.mkstemp()
+
+		try:
+			os.write(fd, data)
+			os.close(fd)
+
+			def render(env):
+				v = view.FileView(200, "text/plain", env)
+				v.bind({"filename": path})
+
+				body = v.render()
+
+				if body is not None and not isinstance(body, str):
+					body = "".join(body)
+
+				return v, body
+
+			# complete file:
+			v, body = render({})
+
+			self.assertEqual(v.status, 200)
+			self.assertEqual(body, data)
+			self.assertEqual(v.headers["Content-Length"], "1000")
+
+			etag, modified = v.headers["ETag"], v.headers["Last-Modified"]
+
+			v, body = render({"wsgi.file_wrapper": lambda f, block_size: ["wrapped", f.read()]})
+			self.assertEqual(body, "wrapped" + data)
+
+			# conditional requests:
+			for env in [{"HTTP_IF_NONE_MATCH": etag}, {"HTTP_IF_NONE_MATCH": "\"foo\", %s" % etag}, {"HTTP_IF_NONE_MATCH": "*"},
+			            {"HTTP_IF_MODIFIED_SINCE": modified}]:
+				v, body = render(env)
+
+				self.assertEqual(v.status, 304)
+				self.assertIsNone(body)
+
+			for env in [{"HTTP_IF_NONE_MATCH": "\"foo\""}, {"HTTP_IF_MODIFIED_SINCE": "Thu, 01 Jan 1970 00:00:00 GMT"},
+			            {"HTTP_IF_MODIFIED_SINCE": "foo"}]:
+				v, body = render(env)
+
+				self.assertEqual(v.status, 200)
+				self.assertEqual(body, data)
+
+			# byte ranges:
+			for header, start, end in [("bytes=0-9", 0, 9), ("bytes=990-2000", 990, 999), ("bytes=-5", 995, 999), ("bytes=10-", 10, 999)]:
+				v, body = render({"HTTP_RANGE": header})
+
+				self.assertEqual(v.status, 206)
+				self.assertEqual(body, data[start:end + 1])
+				self.assertEqual(v.headers["Content-Range"], "bytes %d-%d/1000" % (start, end))
+				self.assertEqual(v.headers["Content-Length"], str(end - start + 1))
+
+			for header in ["bytes=1000-", "bytes=5-4", "bytes=-0"]:
+				v, body = render({"HTTP_RANGE": header})
+
+				self.assertEqual(v.status, 416)
+				self.assertEqual(v.headers["Content-Range"], "bytes */1000")
+
+			for env in [{"HTTP_RANGE": "bytes=0-1,5-6"}, {"HTTP_RANGE": "foo"}, {"HTTP_RANGE": "bytes=0-9", "HTTP_IF_RANGE": "\"foo\""}]:
+				v, body = render(env)
+
+				self.assertEqual(v.status, 200)
+				self.assertEqual(body, data)
+
+			v, body = render({"HTTP_RANGE": "bytes=0-9", "HTTP_IF_RANGE": etag})
+			self.assertEqual(v.status, 206)
+
+		finally:
+			os.remove(path)
+
+		v = view.FileView(200)
+		v.bind({"filename": path})
+
+		self.assertRaises(exception.NotFoundException, v.render)
+
+	def test_03_file_response(self):
+		data = self.generate_text(1000, 1000)
+
+		fd, path = tempfile.mkstemp()
+
+		dispatcher, limit_requests_by_ip = wsgi.dispatcher, config.LIMIT_REQUESTS_BY_IP
+
+		wsgi.dispatcher = router.Router([{"path": re.compile("^/file$"), "controller": FileController}])
+		config.LIMIT_REQUESTS_BY_IP = False
+
+		try:
+			os.write(fd, data)
+			os.close(fd)
+
+			def request(**headers):
+				env = {"REQUEST_METHOD": "GET", "PATH_INFO": "/file", "REMOTE_ADDR": "127.0.0.1", "QUERY_STRING": urllib.urlencode({"filename": path})}
+				env.update(headers)
+
+				response = {}
+
+				def start_response(status, headers):
+					response["status"] = status
+					response["headers"] = dict(headers)
+
+				body = "".join(wsgi.index(env, start_response))
+
+				return response["status"], response["headers"], body
+
+			status, headers, body = request()
+			self.assertEqual(status, "200 OK")
+			self.assertEqual(body, data)
+
+			status, headers, body = request(HTTP_RANGE="bytes=0-9")
+			self.assertEqual(status.split()[0], "206")
+			self.assertEqual(headers["Content-Range"], "bytes 0-9/1000")
+			self.assertEqual(body, data[:10])
+
+			status, headers, body = request(HTTP_RANGE="bytes=1000-")
+			self.assertEqual(status.split()[0], "416")
+
+			status, headers, body = request(HTTP_IF_NONE_MATCH=headers["ETag"])
+			self.assertEqual(status.split()[0], "304")
+			self.assertEqual(body, "")
+
+		finally:
+			wsgi.dispatcher, config.LIMIT_REQUESTS_BY_IP = dispatcher, limit_requests_by_ip
+
+			os.remove(path)
+
+	def test_04_benchmark(self):
+		now = datetime.datetime.utcnow()
+		objects = map(lambda i: {"guid": util.new_guid(), "source": self.generate_text(), "created_on": now, "locked": False,
+		                         "reported": False, "tags": ["foo", "bar"], "comments_n": i,
+		                         "score": {"up": i, "down": 0, "fav": 1}}, range(5000))
+
+		started = time.time()
+		util.to_json(objects)
+		sorted_keys = time.time() - started
+
+		started = time.time()
+		"".join(util.iter_json(objects))
+		streamed = time.time() - started
+
+		print "to_json(): %.2fms, iter_json(): %.2fms" % (sorted_keys * 1000, streamed * 1000)
+
+class TestTemplates(unittest.TestCase, TestBase):
+	def setUp(self):
+		self.__template_dir = config.TEMPLATE_DIR
+		self.__auto_reload = config.TEMPLATE_AUTO_RELOAD
+
+	def tearDown(self):
+		config.TEMPLATE_DIR = self.__template_dir
+		config.TEMPLATE_AUTO_RELOAD = self.__auto_reload
+
+	def test_00_compiled_templates(self):
+		self.assertTrue(template.precompile_templates() > 0)
+
+		cls = template.load_template_class(config.DEFAULT_LANGUAGE, "account_activation_page.tpl")
+		self.assertIs(template.load_template_class(config.DEFAULT_LANGUAGE, "account_activation_page.tpl"), cls)
+
+		tpl = template.AccountActivationPage(config.DEFAULT_LANGUAGE)
+		tpl.bind(id="foo", code="bar", error_field=None)
+		self.assertIn("bar", tpl.render())
+
+		tpl.bind(id="foo", code="baz", error_field="code")
+		self.assertIn("baz", tpl.render())
+
+		tpl = template.AccountRequestMail(config.DEFAULT_LANGUAGE)
+		tpl.bind(username="john.doe", url="http://localhost/foo")
+
+		subject, body = tpl.render()
+
+		self.assertTrue(len(subject) > 0)
+		self.assertIn("john.doe", body)
+		self.assertIn("http://localhost/foo", body)
+
+	def test_01_auto_reload(self):
+		config.TEMPLATE_DIR = tempfile.mkdtemp()
+
+		try:
+			os.mkdir(os.path.join(config.TEMPLATE_DIR, "en"))
+
+			path = os.path.join(config.TEMPLATE_DIR, "en", "test.tpl")
+
+			def write(text, mtime):
+				with open(path, "w") as f:
+					f.write(text)
+
+				os.utime(path, (mtime, mtime))
+
+			def render():
+				return str(template.load_template_class("en", "test.tpl")(searchList=[{"name": "john"}]))
+
+			# modified templates aren't loaded by default:
+			config.TEMPLATE_AUTO_RELOAD = False
+
+			write("Hello $name", 1000)
+			self.assertEqual(render(), "Hello john")
+
+			write("Goodbye $name", 2000)
+			self.assertEqual(render(), "Hello john")
+
+			# reload modified templates:
+			config.TEMPLATE_AUTO_RELOAD = True
+
+			self.assertEqual(render(), "Goodbye john")
+
+			write("Hi $name", 3000)
+			self.assertEqual(render(), "Hi john")
+
+		finally:
+			template.tpl_cache.clear()
+			shutil.rmtree(config.TEMPLATE_DIR)
+
+	def test_02_benchmark(self):
+		n = 500
+		language = config.DEFAULT_LANGUAGE
+
+		pages = [(template.AccountActivationPage, {"id": "foo", "code": "bar", "error_field": "code"})]
+		mails = [(template.AccountRequestMail, {"username": "john.doe", "url": "http://localhost/foo"})]
+
+		# previous implementation reading & compiling templates on each request:
+		started = time.time()
+
+		for _ in range(n):
+			namespace = pages[0][1]
+			str(Cheetah.Template.Template(template.load_template_def(language, "account_activation_page.tpl"), searchList=[namespace]))
+
+			namespace = mails[0][1]
+
+			for filename in ["account_request.subject.tpl", "account_request.body.tpl"]:
+				str(Cheetah.Template.Template(template.load_template_def(language, filename), searchList=[namespace]))
+
+		compiled = time.time() - started
+
+		started = time.time()
+
+		for _ in range(n):
+			for cls, namespace in pages + mails:
+				tpl = cls(language)
+				tpl.bind(**namespace)
+				tpl.render()
+
+		cached = time.time() - started
+
+		print "compiling: %.2fus/request, cached: %.2fus/request" % (compiled * 1000000 / n, cached * 1000000 / n)
+
+class TestSharedInstances(unittest.TestCase, TestBase):
+	def setUp(self):
+		self.__limit_requests_by_ip = config.LIMIT_REQUESTS_BY_IP
+		config.LIMIT_REQUESTS_BY_IP = False
+
+	def tearDown(self):
+		config.LIMIT_REQUESTS_BY_IP = self.__limit_requests_by_ip
+
+	def test_00_singleton(self):
+		instances = []
+
+		def get():
+			instances.append(app.get_application())
+
+		threads = [threading.Thread(target=get) for _ in range(8)]
+
+		for t in threads:
+			t.start()
+
+		for t in threads:
+			t.join()
+
+		self.assertEqual(len(set(map(id, instances))), 1)
+		self.assertIs(instances[0], app.get_application())
+		self.assertIs(instances[0], wsgi.application)
+
+		self.assertIs(EchoController().app, EchoController().app)
+
+		self.assertIs(factory.get_user_db(), factory.get_user_db())
+		self.assertIs(factory.get_object_db(), factory.get_object_db())
+		self.assertIs(factory.get_stream_db(), factory.get_stream_db())
+		self.assertIs(factory.get_mail_db(), factory.get_mail_db())
+
+	def test_01_benchmark(self):
+		n = 10000
+
+		def count_instances():
+			return len(filter(lambda obj: isinstance(obj, (app.Application, pgdb.PGDb)), gc.get_objects()))
+
+		# previous implementation creating the application layer & its data access objects on each request:
+		def create_application():
+			return [app.Application(), factory.create_user_db(), factory.create_object_db(), factory.create_stream_db(), factory.create_mail_db()]
+
+		app.get_application()
+
+		results = []
+
+		for f in [create_application, app.get_application]:
+			before = count_instances()
+			started = time.time()
+
+			# keep references, so the allocated instances can be counted:
+			instances = [f() for _ in range(n)]
+
+			elapsed = time.time() - started
+			allocated = count_instances() - before
+
+			results.append((allocated, elapsed))
+
+			del instances
+
+		self.assertEqual(results[0][0], n * 5)
+		self.assertEqual(results[1][0], 0)
+
+		print "create_*_db(): %d instances, %.2fus/request, get_application(): %d instances, %.2fus/request" % \
+		      (results[0][0], results[0][1] * 1000000 / n, results[1][0], results[1][1] * 1000000 / n)
+
+class TestApp(unittest.TestCase, TestBase):
+	def setUp(self):
+		self.app = app.Application()
+		app.profile_cache.clear()
+		app.tag_cloud_cache.clear()
+		self.__clear_database__()
+		self.__delete_files__()
+
+	def tearDown(self):
+		self.__clear_database__()
+		self.__delete_files__()
+
+	def test_00_create_user(self):
+		username = self.generate_username()
+		email = self.generate_email()
+
+		id, code = self.app.request_account(username, email)
+
+		self.assertRaises(exception.InvalidParameterException, self.app.request_account, "", self.generate_text(100, 200))
+		self.assertRaises(exception.InvalidParameterException, self.app.request_account, self.generate_text(100, 200), "")
+		self.assertRaises(exception.ConflictException, self.app.request_account, username, email)
+
+		self.assertRaises(exception.NotFoundException, self.app.activate_user, self.generate_text(), code)
+		self.assertRaises(exception.InvalidRequestCodeException, self.app.activate_user, id, self.generate_text())
+
+		username2, email2, password = self.app.activate_user(id, code)
+
+		self.assertEqual(username, username2)
+		self.assertEqual(email, email2)
+
+		self.assertRaises(exception.NotFoundException, self.app.activate_user, self.generate_text(), code)
+
+	def test_01_block_and_delete_user(self):
+		user = self.__generate_test_account__()
+
+		self.assertTrue(self.app.validate_password(user["username"], user["password"]))
+
+		# disable account:
+		self.assertRaises(exception.ConflictException, self.app.disable_user, user["username"], False)
+
+		self.app.disable_user(user["username"], True)
+
+		self.assertRaises(exception.UserIsBlockedException, self.app.validate_password, user["username"], user["password"])
+
+		self.assertRaises(exception.ConflictException, self.app.disable_user, user["username"])
+
+		# delete account:
+		self.app.delete_user(user["username"])
+
+		self.assertRaises(exception.UserNotFoundException, self.app.delete_user, user["username"])
+
+		# disable deleted account:
+		self.assertRaises(exception.UserNotFoundException, self.app.disable_user, user["username"])
+
+	def test_02_change_and_verify_password(self):
+		user = self.__generate_test_account__()
+		disabled = self.__generate_blocked_test_account__()
+		deleted = self.__generate_deleted_test_account__()
+
+		# validate password:
+		self.assertRaises(exception.UserNotFoundException, self.app.validate_password, self.generate_username(), disabled["password"])
+		self.assertRaises(exception.UserIsBlockedException, self.app.validate_password, disabled["username"], disabled["password"])
+		self.assertRaises(exception.UserNotFoundException, self.app.validate_password, deleted["username"], deleted["password"])
+
+		self.assertTrue(self.app.validate_password(user["username"], user["password"]))
+		self.assertFalse(self.app.validate_password(user["username"], self.generate_text()))
+
+		# change password:
+		new_password = self.generate_text(8, 32)
+
+		self.assertRaises(exception.UserNotFoundException, self.app.change_password, self.generate_username(), self.generate_text(), new_password, new_password)
+		self.assertRaises(exception.UserIsBlockedException, self.app.change_password, disabled["username"], self.generate_text(), new_password, new_password)
+		self.assertRaises(exception.UserNotFoundException, self.app.change_password, deleted["username"], self.generate_text(), new_password, new_password)
+		self.assertRaises(exception.InvalidParameterException, self.app.change_password, user["username"], self.generate_text(), "", "")
+		self.assertRaises(exception.InvalidParameterException, self.app.change_password, user["username"], self.generate_text(), self.generate_text(), self.generate_text())
+		self.assertRaises(exception.WrongPasswordException, self.app.change_password, user["username"], self.generate_text(), new_password, new_password)
+
+		# verified credentials are cached:
+		hits = app.credentials_cache.get_stats()["hits"]
+
+		self.assertTrue(self.app.validate_password(user["username"].upper(), user["password"]))
+		self.assertEqual(app.credentials_cache.get_stats()["hits"], hits + 1)
 
 		self.app.change_password(user["username"], user["password"], new_password, new_password)
 
+		self.assertFalse(self.app.validate_password(user["username"], user["password"]))
 		self.assertTrue(self.app.validate_password(user["username"], new_password))
 
+		# cached credentials are removed after the transaction of the request has been committed:
+		with context.RequestContext(util.new_guid()):
+			self.app.change_password(user["username"], new_password, user["password"], user["password"])
+			self.assertIsNotNone(app.credentials_cache.get(user["username"].lower()))
+
+		self.assertIsNone(app.credentials_cache.get(user["username"].lower()))
+		self.assertTrue(self.app.validate_password(user["username"], user["password"]))
+
 	def test_03_password_reset(self):
 		user = self.__generate_test_account__()
 		disabled = self.__generate_blocked_test_account__()
@@ -1606,6 +3232,10 @@ class TestApp(unittest.TestCase, TestBase):
 		self.assertRaises(exception.UserNotFoundException, self.app.find_user, self.generate_username(), self.generate_username())
 		self.assertRaises(exception.UserIsBlockedException, self.app.find_user, disabled["username"], self.generate_username())
 
+		# invalid page sizes:
+		for page_size in [0, -1]:
+			self.assertRaises(exception.InvalidParameterException, self.app.find_user, a["username"], self.generate_username(), page_size)
+
 		result = self.app.find_user(a["username"], deleted["username"])
 
 		self.assertEqual(len(result), 0)
@@ -1630,6 +3260,16 @@ class TestApp(unittest.TestCase, TestBase):
 		self.assertEqual(len(result), 1)
 		self.__test_default_user_keys__(result[0])
 
+		# page size is limited:
+		max_page_size = config.SEARCH_MAX_PAGE_SIZE
+		config.SEARCH_MAX_PAGE_SIZE = 1
+
+		try:
+			self.assertLessEqual(len(self.app.find_user(a["username"], "@", 100)), 1)
+
+		finally:
+			config.SEARCH_MAX_PAGE_SIZE = max_page_size
+
 	def test_08_friendship(self):
 		a = self.__generate_test_account__()
 		disabled = self.__generate_blocked_test_account__()
@@ -2168,6 +3808,178 @@ class TestApp(unittest.TestCase, TestBase):
 
 				self.assertTrue(obj["reported"])
 
+	def test_18_message_queries(self):
+		# create test data:
+		a = self.__generate_test_account__()
+		users = map(lambda _: self.__generate_test_account__(), range(20))
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				objects = map(lambda _: self.generate_object(scope), range(5))
+
+				scope.complete()
+
+		for user in users:
+			self.__make_friends__(a["id"], user["id"])
+
+			object = self.pick_one(objects)
+
+			self.app.recommend(user["username"], [a["username"]], object["guid"])
+			self.app.add_comment(object["guid"], user["username"], self.generate_text())
+			self.app.vote(user["username"], object["guid"], user["id"] % 2 == 0)
+
+		# count data access calls:
+		dbs = [factory.user_db, factory.object_db, factory.stream_db]
+		counters = map(CallCounter, dbs)
+
+		factory.user_db, factory.object_db, factory.stream_db = counters
+
+		try:
+			application = app.Application()
+
+			started = time.time()
+
+			messages = application.get_messages(a["username"], 100)
+
+			elapsed = time.time() - started
+
+		finally:
+			factory.user_db, factory.object_db, factory.stream_db = dbs
+
+		calls = sum(map(lambda c: c.count, counters))
+
+		print "%d messages, %d data access calls, %.4fs" % (len(messages), calls, elapsed)
+
+		self.assertEqual(len(messages), len(users) * 4)
+		self.assertTrue(calls <= 8)
+
+		# test hydrated messages:
+		ids = dict(map(lambda user: (user["id"], user), users))
+		guids = set(map(lambda obj: obj["guid"], objects))
+
+		for msg in messages:
+			source = ids[msg["source"]["id"]]
+
+			self.assertEqual(msg["source"]["username"], source["username"])
+			self.assertTrue(msg["source"].has_key("following"))
+
+			if msg["type"] == "recommendation":
+				self.assertTrue(msg["target"]["guid"] in guids)
+			elif msg["type"] == "wrote-comment":
+				self.assertTrue(msg["target"]["object"]["guid"] in guids)
+				self.assertEqual(msg["target"]["user"]["username"], source["username"])
+				self.assertFalse(msg["target"].has_key("user_id"))
+				self.assertFalse(msg["target"].has_key("object-guid"))
+			elif msg["type"] == "voted-object":
+				self.assertTrue(msg["target"]["object"]["guid"] in guids)
+				self.assertEqual(msg["target"]["voting"], source["id"] % 2 == 0)
+			elif msg["type"] != "following":
+				raise Exception("Invalid message type: %s" % (msg["type"]))
+
+	def test_19_profile_cache(self):
+		a, b, c = map(lambda _: self.__generate_test_account__(), range(3))
+
+		self.__make_friends__(a["id"], b["id"])
+
+		# projection is applied on read:
+		self.__test_friend_user_keys__(self.app.get_user_details(a["username"], b["username"]))
+
+		stats = app.profile_cache.get_stats()
+
+		self.__test_default_user_keys__(self.app.get_user_details(c["username"], b["username"]))
+		self.__test_friend_user_keys__(self.app.get_user_details(b["username"], b["username"]))
+
+		self.assertEqual(app.profile_cache.get_stats()["hits"], stats["hits"] + 4)
+		self.assertEqual(app.profile_cache.get_stats()["misses"], stats["misses"])
+
+		# follow() invalidates the followed usernames:
+		self.app.follow(b["username"], c["username"])
+
+		details = self.app.get_user_details(c["username"], b["username"])
+
+		self.__test_friend_user_keys__(details)
+		self.assertEqual(sorted(details["following"]), sorted([a["username"], c["username"]]))
+
+		# update_user_details() invalidates the user details:
+		self.app.update_user_details(b["username"], b["email"], "John", "Doe", "male", None, False)
+
+		details = self.app.get_user_details(a["username"], b["username"])
+
+		self.assertEqual(details["firstname"], "John")
+		self.assertFalse(details["protected"])
+
+		# the cached user details are removed after the transaction of the request has been committed:
+		with context.RequestContext(util.new_guid()):
+			self.app.update_user_details(b["username"], b["email"], "Jane", "Doe", "female", None, False)
+			self.assertIsNotNone(app.profile_cache.get(("user", b["username"].lower())))
+
+		self.assertIsNone(app.profile_cache.get(("user", b["username"].lower())))
+		self.assertEqual(self.app.get_user_details(a["username"], b["username"])["firstname"], "Jane")
+
+		# disable_user() & delete_user() invalidate the user details:
+		self.app.disable_user(b["username"])
+
+		self.assertTrue(self.app.get_user_details(a["username"], b["username"])["blocked"])
+
+		self.app.delete_user(c["username"])
+
+		self.assertRaises(exception.UserNotFoundException, self.app.get_user_details, a["username"], c["username"])
+		self.assertEqual(self.app.get_full_user_details(b["username"])["following"], [a["username"]])
+
+		self.app.delete_user(b["username"])
+
+		self.assertRaises(exception.UserNotFoundException, self.app.get_user_details, a["username"], b["username"])
+
+	def test_20_tag_cloud_cache(self):
+		a = self.__generate_test_account__()
+
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				objects = map(lambda _: self.generate_object(scope), range(3))
+
+				scope.complete()
+
+		tags = map(lambda _: self.generate_text(8, 16), range(config.TAG_CLOUD_SIZE + 10))
+
+		self.app.add_tags(objects[0]["guid"], a["username"], tags)
+		self.app.add_tags(objects[1]["guid"], a["username"], tags[:5])
+
+		# tag cloud is limited to the most used tags:
+		cloud = self.app.get_tag_cloud()
+
+		self.assertEqual(len(cloud), config.TAG_CLOUD_SIZE)
+		self.assertEqual(sorted(map(lambda t: t["tag"], cloud[:5])), sorted(tags[:5]))
+
+		# changes made by other processes are visible after the entry has expired:
+		with factory.create_db_connection() as conn:
+			with conn.enter_scope() as scope:
+				factory.create_object_db().add_tag(scope, objects[2]["guid"], a["id"], tags[0])
+
+				scope.complete()
+
+		stats = app.tag_cloud_cache.get_stats()
+
+		self.assertEqual(self.app.get_tag_cloud()[0]["count"], 2)
+		self.assertEqual(app.tag_cloud_cache.get_stats()["hits"], stats["hits"] + 1)
+
+		# add_tags() & delete_object() invalidate the tag cloud:
+		self.app.add_tags(objects[2]["guid"], a["username"], tags[1:2])
+
+		cloud = self.app.get_tag_cloud()
+
+		self.assertEqual(map(lambda t: t["count"], cloud[:2]), [3, 3])
+
+		self.app.delete_object(objects[2]["guid"])
+
+		self.assertEqual(self.app.get_tag_cloud()[0]["count"], 2)
+
+		# the tag cloud is removed after the transaction of the request has been committed:
+		with context.RequestContext(util.new_guid()):
+			self.app.add_tags(objects[1]["guid"], a["username"], tags[5:6])
+			self.assertIsNotNone(app.tag_cloud_cache.get("tags"))
+
+		self.assertIsNone(app.tag_cloud_cache.get("tags"))
+
 	def __generate_test_account__(self):
 		with factory.create_db_connection() as conn:
 			with conn.enter_scope() as scope:
@@ -2243,5 +4055,5 @@ def run_test_case(case):
 	unittest.TextTestRunner(verbosity = 2).run(suite)
 
 if __name__ == "__main__":
-	for case in [TestUserDb, TestObjectDb, TestStreamDb, TestMailDb, TestMailer, TestApp]:
+	for case in [TestUserDb, TestObjectDb, TestStreamDb, TestQueryPlans, TestMailDb, TestMailer, TestFanout, TestConnectionPool, TestRequestContext, TestLogger, TestRateLimiter, TestCache, TestCursors, TestRouting, TestControllerDispatch, TestViews, TestTemplates, TestSharedInstances, TestApp]:
 		run_test_case(case)
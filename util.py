@@ -38,7 +38,7 @@ from hashlib import sha256
 from bson import json_util
 from urllib2 import quote
 from PIL import Image
-import random, string, json, uuid, os, tempfile, config, cStringIO
+import random, string, json, uuid, os, tempfile, config, cStringIO, base64, heapq, exception
 
 ## Gets the current timestamp (UTC) in milliseconds.
 #  @return a float
@@ -108,6 +108,42 @@ def generate_junk(length, characters = None, secure = False):
 def to_json(obj):
 	return json.dumps(obj, sort_keys = True, default = json_util.default)
 
+## Encoder used by iter_json(). Keys aren't sorted, which lets the json module use its
+#  C implementation.
+json_encoder = json.JSONEncoder(default = json_util.default)
+
+## Converts an object to JSON and returns the string in chunks. Arrays are encoded
+#  element by element, so the first chunk is available before the whole array has been
+#  encoded and the complete string is never held in memory.
+#  @param obj object to serialize
+#  @param chunk_size minimum size of each chunk (except the last one)
+#  @return a generator yielding JSON strings
+def iter_json(obj, chunk_size=8192):
+	if not isinstance(obj, (list, tuple)):
+		yield json_encoder.encode(obj)
+		return
+
+	buffer = ["["]
+	size = 1
+
+	for i, item in enumerate(obj):
+		if i > 0:
+			buffer.append(", ")
+
+		chunk = json_encoder.encode(item)
+		buffer.append(chunk)
+		size += len(chunk)
+
+		if size >= chunk_size:
+			yield "".join(buffer)
+
+			buffer = []
+			size = 0
+
+	buffer.append("]")
+
+	yield "".join(buffer)
+
 ## Generates an enumeration.
 #  @param enums definition of the enumeration
 #  @return a new enumeration
@@ -203,6 +239,103 @@ def split_strip_set(str, sep):
 def pick_one(arr):
 	return arr[random.randint(0, len(arr) - 1)]
 
+## Converts the sort key of a record to an opaque cursor used for keyset pagination.
+#  @param values sort key values (datetime, int or str)
+#  @return an url-safe string
+def encode_cursor(values):
+	def encode(v):
+		if isinstance(v, datetime):
+			return v.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+		if isinstance(v, (int, long)):
+			return v
+
+		return str(v)
+
+	return base64.urlsafe_b64encode(json.dumps(map(encode, values))).rstrip("=")
+
+## Converts a cursor created by encode_cursor() back to the sort key values. Each value is
+#  validated and converted to the expected type: timestamps are returned as datetime, uuids
+#  as strings and integers as long. An exception.InvalidParameterException is raised if the
+#  cursor is malformed.
+#  @param cursor cursor to convert
+#  @param types expected type of each sort key value (datetime, uuid.UUID, int or str)
+#  @return an array holding the sort key values
+def decode_cursor(cursor, *types):
+	def decode(t, v):
+		if t is datetime:
+			return datetime.strptime(v, "%Y-%m-%d %H:%M:%S.%f")
+
+		if t is uuid.UUID:
+			return str(uuid.UUID(v))
+
+		if t is int:
+			if isinstance(v, (int, long)) and not isinstance(v, bool) and -pow(2, 63) <= v < pow(2, 63):
+				return long(v)
+
+			raise ValueError("Invalid integer.")
+
+		if isinstance(v, basestring):
+			return v
+
+		raise ValueError("Invalid string.")
+
+	try:
+		cursor = str(cursor)
+		values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+		if isinstance(values, list) and len(values) == len(types):
+			return map(decode, types, values)
+
+	except (TypeError, ValueError, UnicodeError, AttributeError):
+		pass
+
+	raise exception.InvalidParameterException("after")
+
+## Wraps a sort key to invert its order.
+class DescendingKey:
+	def __init__(self, key):
+		self.key = key
+
+	def __lt__(self, other):
+		return self.key > other.key
+
+	def __eq__(self, other):
+		return self.key == other.key
+
+## Merges sequences sorted in descending order (k-way merge). The heap holds at most one
+#  element of each sequence and the merge stops after limit elements.
+#  @param sequences sequences sorted in descending order
+#  @param key function computing the sort key of an element
+#  @param limit maximum number of elements to return
+#  @return an array containing the merged elements
+def merge_descending(sequences, key, limit):
+	heap = []
+
+	for index, sequence in enumerate(sequences):
+		iterator = iter(sequence)
+
+		for item in iterator:
+			heap.append((DescendingKey(key(item)), index, item, iterator))
+			break
+
+	heapq.heapify(heap)
+
+	result = []
+
+	while len(heap) > 0 and len(result) < limit:
+		_, index, item, iterator = heap[0]
+		result.append(item)
+
+		try:
+			item = iterator.next()
+			heapq.heapreplace(heap, (DescendingKey(key(item)), index, item, iterator))
+
+		except StopIteration:
+			heapq.heappop(heap)
+
+	return result
+
 ## An iterator for reading data from a stream lazily.
 class StreamReader:
 	## The constructor.
@@ -243,6 +376,27 @@ class StreamReader:
 
 			yield bytes
 
+## Generator reading blocks from a file. The file is closed when the generator is exhausted
+#  or closed.
+#  @param f file to read from
+#  @param length number of bytes to read from the current position
+#  @param block_size number of bytes read on each iteration
+#  @return read bytes
+def iter_file(f, length, block_size=81920):
+	try:
+		while length > 0:
+			bytes = f.read(min(block_size, length))
+
+			if len(bytes) == 0:
+				break
+
+			length -= len(bytes)
+
+			yield bytes
+
+	finally:
+		f.close()
+
 ## Creates a StreamReader reading data from the specified file.
 #  @param filename name of the file to open
 #  @param mode file mode
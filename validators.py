@@ -106,6 +106,17 @@ def validate_comment(text):
 
 	return True
 
+## Validates a search query.
+#  @param query query to validate
+#  @return True if the query is valid
+def validate_search_query(query):
+	length = len(util.strip(query))
+
+	if length == 0 or length > 64:
+		return False
+
+	return True
+
 ## Validates a guid.
 #  @param guid guid to test
 #  @return True if the guid is valid
@@ -33,7 +33,8 @@
 #  Base class for views and implementations.
 
 from util import to_json
-import template, os, util
+from email.utils import formatdate, parsedate_tz, mktime_tz
+import template, os, re, util, exception
 
 ## A base class for views. A view can be exported to a string which contains binded data.
 class View(object):
@@ -62,14 +63,19 @@ class View(object):
 class JSONView(View):
 	## The constructor.
 	#  @param status an HTTP status code
-	def __init__(self, status):
+	#  @param stream if True the model is converted to JSON while the response is sent
+	def __init__(self, status, stream=False):
 		View.__init__(self, "application/json", status)
+		self.__stream = stream
 
-	## Converts the assigned model to a JSON string.
-	#  @return a JSON string
+	## Converts the assigned model to a JSON string. Streamed views return a generator
+	#  yielding JSON chunks instead, dictionary keys aren't sorted.
+	#  @return a JSON string or a generator
 	def render(self):
 		if self.model is None:
 			return "null"
+		elif self.__stream:
+			return util.iter_json(self.model)
 		else:
 			return to_json(self.model)
 
@@ -105,19 +111,126 @@ class EmptyView(View):
 	def render(self):
 		return ""
 
-## A view used for file downloads.
+## Regular expression matching a single byte range ("Range" header).
+range_regex = re.compile("^bytes=(\\d*)-(\\d*)$")
+
+## A view used for file downloads. It answers conditional requests ("If-None-Match",
+#  "If-Modified-Since") and requests for a single byte range. Complete files are sent
+#  with the server's "wsgi.file_wrapper" if available.
 class FileView(View):
 	## The constructor.
 	#  @param status an HTTP status code
-	def __init__(self, status, content_type="Application/Octet-Stream"):
+	#  @param content_type content type of the file
+	#  @param env WSGI environment of the request
+	def __init__(self, status, content_type="Application/Octet-Stream", env=None):
 		View.__init__(self, content_type, status)
 
-	## Returns content of the given file.
-	#  @return a util.StreamReader instance
+		if env is None:
+			env = {}
+
+		self.__env = env
+
+	## Returns content of the given file. The status is set to 304 if the file hasn't been
+	#  modified and to 206 if a byte range has been requested.
+	#  @return an iterable
 	def render(self):
 		path = self.model["filename"]
 		filename = os.path.basename(path)
 
+		try:
+			f = open(path, "rb")
+
+		except EnvironmentError:
+			raise exception.NotFoundException("File not found.")
+
+		stat = os.fstat(f.fileno())
+		etag = "\"%x-%x\"" % (int(stat.st_mtime), stat.st_size)
+
 		self.headers["Content-Disposition"] = "inline; filename=%s" % (filename)
+		self.headers["ETag"] = etag
+		self.headers["Last-Modified"] = formatdate(int(stat.st_mtime), usegmt=True)
+		self.headers["Accept-Ranges"] = "bytes"
+
+		if self.__is_not_modified__(etag, int(stat.st_mtime)):
+			f.close()
+			self.status = 304
+
+			return None
+
+		byte_range = self.__get_range__(etag, stat.st_size)
+
+		if byte_range is None:
+			self.headers["Content-Length"] = str(stat.st_size)
+
+			file_wrapper = self.__env.get("wsgi.file_wrapper")
+
+			if file_wrapper is not None:
+				return file_wrapper(f, 81920)
+
+			return util.iter_file(f, stat.st_size)
+
+		start, end = byte_range
+
+		if start > end:
+			f.close()
+			self.status = 416
+			self.headers["Content-Range"] = "bytes */%d" % stat.st_size
+
+			return ""
+
+		self.status = 206
+		self.headers["Content-Range"] = "bytes %d-%d/%d" % (start, end, stat.st_size)
+		self.headers["Content-Length"] = str(end - start + 1)
+
+		f.seek(start)
+
+		return util.iter_file(f, end - start + 1)
+
+	def __is_not_modified__(self, etag, mtime):
+		if_none_match = self.__env.get("HTTP_IF_NONE_MATCH")
+
+		if if_none_match is not None:
+			tags = map(lambda t: t.strip(), if_none_match.split(","))
+
+			return "*" in tags or etag in tags or "W/" + etag in tags
+
+		if_modified_since = self.__env.get("HTTP_IF_MODIFIED_SINCE")
+
+		if if_modified_since is not None:
+			since = parsedate_tz(if_modified_since)
+
+			if since is not None:
+				return mtime <= mktime_tz(since)
+
+		return False
+
+	# returns the first & last byte of the requested range (first > last if the range can't
+	# be satisfied) or None to send the complete file:
+	def __get_range__(self, etag, size):
+		header = self.__env.get("HTTP_RANGE")
+
+		if header is None:
+			return None
+
+		if_range = self.__env.get("HTTP_IF_RANGE")
+
+		if if_range is not None and if_range.strip() != etag:
+			return None
+
+		m = range_regex.match(header.strip())
+
+		if m is None:
+			return None
+
+		start, end = m.groups()
+
+		if start == "":
+			if end == "":
+				return None
+
+			return size - min(int(end), size), size - 1
+
+		if end == "":
+			return int(start), size - 1
 
-		return util.read_file(path)
+		return int(start), min(int(end), size - 1)
@@ -36,12 +36,14 @@
 #  meat-a is a WSGI based webservice for the organization of objects and
 #  related meta data.
 
-import controller, re, urlparse, urllib, sys, httpcode, config, exception, logger, util
+import controller, context, router, app, template, logging, re, urlparse, urllib, sys, httpcode, config, exception, logger, util
 from cgi import FieldStorage
-from app import Application
 
-## An app.AuthenticatedApplication instance.
-application = Application()
+## The shared app.Application instance.
+application = app.get_application()
+
+if config.TEMPLATE_PRECOMPILE:
+	template.precompile_templates()
 
 ## Default form handler. It receives parameters from the query string and body, when
 #  the Content-Type is application/x-www-form-urlencoded.
@@ -87,9 +89,29 @@ def avatar_form_handler(method, env):
 	except Exception as e:
 		raise exception.HTTPException(400, "Bad Request")
 
+## Converts a rendered view to a WSGI iterable and sets the "Content-Length" header if the
+#  length of the response is known. Otherwise the header is omitted and the server sends the
+#  chunks returned by the iterable as they are generated (chunked transfer encoding).
+#  @param response a string, a sized iterable (e.g. util.StreamReader), a generator or None
+#  (no body, e.g. "304 Not Modified")
+#  @param headers response headers
+#  @return an iterable
+def response_body(response, headers):
+	if response is None:
+		return []
+
+	if isinstance(response, basestring):
+		headers["Content-Length"] = str(len(response))
+
+		return [response]
+
+	if hasattr(response, "__len__"):
+		headers["Content-Length"] = str(len(response))
+
+	return response
+
 ## Dictionary defining urls and their related controller.
 routing = [{"path": re.compile("^/rest/registration$"), "controller": controller.AccountRequest},
-           {"path": re.compile("^/html/registration/(?P<id>[^/]+)$"), "controller": controller.AccountActivation},
            {"path": re.compile("^/html/registration/(?P<id>[^/]+)$"), "controller": controller.AccountActivation},
            {"path": re.compile("^/rest/user/(?P<username>[^/]+)$"), "controller": controller.UserAccount},
            {"path": re.compile("^/rest/user/(?P<username>[^/]+)/password/reset$"), "controller": controller.PasswordRequest},
@@ -119,17 +141,20 @@ routing = [{"path": re.compile("^/rest/registration$"), "controller": controller
            {"path": re.compile("^/rest/objects/popular$"), "controller": controller.PopularObjects},
            {"path": re.compile("^/rest/objects/random$"), "controller": controller.RandomObjects},
            {"path": re.compile("^/rest/recommendations$"), "controller": controller.Recommendations},
-           {"path": re.compile("^/rest/recommendations/page/(?P<page>[\d+])$"), "controller": controller.Recommendations}]
+           {"path": re.compile("^/rest/recommendations/page/(?P<page>[\d]+)$"), "controller": controller.Recommendations}]
            #{"path": re.compile("^/images/(?P<filename>[^/]+)$"), "controller": controller.Image},
            #{"path": re.compile("^/thumbnails/(?P<filename>[^/]+)$"), "controller": controller.Thumbnail}]
 
+## Dispatches request paths to the routing table (compiled once).
+dispatcher = router.Router(routing)
+
 ## The WSGI callback function.
 #  @param env WSGI environment
 #  @param start_response function to start response
 #  @return response body
 def index(env, start_response):
 	global application
-	global routing
+	global dispatcher
 
 	# generate unique request id & logger instance:
 	request_id = util.new_guid()
@@ -150,8 +175,7 @@ def index(env, start_response):
 		# find route:
 		log.debug("Processing request, searching route.")
 
-		f = lambda route: [route, route["path"].match(url)]
-		route, m = next(pair for pair in map(f, routing) if pair[1] is not None)
+		route, path_params = dispatcher.match(url)
 
 		# test request length:
 		log.debug("Found route: %s, detecting request size", route)
@@ -181,23 +205,25 @@ def index(env, start_response):
 		# merge found parameters with parameters specified in path:
 		log.debug("Merging parameters.")
 
-		params.update({k: urllib.unquote(m.group(k)) for k, v in route["path"].groupindex.items()})
+		params.update({k: urllib.unquote(v) for k, v in path_params.items()})
 
 		log.debug("Merged parameters: %s", params)
 
-		# execute controller:
+		# execute controller (GET requests are processed in a read-only transaction):
 		c = route["controller"]()
 
 		log.debug("Running controller: %s", c)
 
-		v = c.handle_request(request_id, method, env, **params)
+		with context.RequestContext(request_id, method == "GET"):
+			v = c.handle_request(request_id, method, env, **params)
 
 		log.debug("Rendering view: %s", v)
 
-		status, headers = v.status, v.headers
+		# the status may be changed while rendering (e.g. by view.FileView):
 		response = v.render()
+		status, headers = v.status, v.headers
 
-	except StopIteration:
+	except router.RouteNotFoundException:
 		log.info("Route not found.")
 
 		status, headers = 404, {"Content-Type": "text/plain"}
@@ -219,24 +245,21 @@ def index(env, start_response):
 	try:
 		log.debug("Writing response.")
 
-		if response is None:
-			response = ""
+		if log.isEnabledFor(logging.DEBUG) and isinstance(response, str) and len(response) <= 512:
+			log.debug("*** BEGIN OF RESPONSE ***")
+			log.debug(response)
+			log.debug("*** END OF RESPONSE ***")
 
-		headers["Content-Length"] = str(len(response))
+		body = response_body(response, headers)
 		headers = headers.items()
 
 		log.debug("status=%s, headers=%s", status, headers)
 
-		if isinstance(response, str) and len(response) <= 512:
-			log.debug("*** BEGIN OF RESPONSE ***")
-			log.debug(response)
-			log.debug("*** END OF RESPONSE ***")
-
 		start_response("%d %s" % (status, httpcode.codes[status][0]), headers)
 
 		log.debug("Finished successfully.")
 
-		return response
+		return body
 
 	except Exception as e:
 		log.error("Internal failure occurred: %s", sys.exc_info[1])